@@ -1,27 +1,89 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for, jsonify
+from flask import Flask, Response, render_template, request, send_file, url_for, jsonify, stream_with_context
 import uuid
+import json
+import socket
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import os
-from PyPDF2 import PdfMerger
-from generate_merge import merge_pdfs
-import threading
-import time
-from text_to_audio import text_to_speech_file
+from pdf_merge import iter_merged_pdf
+from merge_cache import merge_cache, merged_pdf_key
+from text_to_audio import text_to_speech_file, tts_cache
+import tts_backends
+from blob_cache import link_or_copy
+from tts_client import voicerss_client
+from jobs import reel_jobs, tts_pool, QueueFullError
+from image_prep import submit_normalize, collect_normalized, is_normalized, link_canvas
+from render_cache import render_cache, render_flights, reel_cache_key
+from uploads import IngestRequest, MAX_REQUEST_BYTES, UPLOAD_RULES, extensions_for, save_upload
+from encoder_profiles import ENCODER_PROFILES, DEFAULT_ENCODER_PROFILE, CONTAINER_ARGS, get_profile, video_args
+from media import MEDIA_OFFLOAD, send_media
+import media_index
+import job_index
+import batches
+import segments
+import slide_timing
+import ffmpeg_probe
+from lifecycle import lifecycle_manager
+from ffmpeg_pool import ffmpeg_executor, FFmpegCancelled, PRIORITY_INTERACTIVE, PRIORITY_DEBUG, save_output_tail
+from thumbnails import poster_for, preview_for
+from metrics import registry, stage_bytes, stage_errors, time_stage
 import subprocess
 import logging
+from logs import configure_logging, job_context
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Records go through a queue to a writer thread as JSON lines (see logs.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 UPLOAD_FOLDER = 'user_uploads'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+# Form fields are held in memory; the largest one is a batch manifest
+app.config['MAX_FORM_MEMORY_SIZE'] = batches.MAX_MANIFEST_BYTES
+app.request_class = IngestRequest
+app.config['USE_X_SENDFILE'] = MEDIA_OFFLOAD == "x-sendfile"
 
-def text_to_audio(folder):
-    """Generate audio from text description"""
+GALLERY_PAGE_SIZE = int(os.environ.get("GALLERY_PAGE_SIZE", 12))
+STATUS_PAGE_SIZE = int(os.environ.get("STATUS_PAGE_SIZE", 50))
+STATUS_MAX_PAGE_SIZE = 200
+REEL_ENCODE_TIMEOUT = int(os.environ.get("REEL_ENCODE_TIMEOUT", 300))
+# Letterbox any image onto the 1080x1920 reel canvas
+SCALE_FILTER = 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black'
+# Share of a segmented reel's progress bar taken by the segment encodes (the mux is the rest)
+SEGMENTS_PERCENT = 90
+# Seconds between keep-alive comments on idle /jobs/<id>/events streams
+SSE_KEEPALIVE_SECONDS = 15
+HOSTNAME = socket.gethostname()
+
+@app.before_request
+def start_lifecycle():
+    """Background TTL / disk quota cleanup of uploads, reels, merged PDFs and caches
+
+    Started on the first request rather than in __main__, so it also runs under a
+    WSGI server; the debug reloader's watcher process never serves requests, so
+    it never starts a second sweeper next to the one in the serving child.
+    """
+    lifecycle_manager.start()
+
+# Where /media/<kind>/... files are served from
+MEDIA_ROOTS = {
+    "reels": os.path.join("static", "reels"),
+    "uploads": UPLOAD_FOLDER,
+}
+
+def text_to_audio(folder, voice=None, backend=None):
+    """Generate audio from text description (voice None = the backend's default voice)
+
+    backend names the TTS backend to try first; None follows the deployment's
+    TTS_BACKENDS chain.
+    """
+    # Runs on the TTS pool, outside the reel job's thread
+    with job_context(folder):
+        return _text_to_audio(folder, voice, backend)
+
+def _text_to_audio(folder, voice, backend):
     try:
         desc_file = os.path.join("user_uploads", folder, "desc.txt")
         logger.info(f"Reading description from: {desc_file}")
@@ -37,8 +99,7 @@ def text_to_audio(folder):
             logger.error(f"Description file is empty: {desc_file}")
             return False
         
-        logger.info(f"Generating audio for folder: {folder}")
-        logger.info(f"Text content: {text}")
+        logger.info(f"Generating audio for folder: {folder} ({len(text)} characters)")
         
         # Check if audio already exists
         audio_file = os.path.join("user_uploads", folder, "audio.mp3")
@@ -48,13 +109,9 @@ def text_to_audio(folder):
         
         # Generate new audio
         try:
-            result = text_to_speech_file(text, folder)
+            result = text_to_speech_file(text, folder, voice=voice, backend=backend)
             logger.info(f"text_to_speech_file returned: {result}")
             
-            # Wait a moment for file to be written
-            import time
-            time.sleep(1)
-            
             # Verify audio file was created
             if os.path.exists(audio_file) and os.path.getsize(audio_file) > 0:
                 file_size = os.path.getsize(audio_file)
@@ -81,27 +138,30 @@ def text_to_audio(folder):
             return True
         return False
 
-def create_reel(folder):
-    """Create video reel from images and audio"""
+def prepare_reel(folder):
+    """Validate input.txt and ffmpeg before encoding
+
+    Returns the list of image files referenced by input.txt, or None if the
+    folder cannot be rendered. Safe to run while the audio is still being generated.
+    """
+    with time_stage("image_validation"):
+        image_files = _check_reel_inputs(folder)
+    if image_files is None:
+        stage_errors.inc(stage="image_validation", cause="invalid_input")
+    return image_files
+
+def _check_reel_inputs(folder):
     try:
         input_file = os.path.join("user_uploads", folder, "input.txt")
-        audio_file = os.path.join("user_uploads", folder, "audio.mp3")
-        output_file = os.path.join("user_uploads", folder, f"{folder}.mp4")
-        
-        logger.info(f"Creating reel for folder: {folder}")
-        logger.info(f"Input file: {input_file}")
-        logger.info(f"Audio file: {audio_file}")
-        logger.info(f"Output file: {output_file}")
         
         # Check if input file exists
         if not os.path.exists(input_file):
             logger.error(f"Input file not found: {input_file}")
-            return False
+            return None
         
         # Read and validate input file contents
         with open(input_file, 'r') as f:
             input_content = f.read()
-            logger.info(f"Input file content:\n{input_content}")
         
         # Validate that all image files in input.txt actually exist
         lines = input_content.strip().split('\n')
@@ -112,30 +172,84 @@ def create_reel(folder):
                 file_path = line[5:].strip().strip("'\"")
                 if os.path.exists(file_path):
                     image_files.append(file_path)
-                    logger.info(f"Image file exists: {file_path}")
                 else:
                     logger.error(f"Image file not found: {file_path}")
-                    return False
+                    return None
         
         if not image_files:
             logger.error("No valid image files found in input.txt")
-            return False
+            return None
+        logger.info(f"input.txt lists {len(image_files)} images, all present")
         
-        # Check ffmpeg availability
-        try:
-            result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
-            logger.info("FFmpeg is available")
-        except FileNotFoundError:
-            logger.error("FFmpeg not found in system PATH")
-            return False
-        except subprocess.TimeoutExpired:
-            logger.error("FFmpeg version check timed out")
+        # Check ffmpeg availability (probed once per process)
+        ffmpeg = ffmpeg_probe.probe()
+        if not ffmpeg["available"]:
+            logger.error(f"FFmpeg is not available: {ffmpeg['error']}")
+            return None
+        if not ffmpeg_probe.has_encoder("libx264"):
+            logger.error("This FFmpeg build has no libx264 encoder")
+            return None
+        
+        return image_files
+    
+    except Exception as e:
+        logger.error(f"Unexpected error preparing reel for {folder}: {e}")
+        return None
+
+def create_reel(folder, image_files=None, profile=None, priority=PRIORITY_INTERACTIVE):
+    """Create video reel from images and audio
+
+    image_files is the result of prepare_reel() when the caller already ran it,
+    profile the encoder profile name (server default when None) and priority
+    the ffmpeg executor priority of the encode.
+    """
+    try:
+        input_file = os.path.join("user_uploads", folder, "input.txt")
+        audio_file = os.path.join("user_uploads", folder, "audio.mp3")
+        output_file = os.path.join("user_uploads", folder, f"{folder}.mp4")
+        partial_file = os.path.join("user_uploads", folder, f"{folder}.part.mp4")
+        
+        logger.info(f"Creating reel for folder: {folder}")
+        logger.info(f"Input file: {input_file}")
+        logger.info(f"Audio file: {audio_file}")
+        logger.info(f"Output file: {output_file}")
+        
+        if image_files is None:
+            image_files = prepare_reel(folder)
+        if not image_files:
             return False
         
         # Convert paths to use forward slashes for FFmpeg (works on both Windows and Unix)
         normalized_input_file = input_file.replace('\\', '/')
         normalized_audio_file = audio_file.replace('\\', '/')
-        normalized_output_file = output_file.replace('\\', '/')
+        normalized_output_file = partial_file.replace('\\', '/')
+        
+        # Images pre-normalised onto the 1080x1920 canvas need no per-frame scaling
+        if all(is_normalized(path) for path in image_files):
+            logger.info("All images are pre-normalised, skipping the scale filter")
+            scale_filter = []
+        else:
+            scale_filter = ['-vf', SCALE_FILTER]
+        
+        profile_name, profile_settings = get_profile(profile)
+        logger.info(f"Using encoder profile: {profile_name}")
+        
+        # Segmented: each image is encoded on its own (in parallel, cached) and the
+        # reel is only a stream copy of the segments plus the audio
+        slides = len(slide_timing.concat_entries(input_file))
+        segmented = segments.use_segments(slides)
+        segment_list = os.path.join("user_uploads", folder, "segments.txt")
+        if segmented:
+            logger.info(f"Rendering {slides} slides as separate segments")
+            video_input = segment_list.replace('\\', '/')
+            video = ['-c:v', 'copy']
+        else:
+            video_input = normalized_input_file
+            video = [*scale_filter, *video_args(profile_settings)]
+        # Stop at the end of the listed slides: the repeated last image is not encoded
+        length = concat_duration(input_file)
+        if length:
+            video += ['-t', f'{length:.3f}']
         
         # Build ffmpeg command
         if os.path.exists(audio_file):
@@ -144,14 +258,12 @@ def create_reel(folder):
                 'ffmpeg', '-y',  # -y to overwrite existing files
                 '-f', 'concat',
                 '-safe', '0',
-                '-i', normalized_input_file,
+                '-i', video_input,
                 '-i', normalized_audio_file,
-                '-vf', 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black',
-                '-c:v', 'libx264',
+                *video,
                 '-c:a', 'aac',
                 '-shortest',
-                '-r', '30',
-                '-pix_fmt', 'yuv420p',
+                *CONTAINER_ARGS,
                 normalized_output_file
             ]
         else:
@@ -160,43 +272,42 @@ def create_reel(folder):
                 'ffmpeg', '-y',
                 '-f', 'concat',
                 '-safe', '0',
-                '-i', normalized_input_file,
-                '-vf', 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black',
-                '-c:v', 'libx264',
+                '-i', video_input,
+                *video,
                 '-shortest',
-                '-r', '30',
-                '-pix_fmt', 'yuv420p',
+                *CONTAINER_ARGS,
                 normalized_output_file
             ]
         
-        logger.info(f"Running FFmpeg command: {' '.join(command)}")
-        
-        # Run ffmpeg command with detailed error capture
-        try:
-            result = subprocess.run(command, capture_output=True, text=True, timeout=300)
-            
-            # Log both stdout and stderr regardless of return code
-            if result.stdout:
-                logger.info(f"FFmpeg stdout: {result.stdout}")
-            if result.stderr:
-                logger.info(f"FFmpeg stderr: {result.stderr}")
+        # Identical inputs + settings were rendered before (or are being rendered right now)
+        settings = [arg for arg in command[:-1] if arg not in (video_input, normalized_audio_file)]
+        if segmented:
+            settings += ["segments", segments.SEGMENT_FORMAT_VERSION, *video_args(segments.segment_profile(profile_settings))]
+        render_key = reel_cache_key(input_file, audio_file, settings)
+        job_index.update(folder, stage="encode_started")
+        with render_flights.acquire(render_key):
+            if render_cache.link_to(render_key, output_file):
+                logger.info(f"Reel for {folder} served from render cache")
+                media_index.register(output_file)
+                job_index.update(folder, stage="encoded", reel=True)
+                reel_jobs.publish(folder, "stage", stage="muxed", cached=True)
+                return True
             
-            if result.returncode == 0:
-                logger.info(f"FFmpeg completed successfully")
-                if os.path.exists(output_file):
-                    file_size = os.path.getsize(output_file)
-                    logger.info(f"Output file created successfully: {output_file} (size: {file_size} bytes)")
-                    return True
-                else:
-                    logger.error(f"FFmpeg reported success but output file not found: {output_file}")
+            try:
+                if segmented:
+                    encode_reel_segments(folder, input_file, profile_settings, segment_list, priority)
+                progress_from = SEGMENTS_PERCENT if segmented else 0
+                stage = "reel_mux" if segmented else "reel_encode"
+                if not run_reel_encode(folder, command, partial_file, output_file, priority, progress_from, stage):
                     return False
-            else:
-                logger.error(f"FFmpeg failed with return code: {result.returncode}")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            logger.error(f"FFmpeg timeout for folder {folder}")
-            return False
+            finally:
+                if segmented:
+                    segments.remove_segments(segment_list)
+            render_cache.put_file(render_key, output_file)
+            media_index.register(output_file)
+            job_index.update(folder, stage="encoded", reel=True)
+            reel_jobs.publish(folder, "stage", stage="muxed", cached=False)
+            return True
         
     except Exception as e:
         logger.error(f"Unexpected error creating reel for {folder}: {e}")
@@ -204,10 +315,266 @@ def create_reel(folder):
         logger.error(f"Traceback: {traceback.format_exc()}")
         return False
 
+def run_reel_encode(folder, command, partial_file, output_file, priority=PRIORITY_INTERACTIVE, progress_from=0,
+                    stage="reel_encode"):
+    """Run the reel ffmpeg command into partial_file and move it to output_file on success
+
+    Encoding into a separate file means a reel hard-linked from the render
+    cache is never truncated by a later run. Reported progress runs from
+    progress_from to 100 percent (segmented reels start the mux at SEGMENTS_PERCENT);
+    stage labels the encode's metrics.
+    """
+    logger.info(f"Running FFmpeg command: {' '.join(command)}")
+    total = concat_duration(os.path.join(UPLOAD_FOLDER, folder, "input.txt"))
+    reel_jobs.publish(folder, "stage", stage="encoding")
+
+    def on_progress(progress):
+        if total and progress["out_time"] is not None:
+            percent = min(99, int(progress["out_time"] * 100 / total))
+            progress["percent"] = 100 if progress["done"] else progress_from + percent * (100 - progress_from) // 100
+        reel_jobs.publish(folder, "progress", **progress)
+        if progress["done"]:
+            # Final speed of this encode on this host, for comparing hosts and profiles
+            reel_jobs.update_meta(folder, encode_speed=progress["speed"], encode_fps=progress["fps"], encode_host=HOSTNAME)
+
+    # Run ffmpeg command with detailed error capture
+    try:
+        result = ffmpeg_executor.run(
+            command, priority, timeout=REEL_ENCODE_TIMEOUT, job_id=folder, on_progress=on_progress, stage=stage
+        )
+
+        if result.returncode == 0:
+            logger.info(f"FFmpeg completed successfully")
+            if os.path.exists(partial_file):
+                os.replace(partial_file, output_file)
+                file_size = os.path.getsize(output_file)
+                stage_bytes.inc(file_size, stage=stage)
+                logger.info(f"Output file created successfully: {output_file} (size: {file_size} bytes)")
+                return True
+            else:
+                logger.error(f"FFmpeg reported success but output file not found: {partial_file}")
+                return False
+        else:
+            log_file = save_output_tail(os.path.join(UPLOAD_FOLDER, folder, "ffmpeg.log"), result)
+            logger.error(f"FFmpeg failed with return code {result.returncode}, output tail in {log_file}")
+            return False
+
+    except subprocess.TimeoutExpired as e:
+        log_file = save_output_tail(os.path.join(UPLOAD_FOLDER, folder, "ffmpeg.log"), e)
+        logger.error(f"FFmpeg timeout for folder {folder}, output tail in {log_file}")
+        return False
+    except FFmpegCancelled as e:
+        logger.error(str(e))
+        return False
+
+def encode_reel_segments(folder, input_file, profile_settings, segment_list, priority=PRIORITY_INTERACTIVE):
+    """Encode the segments of a segmented reel, publishing progress as they finish"""
+    entries = slide_timing.concat_entries(input_file)
+    reel_jobs.publish(folder, "stage", stage="encoding_segments", segments=len(entries))
+
+    def on_segment(done, total):
+        reel_jobs.publish(folder, "progress", percent=done * SEGMENTS_PERCENT // total, segments_done=done, segments=total)
+
+    def scale_filter(image):
+        # Normalised images are already on the 1080x1920 canvas
+        return [] if is_normalized(image) else ['-vf', SCALE_FILTER]
+
+    segments.encode_segments(folder, entries, profile_settings, scale_filter, segment_list, priority, on_segment)
+
+def concat_duration(input_file):
+    """Total of the duration lines in an ffmpeg concat list (0 when unreadable)"""
+    total = 0.0
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('duration '):
+                    total += float(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return total
+
+def shared_audio(folders, voice=None, backend=None):
+    """text_to_audio() once for reels with the same description, voice and backend, linked into every folder"""
+    ok = text_to_audio(folders[0], voice, backend)
+    if ok:
+        audio_file = os.path.join(UPLOAD_FOLDER, folders[0], "audio.mp3")
+        for folder in folders[1:]:
+            link_or_copy(audio_file, os.path.join(UPLOAD_FOLDER, folder, "audio.mp3"))
+    return ok
+
+def write_concat_list(folder, images):
+    """Write input.txt for ffmpeg's concat demuxer from [(image path, seconds)]"""
+    input_txt_path = os.path.join(UPLOAD_FOLDER, folder, "input.txt")
+    slide_timing.write_concat_entries(input_txt_path, images)
+    return input_txt_path
+
+def fit_slides(folder, profile, timing):
+    """Spread the slide durations in input.txt over the narration, on frame boundaries"""
+    if not timing["fit_audio"]:
+        return
+    input_file = os.path.join(UPLOAD_FOLDER, folder, "input.txt")
+    audio_file = os.path.join(UPLOAD_FOLDER, folder, "audio.mp3")
+    try:
+        fitted = slide_timing.fit_concat_list(
+            input_file, audio_file, get_profile(profile)[1]["fps"], timing["min_seconds"], timing["max_seconds"]
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not fit slides to the narration for {folder}, keeping the listed durations: {e}")
+        return
+    if fitted:
+        seconds, slides = fitted
+        logger.info(f"Fitted {slides} slides to {seconds:.2f}s of narration")
+        reel_jobs.publish(folder, "stage", stage="timed", seconds=round(seconds, 3), slides=slides)
+
+def track_audio(folder, audio_future):
+    """Record the audio_ready stage in the job index once text_to_audio() succeeds"""
+    def done(future):
+        if future.exception() is None and future.result():
+            job_index.update(folder, stage="audio_ready", audio=True)
+    audio_future.add_done_callback(done)
+    return audio_future
+
+def use_normalized_images(folder, normalized):
+    """Point the file lines of input.txt at the pre-normalised copies of the images
+
+    The canvases are hard-linked into the reel folder first, so image_cache
+    evicting them cannot pull an image out from under the render.
+    """
+    user_folder = os.path.join(UPLOAD_FOLDER, folder)
+    input_file = os.path.join(user_folder, "input.txt")
+    with open(input_file, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    for i, line in enumerate(lines):
+        if line.startswith('file '):
+            file_path = line[5:].strip().strip("'\"")
+            if file_path in normalized:
+                try:
+                    canvas = link_canvas(normalized[file_path], user_folder)
+                except OSError as e:
+                    logger.warning(f"Canvas for {file_path} is gone, ffmpeg will scale it instead: {e}")
+                    continue
+                lines[i] = f"file '{canvas.replace(os.sep, '/')}'"
+    # Renamed into place so the watcher's render worker never reads a half-written list
+    partial = f"{input_file}.{os.getpid()}.tmp"
+    with open(partial, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    os.replace(partial, input_file)
+
+def process_reel(folder, audio_future=None, image_futures=None, profile=None, timing=None):
+    """Job body for /create: render the reel once the audio is ready
+
+    audio_future is the text_to_audio() call /create already started and
+    image_futures the image normalisation it submitted; the image work runs
+    while the TTS call is in flight and the two only meet at the encode step.
+    profile is the encoder profile name (server default when None) and timing
+    the slide_timing.timing_options() for fitting the slides to the narration.
+    Returns the path of the finished MP4, raises RuntimeError on failure.
+    """
+    logger.info(f"Starting processing for {folder}")
+    user_folder = os.path.join(UPLOAD_FOLDER, folder)
+
+    if audio_future is None:
+        audio_future = track_audio(folder, tts_pool.submit(text_to_audio, folder))
+
+    if image_futures:
+        normalized = collect_normalized(image_futures)
+        if normalized:
+            use_normalized_images(folder, normalized)
+
+    image_files = prepare_reel(folder)
+
+    # Generate audio (check if it exists first)
+    audio_success = audio_future.result()
+    logger.info(f"Audio generation result: {audio_success}")
+    reel_jobs.publish(folder, "stage", stage="tts_done", ok=bool(audio_success))
+    if audio_success and image_files:
+        fit_slides(folder, profile, timing or slide_timing.timing_options())
+
+    # Always try to create reel, regardless of audio success
+    reel_success = create_reel(folder, image_files, profile) if image_files else False
+    logger.info(f"Reel creation result: {reel_success}")
+
+    if reel_success:  # Only require reel creation to succeed
+        reel_path = os.path.join(user_folder, f"{folder}.mp4")
+        if not os.path.exists(reel_path):
+            raise RuntimeError(f"Reel file not found at {reel_path}")
+        logger.info(f"Successfully processed reel for {folder}")
+        reel_jobs.update_meta(folder, output_bytes=os.path.getsize(reel_path))
+        return reel_path
+
+    error_msg = f"Processing failed - Audio: {audio_success}, Reel: {reel_success}"
+    logger.error(error_msg)
+
+    # Additional debugging info
+    debug_info = []
+    desc_file = os.path.join(user_folder, "desc.txt")
+    input_file = os.path.join(user_folder, "input.txt")
+    audio_file = os.path.join(user_folder, "audio.mp3")
+
+    debug_info.append(f"Description file exists: {os.path.exists(desc_file)}")
+    debug_info.append(f"Input file exists: {os.path.exists(input_file)}")
+    debug_info.append(f"Audio file exists: {os.path.exists(audio_file)}")
+
+    if os.path.exists(desc_file):
+        with open(desc_file, 'r', encoding='utf-8') as f:
+            desc_content = f.read()
+            debug_info.append(f"Description content length: {len(desc_content)}")
+
+    if os.path.exists(input_file):
+        with open(input_file, 'r', encoding='utf-8') as f:
+            input_content = f.read()
+            debug_info.append(f"Input file content: {input_content}")
+
+    debug_str = " | ".join(debug_info)
+    logger.error(f"Debug info: {debug_str}")
+    raise RuntimeError(f"{error_msg} | Debug: {debug_str}")
+
+def job_response(job):
+    """Public view of a job record (the result path stays server side)"""
+    view = {
+        "id": job["id"],
+        "state": job["state"],
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"],
+        "error": job["error"],
+        "meta": job["meta"],
+        "progress": job["progress"],
+        "status_url": url_for("job_status", job_id=job["id"]),
+        "events_url": url_for("job_events", job_id=job["id"]),
+    }
+    if job["state"] == "done":
+        view["result_url"] = url_for("job_result", job_id=job["id"])
+    return view
+
 @app.route("/")
 def home():
     return render_template("index.html")
 
+def stream_merged_pdf(input_files, merged_path, key):
+    """Yield merged PDF chunks while also writing them to merged_path and the merge cache
+
+    The 200 is already sent when a source fails mid-merge: the error is
+    re-raised so the server drops the connection rather than ending a
+    truncated download cleanly, and the partial file is removed.
+    """
+    partial_path = f"{merged_path}.part"
+    try:
+        with open(partial_path, "wb") as out:
+            for chunk in iter_merged_pdf(input_files):
+                out.write(chunk)
+                yield chunk
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            logger.error(f"PDF merge into {merged_path} failed mid-stream: {e}")
+        try:
+            os.remove(partial_path)
+        except FileNotFoundError:
+            pass
+        raise
+    os.replace(partial_path, merged_path)
+    merge_cache.put_file(key, merged_path)
+
 @app.route("/createpdf", methods=["GET", "POST"])
 def create_pdf():
     myid = str(uuid.uuid4())
@@ -225,7 +592,7 @@ def create_pdf():
             if file and file.filename.endswith('.pdf'):
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(user_folder, filename)
-                file.save(filepath)
+                save_upload(file, filepath)
                 input_files.append(filepath)
 
         with open(os.path.join(user_folder, "desc.txt"), "w") as f:
@@ -233,8 +600,17 @@ def create_pdf():
 
         if input_files:
             merged_path = os.path.join(user_folder, "merged.pdf")
-            merge_pdfs(input_files, merged_path)
-            return send_file(merged_path, as_attachment=True)
+            # The same PDFs in the same order were merged before: serve that file as-is
+            merge_key = merged_pdf_key(input_files)
+            if merge_cache.link_to(merge_key, merged_path):
+                logger.info(f"Merged PDF for {rec_id} served from merge cache")
+                return send_file(merged_path, as_attachment=True, download_name="merged.pdf")
+            # Stream the merge to the client as it is produced, keeping a copy as merged.pdf
+            return Response(
+                stream_with_context(stream_merged_pdf(input_files, merged_path, merge_key)),
+                mimetype="application/pdf",
+                headers={"Content-Disposition": "attachment; filename=merged.pdf"},
+            )
 
     return render_template("createpdf.html", myid=myid)
 
@@ -247,8 +623,18 @@ def create():
         desc = request.form.get("text", "")
         input_files = []
         
+        try:
+            profile_name, profile_settings = get_profile(request.form.get("profile"))
+            timing = slide_timing.timing_options(
+                request.form.get("fit_audio", True), request.form.get("min_seconds"), request.form.get("max_seconds")
+            )
+            tts_backend = request.form.get("tts_backend") or None
+            tts_backends.backend_chain(tts_backend)
+        except ValueError as e:
+            return f"Error: {e}", 400
+        
         logger.info(f"Record ID: {rec_id}")
-        logger.info(f"Description: {desc[:100]}...")
+        logger.info(f"Description: {len(desc)} characters")
         
         # Create user folder
         user_folder = os.path.join(app.config['UPLOAD_FOLDER'], rec_id)
@@ -256,147 +642,331 @@ def create():
         logger.info(f"Created user folder: {user_folder}")
         
         # Process uploaded files
+        saved_paths = []
         for key in request.files:
             file = request.files[key]
             if file and file.filename:
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(user_folder, filename)
-                file.save(filepath)
+                save_upload(file, filepath)
                 input_files.append(filename)
+                saved_paths.append(os.path.abspath(filepath).replace('\\', '/'))
                 logger.info(f"Saved file: {filename} to {filepath}")
         
+        if input_files:
+            job_index.record(str(rec_id))
+        
+        # Normalise the images on the process pool while the rest of the request runs
+        image_futures = submit_normalize(saved_paths)
+        
         # Save description
         if desc:
             desc_path = os.path.join(user_folder, "desc.txt")
             with open(desc_path, "w", encoding='utf-8') as f:
                 f.write(desc)
             logger.info(f"Saved description to: {desc_path}")
+            job_index.update(str(rec_id), desc=True)
+            # Start the TTS call now so it overlaps with the image checks
+            audio_future = track_audio(str(rec_id), tts_pool.submit(text_to_audio, str(rec_id), None, tts_backend))
+        else:
+            audio_future = None
         
         # Create input.txt for ffmpeg
         if input_files:
-            input_txt_path = os.path.join(user_folder, "input.txt")
-            with open(input_txt_path, "w", encoding='utf-8') as f:
-                for i, filename in enumerate(input_files):
-                    abs_path = os.path.abspath(os.path.join(user_folder, filename))
-                    # Convert Windows backslashes to forward slashes for FFmpeg compatibility
-                    normalized_path = abs_path.replace('\\', '/')
-                    f.write(f"file '{normalized_path}'\n")
-                    f.write(f"duration 3\n")  # 3 seconds per image
-                    # Add outpoint for last image to avoid ffmpeg issues
-                    if i == len(input_files) - 1:
-                        f.write(f"file '{normalized_path}'\n")
+            # 3 seconds per image
+            input_txt_path = write_concat_list(rec_id, [(os.path.join(user_folder, name), 3) for name in input_files])
             logger.info(f"Created input.txt at: {input_txt_path}")
+            job_index.update(str(rec_id), stage="uploaded", input=True)
             
-            # Log the content of input.txt for debugging
-            with open(input_txt_path, 'r', encoding='utf-8') as f:
-                input_content = f.read()
-                logger.info(f"Input.txt content:\n{input_content}")
-            
-            # Process immediately
+            # Hand the render off to the job queue and return right away
             try:
-                logger.info(f"Starting immediate processing for {rec_id}")
-                
-                # Generate audio (check if it exists first)
-                audio_success = text_to_audio(str(rec_id))
-                logger.info(f"Audio generation result: {audio_success}")
-                
-                # Always try to create reel, regardless of audio success
-                reel_success = create_reel(str(rec_id))
-                logger.info(f"Reel creation result: {reel_success}")
-                
-                if reel_success:  # Only require reel creation to succeed
-                    logger.info(f"Successfully processed reel for {rec_id}")
-                    # Return the reel file for download
-                    reel_path = os.path.join(user_folder, f"{rec_id}.mp4")
-                    if os.path.exists(reel_path):
-                        return send_file(reel_path, as_attachment=True, download_name=f"reel_{rec_id}.mp4")
-                    else:
-                        logger.error(f"Reel file not found: {reel_path}")
-                        return f"Error: Reel file not found at {reel_path}", 500
-                else:
-                    error_msg = f"Processing failed - Audio: {audio_success}, Reel: {reel_success}"
-                    logger.error(error_msg)
-                    
-                    # Additional debugging info
-                    debug_info = []
-                    desc_file = os.path.join(user_folder, "desc.txt")
-                    input_file = os.path.join(user_folder, "input.txt")
-                    audio_file = os.path.join(user_folder, "audio.mp3")
-                    
-                    debug_info.append(f"Description file exists: {os.path.exists(desc_file)}")
-                    debug_info.append(f"Input file exists: {os.path.exists(input_file)}")
-                    debug_info.append(f"Audio file exists: {os.path.exists(audio_file)}")
-                    
-                    if os.path.exists(desc_file):
-                        with open(desc_file, 'r', encoding='utf-8') as f:
-                            desc_content = f.read()
-                            debug_info.append(f"Description content length: {len(desc_content)}")
-                    
-                    if os.path.exists(input_file):
-                        with open(input_file, 'r', encoding='utf-8') as f:
-                            input_content = f.read()
-                            debug_info.append(f"Input file content: {input_content}")
-                    
-                    debug_str = " | ".join(debug_info)
-                    logger.error(f"Debug info: {debug_str}")
-                    
-                    return f"Error: {error_msg} | Debug: {debug_str}", 500
-                    
-            except Exception as e:
-                logger.error(f"Error processing reel immediately: {e}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                return f"Error: {str(e)}", 500
+                job = reel_jobs.submit(
+                    str(rec_id), process_reel, str(rec_id), audio_future, image_futures, profile_name, timing,
+                    meta={"encoder_profile": profile_name, "encoder_settings": profile_settings},
+                    stage={"stage": "upload_saved", "files": len(input_files)},
+                )
+            except QueueFullError as e:
+                logger.error(f"Rejecting reel {rec_id}: {e}")
+                job_index.update(str(rec_id), state="failed", error=str(e))
+                return jsonify({"error": str(e)}), 503
+
+            response = jsonify(job_response(job))
+            response.headers["Location"] = url_for("job_status", job_id=job["id"])
+            return response, 202
         
         return "Error: No files uploaded", 400
 
-    return render_template("create.html", myid=myid)
+    return render_template("create.html", myid=myid, profiles=list(ENCODER_PROFILES), default_profile=DEFAULT_ENCODER_PROFILE,
+                           tts_backends=list(tts_backends.BACKENDS))
+
+def batch_response(batch):
+    """Public view of a batch status with links to each item's job"""
+    for item in batch["items"]:
+        if item["state"] != "expired":
+            item["status_url"] = url_for("job_status", job_id=item["id"])
+        if item["state"] == "done":
+            item["result_url"] = url_for("job_result", job_id=item["id"])
+    batch["status_url"] = url_for("batch_status", batch_id=batch["id"])
+    return batch
+
+@app.route("/batches", methods=["POST"])
+def create_batch():
+    """Queue many reels from one upload: a JSON manifest plus the images it names
+
+    The manifest is the "manifest" form field, see batches.parse_manifest();
+    every file part is an image (sniffed like /create uploads), matched to the
+    manifest by file name. Images with the same content are stored once and
+    hard-linked into each reel folder and normalised once, and reels with the
+    same description and voice share one TTS call. Returns the batch status (202).
+    """
+    manifest = request.form.get("manifest")
+    try:
+        reels = batches.parse_manifest(manifest, extensions_for(UPLOAD_RULES["create_batch"]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    uploads = {}
+    for key, file in request.files.items(multi=True):
+        if file and file.filename:
+            uploads[secure_filename(file.filename)] = file
+    # A client id must be new: reusing one would overwrite a reel's inputs, possibly mid-render
+    taken = [reel["id"] for reel in reels if reel["id"] and (
+        os.path.exists(os.path.join(UPLOAD_FOLDER, reel["id"])) or job_index.get(reel["id"]) is not None)]
+    if taken:
+        return jsonify({"error": f"Reel ids already in use: {', '.join(taken)}"}), 409
+    missing = sorted({name for reel in reels for name, _ in reel["images"]} - set(uploads))
+    if missing:
+        return jsonify({"error": f"Manifest names files that were not uploaded: {', '.join(missing)}"}), 400
+    room = reel_jobs.max_pending - reel_jobs.pending_count()
+    if len(reels) > room:
+        return jsonify({"error": f"Reel queue has room for {max(0, room)} jobs, the batch has {len(reels)}"}), 503
+
+    batch_id = uuid.uuid4().hex
+    for reel in reels:
+        reel["id"] = reel["id"] or str(uuid.uuid1())
+        job_index.record(reel["id"])
+    logger.info(f"Batch {batch_id}: {len(reels)} reels, {len(uploads)} files")
+
+    # Save every uploaded file once, in the first reel that uses it; everything
+    # else (other reels, other names for the same bytes) is a hard link
+    saved = {}       # upload name -> canonical path
+    by_content = {}  # sha256 -> canonical path
+    for reel in reels:
+        folder = os.path.join(UPLOAD_FOLDER, reel["id"])
+        os.makedirs(folder, exist_ok=True)
+        reel["paths"], reel["sources"] = [], []
+        for name, seconds in reel["images"]:
+            path = os.path.join(folder, name)
+            if name not in saved:
+                digest = save_upload(uploads[name], path)
+                if digest in by_content:
+                    link_or_copy(by_content[digest], path)
+                saved[name] = by_content.setdefault(digest, path)
+            elif not os.path.exists(path):
+                link_or_copy(saved[name], path)
+            reel["paths"].append((path, seconds))
+            reel["sources"].append(saved[name])
+    normalize_futures = submit_normalize(sorted(by_content.values()))
+
+    # One TTS call per distinct (description, voice, backend)
+    speakers = {}
+    for reel in reels:
+        if reel["description"]:
+            with open(os.path.join(UPLOAD_FOLDER, reel["id"], "desc.txt"), "w", encoding='utf-8') as f:
+                f.write(reel["description"])
+            job_index.update(reel["id"], desc=True)
+            speakers.setdefault((reel["description"], reel["voice"], reel["tts_backend"]), []).append(reel["id"])
+    audio_futures = {}
+    for (_, voice, backend), folders in speakers.items():
+        future = tts_pool.submit(shared_audio, folders, voice, backend)
+        for folder in folders:
+            audio_futures[folder] = track_audio(folder, future)
+
+    for reel in reels:
+        write_concat_list(reel["id"], reel["paths"])
+        job_index.update(reel["id"], stage="uploaded", input=True)
+        # Keyed like the file lines of input.txt, so use_normalized_images() can swap them
+        image_futures = {
+            os.path.abspath(path).replace(os.sep, '/'): normalize_futures[source]
+            for (path, _), source in zip(reel["paths"], reel["sources"])
+        }
+        try:
+            reel_jobs.submit(
+                reel["id"], process_reel, reel["id"], audio_futures.get(reel["id"]), image_futures, reel["profile"],
+                reel["timing"],
+                meta={"encoder_profile": reel["profile"], "encoder_settings": reel["settings"], "batch": batch_id},
+                stage={"stage": "upload_saved", "files": len(reel["paths"])},
+            )
+        except QueueFullError as e:
+            logger.error(f"Rejecting reel {reel['id']} of batch {batch_id}: {e}")
+            job_index.update(reel["id"], state="failed", error=str(e))
+
+    batches.record(batch_id, [reel["id"] for reel in reels], {
+        "reels": len(reels),
+        "images": sum(len(reel["paths"]) for reel in reels),
+        "unique_images": len(by_content),
+        "descriptions": sum(len(folders) for folders in speakers.values()),
+        "tts_requests": len(speakers),
+    })
+    response = jsonify(batch_response(batches.get(batch_id)))
+    response.headers["Location"] = url_for("batch_status", batch_id=batch_id)
+    return response, 202
+
+@app.route("/batches/<batch_id>")
+def batch_status(batch_id):
+    batch = batches.get(batch_id)
+    if batch is None:
+        return jsonify({"error": "Unknown batch"}), 404
+    return jsonify(batch_response(batch))
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = reel_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_response(job))
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events stream of a job's state, stage and progress events
+
+    Past events are replayed first (after Last-Event-ID when reconnecting);
+    the stream ends once the job is done or failed.
+    """
+    if reel_jobs.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or 0)
+    except ValueError:
+        last_id = 0
+
+    def stream(after):
+        while True:
+            events = reel_jobs.wait_events(job_id, after, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                job = reel_jobs.get(job_id)
+                # None: the finished job has since been evicted from memory
+                if job is None or job["state"] in ("done", "failed"):
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event["event"] == "state" and event["data"]["state"] in ("done", "failed"):
+                    return
+
+    return Response(
+        stream_with_context(stream(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    """Stop the ffmpeg encode of a job that is waiting for an encoder slot, encoding, or encoding segments"""
+    job = reel_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    # A segmented render can be between segments, with nothing in the executor right now
+    if not (segments.cancel(job_id) or ffmpeg_executor.cancel(job_id)):
+        return jsonify({"error": "Job has no encode to cancel", **job_response(job)}), 409
+    return jsonify(job_response(reel_jobs.get(job_id))), 202
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = reel_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["state"] != "done":
+        return jsonify(job_response(job)), 409
+    return send_media(job["result"], as_attachment=True, download_name=f"reel_{job_id}.mp4")
+
+@app.route("/media/<kind>/<path:name>")
+def media(kind, name):
+    """Reels with range requests, ETags and optional X-Sendfile/X-Accel-Redirect offload"""
+    root = MEDIA_ROOTS.get(kind)
+    path = safe_join(root, name) if root else None
+    if path is None or not name.endswith(".mp4") or not os.path.isfile(path):
+        return jsonify({"error": "Not found"}), 404
+    return send_media(path)
 
 @app.route("/gallery")
 def gallery():
-    # Gallery is now empty since we don't store reels in static/reels anymore
-    # You can remove this route or keep it for future use
-    return render_template("gallery.html", reels=[])
+    """One page of the reel index; posters and previews are fetched lazily by the page"""
+    try:
+        reels, next_cursor = media_index.page(request.args.get("cursor"), GALLERY_PAGE_SIZE)
+    except ValueError:
+        return "Error: Invalid cursor", 400
+    for reel in reels:
+        reel["name"] = os.path.basename(reel["path"])
+    return render_template("gallery.html", reels=reels, next_cursor=next_cursor)
+
+@app.route("/gallery/<reel_id>/poster.jpg")
+def gallery_poster(reel_id):
+    reel = media_index.get(reel_id)
+    if reel is None or not os.path.exists(reel["path"]):
+        return jsonify({"error": "Not found"}), 404
+    poster = poster_for(reel)
+    if poster is None:
+        return jsonify({"error": "Could not create poster"}), 500
+    return send_media(poster, mimetype="image/jpeg")
+
+@app.route("/gallery/<reel_id>/preview.mp4")
+def gallery_preview(reel_id):
+    reel = media_index.get(reel_id)
+    if reel is None or not os.path.exists(reel["path"]):
+        return jsonify({"error": "Not found"}), 404
+    preview = preview_for(reel)
+    if preview is None:
+        return jsonify({"error": "Could not create preview"}), 500
+    return send_media(preview)
+
+@app.route("/gallery/<reel_id>/reel.mp4")
+def gallery_reel(reel_id):
+    reel = media_index.get(reel_id)
+    if reel is None or not os.path.exists(reel["path"]):
+        return jsonify({"error": "Not found"}), 404
+    return send_media(reel["path"])
+
+@app.route("/metrics")
+def metrics():
+    """Stage latencies, bytes, errors and queue gauges in the Prometheus text format"""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/status")
 def status():
-    """Debug endpoint to check processing status"""
+    """Processing status from the job index, one page at a time
+
+    Query parameters: state (queued/running/done/failed), cursor (from
+    next_cursor) and limit (at most STATUS_MAX_PAGE_SIZE).
+    """
+    try:
+        limit = min(int(request.args.get("limit", STATUS_PAGE_SIZE)), STATUS_MAX_PAGE_SIZE)
+        jobs, next_cursor = job_index.page(request.args.get("state"), request.args.get("cursor"), max(limit, 1))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid status query: {e}"}), 400
+
+    ffmpeg = ffmpeg_probe.probe()
     status_info = {
         "uploads_folder_exists": os.path.exists("user_uploads"),
-        "done_file_exists": os.path.exists("done.txt"),
-        "current_working_directory": os.getcwd()
+        "current_working_directory": os.getcwd(),
+        "jobs": jobs,
+        "next_cursor": next_cursor,
+        "pending_jobs": reel_jobs.pending_count(),
+        "ffmpeg_executor": ffmpeg_executor.stats(),
+        "ffmpeg_available": ffmpeg["available"],
+        "tts_cache": tts_cache.stats(),
+        "tts_circuit": voicerss_client.breaker.state,
+        "tts_backends": tts_backends.status(),
+        "render_cache": render_cache.stats(),
+        "segment_cache": segments.segment_cache.stats(),
+        "merge_cache": merge_cache.stats()
     }
-    
-    if os.path.exists("user_uploads"):
-        try:
-            upload_folders = os.listdir("user_uploads")
-            status_info["upload_folders"] = upload_folders
-            
-            # Get details for each folder
-            folder_details = {}
-            for folder in upload_folders:
-                folder_path = os.path.join("user_uploads", folder)
-                if os.path.isdir(folder_path):
-                    files = os.listdir(folder_path)
-                    folder_details[folder] = {
-                        "files": files,
-                        "has_desc": "desc.txt" in files,
-                        "has_input": "input.txt" in files,
-                        "has_audio": "audio.mp3" in files,
-                        "has_reel": any(f.endswith('.mp4') for f in files)
-                    }
-            status_info["folder_details"] = folder_details
-        except Exception as e:
-            status_info["upload_folders_error"] = str(e)
-    
-    # Check ffmpeg availability
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
-        status_info["ffmpeg_available"] = True
-        status_info["ffmpeg_version"] = result.stdout.split('\n')[0]
-    except FileNotFoundError:
-        status_info["ffmpeg_available"] = False
-        status_info["ffmpeg_error"] = "FFmpeg not found"
+    if ffmpeg["available"]:
+        status_info["ffmpeg_version"] = ffmpeg["version"]
+    else:
+        status_info["ffmpeg_error"] = ffmpeg["error"]
     
     return jsonify(status_info)
 
@@ -418,7 +988,7 @@ def test_input_format():
             test_image
         ]
         
-        subprocess.run(img_command, capture_output=True, text=True)
+        ffmpeg_executor.run(img_command, PRIORITY_DEBUG, stage="debug")
         
         if not os.path.exists(test_image):
             return jsonify({"error": "Could not create test image"})
@@ -443,11 +1013,11 @@ def test_input_format():
             '-f', 'concat', '-safe', '0',
             '-i', input_file,
             '-vf', 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black',
-            '-c:v', 'libx264', '-r', '30', '-pix_fmt', 'yuv420p',
+            '-c:v', 'libx264', '-threads', '1', '-r', '30', '-pix_fmt', 'yuv420p',
             output_file
         ]
         
-        result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+        result = ffmpeg_executor.run(command, PRIORITY_DEBUG, timeout=60, stage="debug")
         
         return jsonify({
             "test_folder": test_folder,
@@ -469,13 +1039,14 @@ def test_input_format():
 def test_ffmpeg():
     """Test FFmpeg functionality"""
     try:
-        # Test FFmpeg availability
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
+        # Test FFmpeg availability (re-probes and refreshes the cached capabilities)
+        ffmpeg = ffmpeg_probe.probe(refresh=True)
         
-        if result.returncode == 0:
+        if ffmpeg["available"]:
             return jsonify({
                 "ffmpeg_available": True,
-                "version": result.stdout.split('\n')[0],
+                "version": ffmpeg["version"],
+                "has_libx264": "libx264" in ffmpeg["encoders"],
                 "working_directory": os.getcwd(),
                 "can_write_uploads": os.access('user_uploads', os.W_OK),
                 "uploads_exists": os.path.exists('user_uploads')
@@ -483,8 +1054,7 @@ def test_ffmpeg():
         else:
             return jsonify({
                 "ffmpeg_available": False,
-                "error": result.stderr,
-                "return_code": result.returncode
+                "error": ffmpeg["error"]
             })
     except Exception as e:
         return jsonify({
@@ -506,11 +1076,12 @@ def test_create_video():
             '-f', 'lavfi',
             '-i', 'color=red:size=1080x1920:duration=2',
             '-c:v', 'libx264',
+            '-threads', '1',
             '-pix_fmt', 'yuv420p',
             os.path.join(test_path, 'test_video.mp4')
         ]
         
-        result = subprocess.run(command, capture_output=True, text=True, timeout=30)
+        result = ffmpeg_executor.run(command, PRIORITY_DEBUG, timeout=30, stage="debug")
         
         test_video_path = os.path.join(test_path, 'test_video.mp4')
         if result.returncode == 0 and os.path.exists(test_video_path):
@@ -537,7 +1108,12 @@ def test_create_video():
 
 @app.route("/test-audio")
 def test_audio():
-    """Test audio generation"""
+    """Test audio generation (?tts_backend= picks the backend to try first)"""
+    backend = request.args.get("tts_backend") or None
+    try:
+        tts_backends.backend_chain(backend)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     try:
         test_folder = "test_audio_" + str(uuid.uuid4())
         test_path = os.path.join('user_uploads', test_folder)
@@ -550,7 +1126,7 @@ def test_audio():
             f.write(test_text)
         
         # Test audio generation
-        audio_success = text_to_audio(test_folder)
+        audio_success = text_to_audio(test_folder, backend=backend)
         
         # Check if audio file was created
         audio_file = os.path.join(test_path, "audio.mp3")
@@ -573,7 +1149,12 @@ def test_audio():
 
 @app.route("/debug-processing")
 def debug_processing():
-    """Debug the entire processing pipeline"""
+    """Debug the entire processing pipeline (?tts_backend= picks the backend to try first)"""
+    backend = request.args.get("tts_backend") or None
+    try:
+        tts_backends.backend_chain(backend)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     try:
         test_folder = "debug_" + str(uuid.uuid4())
         test_path = os.path.join('user_uploads', test_folder)
@@ -606,7 +1187,7 @@ def debug_processing():
             temp_image
         ]
         
-        img_result = subprocess.run(img_command, capture_output=True, text=True)
+        img_result = ffmpeg_executor.run(img_command, PRIORITY_DEBUG, stage="debug")
         debug_info["steps"]["2_temp_image_created"] = os.path.exists(temp_image)
         
         if os.path.exists(temp_image):
@@ -616,7 +1197,7 @@ def debug_processing():
             debug_info["steps"]["3_input_txt_created"] = os.path.exists(input_file)
         
         # Step 3: Test audio generation
-        audio_success = text_to_audio(test_folder)
+        audio_success = text_to_audio(test_folder, backend=backend)
         debug_info["steps"]["4_audio_generation"] = audio_success
         
         audio_file = os.path.join(test_path, "audio.mp3")
@@ -624,7 +1205,7 @@ def debug_processing():
         
         # Step 4: Test reel creation
         if os.path.exists(input_file):
-            reel_success = create_reel(test_folder)
+            reel_success = create_reel(test_folder, priority=PRIORITY_DEBUG)
             debug_info["steps"]["5_reel_creation"] = reel_success
             
             reel_file = os.path.join(test_path, f"{test_folder}.mp4")
@@ -645,6 +1226,18 @@ if __name__ == "__main__":
     # Ensure required directories exist
     os.makedirs('user_uploads', exist_ok=True)
     
+    # Only walks the reel folders when the gallery index is empty (first start)
+    indexed = media_index.backfill_if_empty()
+    if indexed:
+        logger.info(f"Indexed {indexed} existing reels for the gallery")
+    
+    # Probe ffmpeg once up front; /status and the reel jobs reuse the result
+    ffmpeg = ffmpeg_probe.probe()
+    if ffmpeg["available"]:
+        logger.info(f"Using {ffmpeg['version']}")
+    else:
+        logger.error(f"FFmpeg is not available: {ffmpeg['error']}")
+    
     logger.info("Starting MediaMeld application")
     logger.info(f"Current working directory: {os.getcwd()}")
     logger.info(f"Upload folder: {UPLOAD_FOLDER}")
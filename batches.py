@@ -0,0 +1,199 @@
+# batches.py
+# Batch reel submissions: manifest validation, and the persistent list of which
+# reel jobs belong to which batch so one status call can report on all of them
+
+import os
+import re
+import json
+import time
+from werkzeug.utils import secure_filename
+import job_index
+from db import get_connection
+from encoder_profiles import get_profile
+from slide_timing import timing_options
+from tts_backends import backend_chain
+
+BATCH_MAX_REELS = int(os.environ.get("BATCH_MAX_REELS", 100))
+# Seconds an image stays on screen when the manifest does not say
+DEFAULT_IMAGE_SECONDS = 3
+MAX_IMAGE_SECONDS = 60
+MAX_DESCRIPTION_CHARS = 5000
+# Up to BATCH_MAX_REELS descriptions of MAX_DESCRIPTION_CHARS, plus the image lists
+MAX_MANIFEST_BYTES = int(os.environ.get("BATCH_MAX_MANIFEST_BYTES", 2 * 1024 * 1024))
+VOICE_PATTERN = re.compile(r"^[A-Za-z][A-Za-z-]{0,31}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    stats TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    job_id TEXT NOT NULL,
+    PRIMARY KEY (batch_id, position)
+);
+"""
+
+_initialized = False
+
+
+def _connection():
+    global _initialized
+    conn = get_connection()
+    if not _initialized:
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+def _image(entry, where):
+    """(file name, seconds) for one manifest image: "a.png" or {"file": "a.png", "duration": 2.5}"""
+    if isinstance(entry, str):
+        entry = {"file": entry}
+    if not isinstance(entry, dict) or not isinstance(entry.get("file"), str):
+        raise ValueError(f"{where}: each image must be a file name or an object with a 'file' name")
+    duration = entry.get("duration", DEFAULT_IMAGE_SECONDS)
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or not 0 < duration <= MAX_IMAGE_SECONDS:
+        raise ValueError(f"{where}: duration must be a number of seconds between 0 and {MAX_IMAGE_SECONDS}")
+    return secure_filename(entry["file"]), float(duration)
+
+
+def parse_manifest(text, allowed_extensions):
+    """Validate a batch manifest and return its reels with defaults applied
+
+    The manifest is {"profile": ..., "voice": ..., "reels": [{"id", "images",
+    "description", "voice", "profile"}, ...]}; top-level profile, voice,
+    tts_backend, fit_audio, min_seconds and max_seconds are defaults for the reels. Images
+    are file names of uploaded parts, optionally with a per-image duration
+    (the slide's weight when it is fitted to the narration). Each returned reel
+    has id (None when not given), images [(file, seconds)], description, voice
+    and tts_backend (None = server default), profile, settings and timing. Raises ValueError
+    describing the first problem.
+    """
+    try:
+        manifest = json.loads(text)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Manifest is not valid JSON: {e}") from None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("reels"), list) or not manifest["reels"]:
+        raise ValueError("Manifest needs a non-empty 'reels' list")
+    if len(manifest["reels"]) > BATCH_MAX_REELS:
+        raise ValueError(f"A batch holds at most {BATCH_MAX_REELS} reels")
+
+    reels = []
+    seen_ids = set()
+    for position, entry in enumerate(manifest["reels"]):
+        where = f"reels[{position}]"
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where} must be an object")
+        reel_id = entry.get("id")
+        if reel_id is not None:
+            if not isinstance(reel_id, str) or not reel_id or secure_filename(reel_id) != reel_id:
+                raise ValueError(f"{where}: id must be a plain folder name")
+            if reel_id in seen_ids:
+                raise ValueError(f"{where}: id '{reel_id}' is used twice")
+            seen_ids.add(reel_id)
+
+        images = entry.get("images")
+        if not isinstance(images, list) or not images:
+            raise ValueError(f"{where} needs a non-empty 'images' list")
+        images = [_image(image, f"{where}.images[{i}]") for i, image in enumerate(images)]
+        for name, _ in images:
+            if name.rsplit(".", 1)[-1].lower() not in allowed_extensions:
+                raise ValueError(f"{where}: '{name}' is not one of {', '.join(sorted(allowed_extensions))}")
+
+        description = entry.get("description", "")
+        if not isinstance(description, str) or len(description) > MAX_DESCRIPTION_CHARS:
+            raise ValueError(f"{where}: description must be text of at most {MAX_DESCRIPTION_CHARS} characters")
+        voice = entry.get("voice", manifest.get("voice"))
+        if voice is not None and (not isinstance(voice, str) or not VOICE_PATTERN.match(voice)):
+            raise ValueError(f"{where}: voice must be a VoiceRSS voice name such as 'Linda'")
+        tts_backend = entry.get("tts_backend", manifest.get("tts_backend"))
+        if tts_backend is not None and not isinstance(tts_backend, str):
+            raise ValueError(f"{where}: tts_backend must be a backend name")
+        try:
+            backend_chain(tts_backend)
+            profile, settings = get_profile(entry.get("profile", manifest.get("profile")))
+            timing = timing_options(*(entry.get(name, manifest.get(name, default)) for name, default in (
+                ("fit_audio", True), ("min_seconds", None), ("max_seconds", None))))
+        except ValueError as e:
+            raise ValueError(f"{where}: {e}") from None
+
+        reels.append({
+            "id": reel_id,
+            "images": images,
+            "description": description.strip(),
+            "voice": voice,
+            "tts_backend": tts_backend,
+            "profile": profile,
+            "settings": settings,
+            "timing": timing,
+        })
+    return reels
+
+
+def record(batch_id, job_ids, stats):
+    """Store which jobs (in manifest order) make up batch_id, plus its dedupe stats"""
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO batches (id, created, stats) VALUES (?, ?, ?)", (batch_id, time.time(), json.dumps(stats))
+        )
+        conn.executemany(
+            "INSERT INTO batch_items (batch_id, position, job_id) VALUES (?, ?, ?)",
+            [(batch_id, position, job_id) for position, job_id in enumerate(job_ids)],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _overall(counts, total):
+    if counts["queued"] + counts["running"]:
+        return "running"
+    if counts["done"] == total:
+        return "done"
+    if counts["failed"] == total:
+        return "failed"
+    return "partial"
+
+
+def get(batch_id):
+    """Batch status with every item's job state, or None for unknown ids
+
+    state is running while any item is queued or running, then done (every
+    item done), failed (every item failed) or partial.
+    """
+    conn = _connection()
+    batch = conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+    if batch is None:
+        return None
+    job_ids = [row["job_id"] for row in conn.execute(
+        "SELECT job_id FROM batch_items WHERE batch_id = ? ORDER BY position", (batch_id,)
+    )]
+    jobs = job_index.get_many(job_ids)
+    # "expired": the lifecycle sweep has since removed the job and its files
+    counts = dict.fromkeys((*job_index.STATES, "expired"), 0)
+    items = []
+    for position, job_id in enumerate(job_ids):
+        job = jobs.get(job_id)
+        state = job["state"] if job else "expired"
+        counts[state] += 1
+        items.append({
+            "position": position,
+            "id": job_id,
+            "state": state,
+            "error": job["error"] if job else None,
+            "stages": job["stages"] if job else None,
+        })
+    return {
+        "id": batch["id"],
+        "created": batch["created"],
+        "state": _overall(counts, len(items)),
+        "counts": counts,
+        "stats": json.loads(batch["stats"]),
+        "items": items,
+    }
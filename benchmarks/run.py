@@ -0,0 +1,263 @@
+# benchmarks/run.py
+# Times the reel and PDF pipelines on synthetic inputs and writes the results as JSON.
+#
+#   python benchmarks/run.py --output before.json
+#   python benchmarks/run.py --baseline before.json --threshold 0.15   # exit 1 on regressions
+#
+# Everything runs in a scratch directory with empty caches, against a local VoiceRSS
+# stub. Stages that need something missing here (ffmpeg, Pillow) are reported as skipped.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import platform
+import statistics
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [BENCH_DIR, REPO_ROOT]
+
+from synthetic import pdf_bytes, png_bytes  # noqa: E402
+from voicerss_stub import VoiceRSSStub  # noqa: E402
+
+# Differences below this many seconds are noise, not regressions
+NOISE_FLOOR = 0.005
+
+
+def parse_sizes(value):
+    sizes = []
+    for size in value.split(","):
+        width, height = size.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def parse_ints(value):
+    return [int(n) for n in value.split(",")]
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def timed(func, repeat, before=None):
+    """Run func repeat times (calling before() untimed first each time); returns a result entry"""
+    runs = []
+    value = None
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        value = func()
+        runs.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(runs),
+        "min": min(runs),
+        "max": max(runs),
+        "runs": runs,
+    }, value
+
+
+def clear_cache(cache):
+    """Empty a BlobCache so the next run measures the real work"""
+    shutil.rmtree(cache.directory, ignore_errors=True)
+    cache._index = None
+
+
+def write_image_set(folder, count, size):
+    """Write count PNGs and an input.txt like /create does; returns the image paths"""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.abspath(os.path.join(folder, f"image{i}.png")).replace('\\', '/')
+        with open(path, "wb") as f:
+            f.write(png_bytes(*size, seed=i))
+        paths.append(path)
+    with open(os.path.join(folder, "input.txt"), "w", encoding="utf-8") as f:
+        for path in paths:
+            f.write(f"file '{path}'\nduration 3\n")
+        f.write(f"file '{paths[-1]}'\n")
+    return paths
+
+
+def bench_tts(results, args):
+    from text_to_audio import text_to_speech_file, tts_cache
+
+    text = "MediaMeld benchmark narration for a synthetic reel. " * 4
+    counter = iter(range(1_000_000))
+    os.makedirs(os.path.join("user_uploads", "bench_tts"), exist_ok=True)
+    # A different text every run misses the TTS cache; the same text every run hits it
+    results["tts.cold"], _ = timed(lambda: text_to_speech_file(f"{text} {next(counter)}", "bench_tts"), args.repeat)
+    text_to_speech_file(text, "bench_tts")
+    results["tts.warm"], _ = timed(lambda: text_to_speech_file(text, "bench_tts"), args.repeat)
+    results["tts.cold"]["latency_setting"] = args.tts_latency
+    results["tts.cache"] = tts_cache.stats()
+
+
+def bench_images(results, args, image_sets):
+    import image_prep
+
+    for (count, size), paths in image_sets.items():
+        name = f"images.normalize[{count}x{size[0]}x{size[1]}]"
+        if image_prep.Image is None:
+            results[name] = {"skipped": "Pillow is not installed"}
+            continue
+        results[name], _ = timed(
+            lambda: image_prep.collect_normalized(image_prep.submit_normalize(paths)),
+            args.repeat,
+            before=lambda: clear_cache(image_prep.image_cache),
+        )
+
+
+def bench_reels(results, args, image_sets):
+    import ffmpeg_probe
+    from render_cache import render_cache
+    from segments import segment_cache
+
+    if not ffmpeg_probe.probe()["available"]:
+        for count, size in image_sets:
+            results[f"reel.encode[{count}x{size[0]}x{size[1]}]"] = {"skipped": "ffmpeg is not available"}
+        return
+
+    import app
+    from text_to_audio import text_to_speech_file
+
+    for (count, size), paths in image_sets.items():
+        folder = os.path.basename(os.path.dirname(paths[0]))
+        text_to_speech_file("Benchmark narration. " * count, folder)
+        name = f"reel.encode[{count}x{size[0]}x{size[1]}]"
+        # Reels with enough images render in segments, which are cached separately from whole reels
+        results[name], ok = timed(lambda: app.create_reel(folder), args.repeat,
+                                  before=lambda: (clear_cache(render_cache), clear_cache(segment_cache)))
+        output = os.path.join("user_uploads", folder, f"{folder}.mp4")
+        if ok and os.path.exists(output):
+            results[name]["output_bytes"] = os.path.getsize(output)
+        else:
+            results[name]["error"] = "create_reel failed"
+
+
+def bench_pdfs(results, args):
+    from pdf_merge import write_merged_pdf
+    from generate_merge import merge_pdfs
+
+    os.makedirs("pdf_bench", exist_ok=True)
+    for pages in args.pdf_pages:
+        # The pages are spread over a few source files, like a real multi-upload merge
+        paths = []
+        for i in range(args.pdf_files):
+            path = os.path.join("pdf_bench", f"p{pages}_{i}.pdf")
+            with open(path, "wb") as f:
+                count = pages // args.pdf_files + (1 if i < pages % args.pdf_files else 0)
+                f.write(pdf_bytes(max(1, count), label=f"File {i}"))
+            paths.append(path)
+        output = os.path.join("pdf_bench", f"merged_{pages}.pdf")
+        name = f"pdf.merge[{pages}]"
+        results[name], _ = timed(lambda: write_merged_pdf(paths, output), args.repeat)
+        results[name]["output_bytes"] = os.path.getsize(output)
+        merge_pdfs(paths, output)
+        results[f"pdf.merge_cached[{pages}]"], _ = timed(lambda: merge_pdfs(paths, output), args.repeat)
+
+
+def compare(results, baseline, threshold):
+    """Print stage medians against a baseline run; returns the names that regressed"""
+    regressions = []
+    for name, entry in sorted(results.items()):
+        before = baseline.get("results", {}).get(name)
+        if not isinstance(before, dict) or "median" not in before or "median" not in entry:
+            continue
+        old, new = before["median"], entry["median"]
+        change = (new - old) / old if old else 0.0
+        regressed = change > threshold and new - old > NOISE_FLOOR
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"[{flag}] {name}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms ({change:+.1%})", file=sys.stderr)
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the reel and PDF pipelines")
+    parser.add_argument("--images", type=parse_ints, default=[3, 10], help="image counts per reel, e.g. 3,10")
+    parser.add_argument("--resolutions", type=parse_sizes, default=[(720, 1280), (1920, 2560)],
+                        help="image sizes, e.g. 720x1280,1920x2560")
+    parser.add_argument("--pdf-pages", type=parse_ints, default=[10, 100], help="total pages per merge, e.g. 10,100")
+    parser.add_argument("--pdf-files", type=int, default=4, help="source PDFs the pages are spread over")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="seconds the VoiceRSS stub waits per request")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", default="tts,images,reels,pdfs")
+    parser.add_argument("--output", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown per stage, 0.10 = 10%%")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+    stages = set(args.stages.split(","))
+
+    workdir = tempfile.mkdtemp(prefix="mediameld-bench-")
+    # The pipeline prints progress; keep stdout for the JSON results
+    with VoiceRSSStub(latency=args.tts_latency) as stub, contextlib.redirect_stdout(sys.stderr):
+        # Module-level settings are read at import, so set them before anything is imported
+        os.environ["VOICERSS_URL"] = stub.url
+        # The tts stages measure the VoiceRSS path, not a local fallback
+        os.environ.setdefault("TTS_BACKENDS", "voicerss")
+        os.environ.setdefault("LIFECYCLE_INTERVAL", "0")
+        os.chdir(workdir)
+        print(f"[INFO] Benchmarking in {workdir}", file=sys.stderr)
+
+        image_sets = {}
+        for count in args.images:
+            for size in args.resolutions:
+                folder = os.path.join("user_uploads", f"bench_{count}_{size[0]}x{size[1]}")
+                image_sets[(count, size)] = write_image_set(folder, count, size)
+
+        results = {}
+        if "tts" in stages:
+            bench_tts(results, args)
+        if "images" in stages:
+            bench_images(results, args, image_sets)
+        if "reels" in stages:
+            bench_reels(results, args, image_sets)
+        if "pdfs" in stages:
+            bench_pdfs(results, args)
+        results["tts.stub_requests"] = stub.requests
+
+    os.chdir(REPO_ROOT)
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "keep")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"[INFO] Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} stages regressed by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
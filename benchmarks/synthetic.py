@@ -0,0 +1,74 @@
+# benchmarks/synthetic.py
+# Deterministic synthetic inputs for the benchmarks: PNG images, multi-page PDFs and
+# silent MP3 audio, written with the standard library only
+
+import random
+import struct
+import zlib
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono, no CRC
+MP3_FRAME_HEADER = b"\xff\xfb\x90\xc4"
+MP3_FRAME_BYTES = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def png_bytes(width, height, seed=0):
+    """An RGB PNG with a gradient plus noise, so encoders see realistic detail"""
+    rng = random.Random(seed)
+    noise = bytes(rng.randrange(32) for _ in range(4096))
+    rows = []
+    for y in range(height):
+        shade = y * 255 // max(1, height - 1)
+        row = bytearray(width * 3)
+        for x in range(0, width * 3, 3):
+            n = noise[(x + y * 7) % len(noise)]
+            row[x] = (x // 3 * 255 // max(1, width - 1)) ^ n
+            row[x + 1] = shade ^ n
+            row[x + 2] = (seed * 40 + n) & 0xFF
+        rows.append(b"\x00" + bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def pdf_bytes(pages, label="Benchmark"):
+    """A PDF with one line of text on each of `pages` pages"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        text = f"BT /F1 24 Tf 72 720 Td ({label} page {page + 1}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        content_num = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_num
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def mp3_bytes(seconds):
+    """Silent MP3 audio of roughly `seconds` length (all-zero Layer III frames)"""
+    frames = max(1, round(seconds / MP3_FRAME_SECONDS))
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - len(MP3_FRAME_HEADER))
+    return frame * frames
@@ -0,0 +1,56 @@
+# benchmarks/voicerss_stub.py
+# Local stand-in for the VoiceRSS API with configurable latency, so TTS timings
+# do not depend on the network or an API key
+
+import time
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from synthetic import mp3_bytes
+
+# Roughly how fast a voice reads, used to size the returned audio
+CHARS_PER_SECOND = 15
+
+
+class VoiceRSSStub:
+    """Serves silent MP3s sized to the request text after `latency` seconds
+
+    Every failure_every-th request answers 503 instead (0 never fails).
+    """
+
+    def __init__(self, latency=0.2, failure_every=0):
+        self.latency = latency
+        self.failure_every = failure_every
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if stub.failure_every and stub.requests % stub.failure_every == 0:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+                text = query.get("src", [""])[0]
+                body = mp3_bytes(max(1.0, len(text) / CHARS_PER_SECOND))
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="voicerss-stub", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
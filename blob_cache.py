@@ -0,0 +1,223 @@
+# blob_cache.py
+# Content-addressed on-disk cache with LRU eviction under a byte budget
+
+import os
+import shutil
+import hashlib
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+# Every BlobCache created in this process, so the lifecycle quota can count and evict them
+caches = []
+
+
+def cache_key(*parts):
+    """Stable sha256 key for any JSON-serialisable parts"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest (replacing dest), copying when a link is not possible"""
+    tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    if os.path.lexists(tmp):
+        # rename() is a no-op when dest already is a link to the same file
+        os.unlink(tmp)
+
+
+class BlobCache:
+    """Files stored as <directory>/<key[:2]>/<key><suffix>
+
+    Entries are evicted least-recently-used first once the total size exceeds
+    max_bytes, and entries not used for max_age seconds are dropped as well.
+    The index is built from the directory once and then kept in memory, with
+    a running byte total so stats() and eviction do not add it up again.
+    """
+
+    def __init__(self, directory, max_bytes, max_age=None, suffix=""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = None  # key -> [size, last_used]
+        self._bytes = 0  # Total size of the entries in _index
+        self._lock = threading.Lock()
+        caches.append(self)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        self._bytes = 0
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(self.suffix) and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    key = entry.name[:len(entry.name) - len(self.suffix)] if self.suffix else entry.name
+                    self._set(key, stat.st_size, stat.st_mtime)
+
+    def _set(self, key, size, last_used):
+        old = self._index.get(key)
+        self._bytes += size - (old[0] if old else 0)
+        self._index[key] = [size, last_used]
+
+    def _drop(self, key):
+        """Forget key; returns True if it was indexed"""
+        old = self._index.pop(key, None)
+        if old is None:
+            return False
+        self._bytes -= old[0]
+        return True
+
+    def get(self, key):
+        """Return the cached path for key and mark it as recently used, or None"""
+        path = self.path_for(key)
+        with self._lock:
+            self._load_index()
+            if not os.path.exists(path):
+                self._drop(key)
+                self.misses += 1
+                return None
+            now = time.time()
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            self._set(key, os.path.getsize(path), now)
+            self.hits += 1
+            return path
+
+    def put_bytes(self, key, data):
+        """Store data under key and return the cached path"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._added(key, len(data))
+        return path
+
+    def put_file(self, key, src):
+        """Store a copy (or hard link) of src under key and return the cached path"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        link_or_copy(src, path)
+        self._added(key, os.path.getsize(path))
+        return path
+
+    def adopt(self, key):
+        """Register a file something else wrote directly at path_for(key)"""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            self._added(key, os.path.getsize(path))
+        return path
+
+    def link_to(self, key, dest):
+        """Materialise the entry for key at dest; returns dest or None on a miss"""
+        path = self.get(key)
+        if path is None:
+            return None
+        link_or_copy(path, dest)
+        return dest
+
+    def _added(self, key, size):
+        with self._lock:
+            self._load_index()
+            self._set(key, size, time.time())
+            self._evict()
+
+    def _evict(self):
+        if self.max_age is None and self._bytes <= self.max_bytes:
+            return
+        now = time.time()
+        # Oldest first; expired entries go regardless of the byte budget
+        for key, (size, last_used) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            expired = self.max_age is not None and now - last_used > self.max_age
+            if not expired and self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            self._drop(key)
+            self.evictions += 1
+
+    def entries(self):
+        """Snapshot of (key, path, size, last_used) for every entry"""
+        with self._lock:
+            self._load_index()
+            return [(key, self.path_for(key), size, last_used) for key, (size, last_used) in self._index.items()]
+
+    def discard(self, key):
+        """Remove the entry for key, if any (for eviction decided outside the cache)"""
+        with self._lock:
+            self._load_index()
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            if self._drop(key):
+                self.evictions += 1
+
+    def stats(self):
+        """Counters and running totals; cheap enough for /status on every request
+
+        Never walks the directory: entries and bytes are None until the cache
+        is first used (or scanned by the lifecycle sweep).
+        """
+        with self._lock:
+            loaded = self._index is not None
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._index) if loaded else None,
+                "bytes": self._bytes if loaded else None,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class SingleFlight:
+    """Per-key locks so concurrent producers of the same cache entry run only once
+
+    The first caller for a key does the work; the others block on the same lock
+    and find the finished entry in the cache when they get it.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, number of holders/waiters]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
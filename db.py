@@ -0,0 +1,29 @@
+# db.py
+# Shared SQLite access for the small bits of persistent state the processors keep
+
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.environ.get("MEDIAMELD_DB", "mediameld.db")
+
+_local = threading.local()
+
+
+def get_connection(path=DB_PATH):
+    """Return this thread's connection to the database at path
+
+    Connections are cached per thread (sqlite3 objects cannot be shared across
+    threads) and run in WAL mode so readers never block the writer.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = conn
+    return conn
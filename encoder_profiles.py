@@ -0,0 +1,65 @@
+# encoder_profiles.py
+# Named libx264 settings for reels. Reels are slideshows of stills, so every
+# profile uses -tune stillimage and a long GOP: repeated frames cost almost nothing.
+
+import os
+
+ENCODER_PROFILES = {
+    "fast": {
+        "preset": "veryfast",
+        "crf": 26,
+        "fps": 24,
+        "gop_seconds": 6,
+        "threads": 2,
+        "tune": "stillimage",
+    },
+    "balanced": {
+        "preset": "medium",
+        "crf": 23,
+        "fps": 30,
+        "gop_seconds": 4,
+        "threads": 2,
+        "tune": "stillimage",
+    },
+    "archive": {
+        "preset": "slow",
+        "crf": 18,
+        "fps": 30,
+        "gop_seconds": 2,
+        "threads": 4,
+        "tune": "stillimage",
+    },
+}
+
+DEFAULT_ENCODER_PROFILE = os.environ.get("REEL_ENCODER_PROFILE", "balanced")
+
+# Fast-start layout: the moov atom goes before the media data so playback can begin while downloading
+CONTAINER_ARGS = ['-movflags', '+faststart']
+
+
+def get_profile(name=None):
+    """Return (name, settings) for name, or for the server default when name is empty
+
+    Raises ValueError for unknown profile names.
+    """
+    name = name or DEFAULT_ENCODER_PROFILE
+    if name not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile '{name}' (choose from {', '.join(ENCODER_PROFILES)})")
+    return name, ENCODER_PROFILES[name]
+
+
+def video_args(profile):
+    """ffmpeg output arguments for the video stream of a reel"""
+    gop = profile["fps"] * profile["gop_seconds"]
+    return [
+        '-c:v', 'libx264',
+        '-preset', profile["preset"],
+        '-crf', str(profile["crf"]),
+        '-tune', profile["tune"],
+        '-g', str(gop),
+        '-keyint_min', str(gop),
+        '-sc_threshold', '0',
+        '-threads', str(profile["threads"]),
+        '-r', str(profile["fps"]),
+        '-pix_fmt', 'yuv420p',
+    ]
@@ -0,0 +1,285 @@
+# ffmpeg_pool.py
+# Every ffmpeg process goes through one executor that admits jobs into a fixed
+# thread budget, so concurrent encodes queue up instead of oversubscribing the cores
+
+import os
+import heapq
+import itertools
+import threading
+import subprocess
+import logging
+import time
+from collections import deque
+from metrics import register_gauge, stage_errors, stage_seconds, time_stage
+
+logger = logging.getLogger(__name__)
+
+# Total encoder threads all running ffmpeg processes may use together
+FFMPEG_THREAD_BUDGET = int(os.environ.get("FFMPEG_THREAD_BUDGET", os.cpu_count() or 2))
+
+# Lines of stdout/stderr kept per ffmpeg run, and the longest line kept whole
+FFMPEG_OUTPUT_TAIL_LINES = int(os.environ.get("FFMPEG_OUTPUT_TAIL_LINES", 40))
+MAX_LINE_CHARS = 1000
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the result (/create, gallery thumbnails)
+PRIORITY_BACKGROUND = 1   # Folder watcher
+PRIORITY_DEBUG = 2        # Self-test and debug endpoints
+
+
+class FFmpegCancelled(Exception):
+    """Raised by FFmpegExecutor.run() when the job was cancelled"""
+
+
+def parse_progress(block):
+    """Turn one block of -progress key=value lines into {"out_time", "speed", "fps", "frame", "done"}
+
+    out_time is in seconds; values ffmpeg reports as N/A come back as None.
+    """
+    def number(value):
+        try:
+            return float(value.rstrip("x"))
+        except (AttributeError, ValueError):
+            return None
+
+    out_time = number(block.get("out_time_us"))
+    return {
+        "out_time": round(out_time / 1_000_000, 3) if out_time is not None and out_time >= 0 else None,
+        "speed": number(block.get("speed")),
+        "fps": number(block.get("fps")),
+        "frame": int(number(block.get("frame")) or 0),
+        "done": block.get("progress") == "end",
+    }
+
+
+def threads_in(command):
+    """The -threads value in an ffmpeg command (1 when absent or 0/auto)"""
+    for flag, value in zip(command, command[1:]):
+        if flag == '-threads' and value.isdigit() and int(value) > 0:
+            return int(value)
+    return 1
+
+
+def failure_cause(error):
+    if isinstance(error, subprocess.TimeoutExpired):
+        return "timeout"
+    if isinstance(error, FFmpegCancelled):
+        return "cancelled"
+    return type(error).__name__
+
+
+class OutputTail:
+    """The last `lines` lines of an output stream, each cut to MAX_LINE_CHARS
+
+    Memory stays the same for a 2 second or a 2 hour encode. Text-mode pipes
+    turn ffmpeg's carriage-return stats updates into lines, so they rotate
+    out like everything else.
+    """
+
+    def __init__(self, lines=None):
+        self._lines = deque(maxlen=lines or FFMPEG_OUTPUT_TAIL_LINES)
+
+    def feed(self, stream):
+        for line in stream:
+            self._lines.append(line[:MAX_LINE_CHARS])
+
+    def text(self):
+        return "".join(self._lines)
+
+
+def save_output_tail(path, result):
+    """Write the command, exit status and output tails of a failed ffmpeg run to path
+
+    result is the CompletedProcess or the TimeoutExpired. Returns path, or
+    None when it could not be written.
+    """
+    status = f"timed out after {result.timeout}s" if isinstance(result, subprocess.TimeoutExpired) \
+        else f"exit code {result.returncode}"
+    command = result.cmd if isinstance(result, subprocess.TimeoutExpired) else result.args
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"$ {' '.join(command)}\n# {status}\n")
+            for name, text in (("stdout", result.stdout), ("stderr", result.stderr)):
+                if text:
+                    f.write(f"# {name} (last {FFMPEG_OUTPUT_TAIL_LINES} lines)\n{text}")
+    except OSError as e:
+        logger.error(f"Could not write ffmpeg log {path}: {e}")
+        return None
+    return path
+
+
+class _Job:
+    def __init__(self, command, threads, priority, job_id, cancel_event=None):
+        self.command = command
+        self.threads = threads
+        self.priority = priority
+        self.job_id = job_id
+        self.cancel_event = cancel_event
+        self.process = None
+        self.cancelled = False
+
+    def is_cancelled(self):
+        return self.cancelled or (self.cancel_event is not None and self.cancel_event.is_set())
+
+
+class FFmpegExecutor:
+    """Runs ffmpeg commands within a budget of threads, highest priority first
+
+    A job waits until its thread count fits in what is left of the budget and
+    no job of higher (or equal, earlier) priority is waiting ahead of it. A job
+    asking for more than the whole budget runs alone.
+    """
+
+    def __init__(self, thread_budget=FFMPEG_THREAD_BUDGET):
+        self.thread_budget = max(1, thread_budget)
+        self._in_use = 0
+        self._waiting = []  # heap of (priority, sequence, job)
+        self._running = set()
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _fits(self, job):
+        return not self._running or self._in_use + job.threads <= self.thread_budget
+
+    def _admit(self, job):
+        """Block until job is at the head of the queue and fits in the budget"""
+        entry = (job.priority, next(self._sequence), job)
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while not job.is_cancelled() and not (self._waiting[0] is entry and self._fits(job)):
+                    self._cond.wait()
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                # The new head may fit now
+                self._cond.notify_all()
+            if job.is_cancelled():
+                raise FFmpegCancelled(f"FFmpeg job {job.job_id} was cancelled")
+            self._in_use += job.threads
+            self._running.add(job)
+
+    def _release(self, job):
+        with self._cond:
+            self._running.discard(job)
+            self._in_use -= job.threads
+            self._cond.notify_all()
+
+    def run(self, command, priority=PRIORITY_INTERACTIVE, timeout=None, job_id=None, threads=None, on_progress=None,
+            cancel_event=None, stage="ffmpeg_encode"):
+        """Run an ['ffmpeg', ...] command and return the CompletedProcess
+
+        stdout and stderr in the result hold only the last
+        FFMPEG_OUTPUT_TAIL_LINES lines of each (see OutputTail), however long
+        the encode runs. threads defaults to the -threads value in the command,
+        and stage is the label its time and errors are recorded under
+        (reel_encode, segment_encode, thumbnail, ...).
+        With on_progress ffmpeg also writes -progress reports to stdout, and
+        on_progress is called with each parse_progress() result as it arrives
+        (stdout is then empty). Raises subprocess.TimeoutExpired (with the
+        tails) when the process runs longer than timeout seconds (the wait for
+        a slot does not count), FFmpegCancelled when cancel(job_id) is called
+        or cancel_event is set before the process starts (set it, then call
+        cancel(job_id) to also stop running ones), and FileNotFoundError
+        without ffmpeg.
+        """
+        if on_progress is not None:
+            command = [command[0], '-progress', 'pipe:1', '-nostats', *command[1:]]
+        job = _Job(command, threads or threads_in(command), priority, job_id, cancel_event)
+        queued = time.perf_counter()
+        self._admit(job)
+        stage_seconds.observe(time.perf_counter() - queued, stage="ffmpeg_queue_wait")
+        try:
+            logger.info(f"Starting ffmpeg ({job.threads} threads, priority {priority}): {' '.join(command)}")
+            with self._cond:
+                # cancel() may have run after _admit(); it holds this lock, so it cannot slip in after the check
+                if job.is_cancelled():
+                    stage_errors.inc(stage=stage, cause="cancelled")
+                    raise FFmpegCancelled(f"FFmpeg job {job_id} was cancelled")
+                job.process = subprocess.Popen(
+                    command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL, text=True
+                )
+            with time_stage(stage, error_cause=failure_cause):
+                stdout, stderr = self._collect(job.process, on_progress, timeout)
+                if job.is_cancelled():
+                    raise FFmpegCancelled(f"FFmpeg job {job_id} was cancelled")
+            if job.process.returncode != 0:
+                stage_errors.inc(stage=stage, cause=f"exit_{job.process.returncode}")
+            return subprocess.CompletedProcess(command, job.process.returncode, stdout.text(), stderr.text())
+        except FileNotFoundError:
+            stage_errors.inc(stage=stage, cause="missing_binary")
+            raise
+        finally:
+            self._release(job)
+
+    def _collect(self, process, on_progress, timeout):
+        """Drain stdout and stderr until ffmpeg exits; returns their (stdout, stderr) OutputTails"""
+        stdout, stderr = OutputTail(), OutputTail()
+        reader = threading.Thread(target=stderr.feed, args=(process.stderr,), name="ffmpeg-stderr", daemon=True)
+        reader.start()
+        timed_out = threading.Event()
+
+        def expire():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, expire) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            if on_progress is None:
+                stdout.feed(process.stdout)
+            else:
+                self._follow_progress(process.stdout, on_progress)
+            process.wait()
+            reader.join()
+        finally:
+            if timer:
+                timer.cancel()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(process.args, timeout, output=stdout.text(), stderr=stderr.text())
+        return stdout, stderr
+
+    def _follow_progress(self, lines, on_progress):
+        """Call on_progress for every -progress block read from lines"""
+        block = {}
+        for line in lines:
+            key, _, value = line.strip().partition("=")
+            block[key] = value
+            if key == "progress":
+                try:
+                    on_progress(parse_progress(block))
+                except Exception as e:
+                    logger.error(f"Progress callback failed: {e}")
+                block = {}
+
+    def cancel(self, job_id):
+        """Cancel the waiting or running ffmpeg work for job_id; returns False if there was none"""
+        with self._cond:
+            jobs = [job for job in self._running if job.job_id == job_id]
+            jobs += [job for _, _, job in self._waiting if job.job_id == job_id]
+            for job in jobs:
+                job.cancelled = True
+                if job.process is not None and job.process.poll() is None:
+                    job.process.kill()
+            self._cond.notify_all()
+        if jobs:
+            logger.info(f"Cancelled ffmpeg work for job {job_id}")
+        return bool(jobs)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "thread_budget": self.thread_budget,
+                "threads_in_use": self._in_use,
+                "running": len(self._running),
+                "waiting": len(self._waiting),
+            }
+
+
+ffmpeg_executor = FFmpegExecutor()
+
+register_gauge("mediameld_ffmpeg_running", "ffmpeg processes running", lambda: ffmpeg_executor.stats()["running"])
+register_gauge("mediameld_ffmpeg_waiting", "ffmpeg jobs waiting for encoder threads", lambda: ffmpeg_executor.stats()["waiting"])
+register_gauge("mediameld_ffmpeg_threads_in_use", "Encoder threads in use out of the budget",
+               lambda: ffmpeg_executor.stats()["threads_in_use"])
@@ -0,0 +1,47 @@
+# ffmpeg_probe.py
+# One `ffmpeg -version` / `ffmpeg -encoders` check per process instead of one per request or job
+
+import threading
+import subprocess
+
+_lock = threading.Lock()
+_capabilities = None
+
+
+def _encoders():
+    """Names of the encoders this ffmpeg build provides"""
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=10)
+    encoders = set()
+    for line in result.stdout.split('\n'):
+        # " V....D libx264              libx264 H.264 / AVC ..." after the "------" separator
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            encoders.add(parts[1])
+    return sorted(encoders)
+
+
+def probe(refresh=False):
+    """Return {"available", "version", "encoders", "error"} for the ffmpeg on PATH, cached after the first call"""
+    global _capabilities
+    with _lock:
+        if _capabilities is None or refresh:
+            try:
+                result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
+                if result.returncode == 0:
+                    _capabilities = {
+                        "available": True,
+                        "version": result.stdout.split('\n')[0],
+                        "encoders": _encoders(),
+                        "error": None,
+                    }
+                else:
+                    _capabilities = {"available": False, "version": None, "encoders": [], "error": result.stderr.strip()}
+            except FileNotFoundError:
+                _capabilities = {"available": False, "version": None, "encoders": [], "error": "FFmpeg not found"}
+            except subprocess.TimeoutExpired:
+                _capabilities = {"available": False, "version": None, "encoders": [], "error": "FFmpeg version check timed out"}
+        return dict(_capabilities)
+
+
+def has_encoder(name):
+    return name in probe()["encoders"]
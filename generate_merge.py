@@ -1,22 +1,28 @@
 # generate_merge.py
 
 import os
-import time
-from PyPDF2 import PdfMerger
+import logging
+from pdf_merge import write_merged_pdf
+from merge_cache import merge_cache, merge_flights, merged_pdf_key
+
+logger = logging.getLogger(__name__)
 
 MERGE_DONE_FILE = "done_merge.txt"
 UPLOAD_ROOT = "pdf_data"
 
 def merge_pdfs(pdf_paths, output_path):
-    print(f"[INFO] Merging PDFs to {output_path}")
+    logger.info(f"Merging PDFs to {output_path}")
     if not pdf_paths:
-        print("[WARN] No PDF files found to merge.")
+        logger.warning("No PDF files found to merge.")
         return
-    merger = PdfMerger()
-    for path in pdf_paths:
-        merger.append(path)
-    merger.write(output_path)
-    merger.close()
+    key = merged_pdf_key(pdf_paths)
+    with merge_flights.acquire(key):
+        if merge_cache.link_to(key, output_path):
+            logger.info(f"Reused an earlier merge of the same PDFs for {output_path}")
+            return
+        # Inputs are copied one at a time and written out incrementally
+        write_merged_pdf(pdf_paths, output_path)
+        merge_cache.put_file(key, output_path)
 
 def process_folder(folder):
     folder_path = os.path.join(UPLOAD_ROOT, folder)
@@ -24,35 +30,22 @@ def process_folder(folder):
     merged_output_path = os.path.join(folder_path, "merged.pdf")
 
     if not os.path.exists(pdf_folder):
-        print(f"[SKIP] No pdf folder found in {folder}")
+        logger.info(f"Skipping {folder}: no pdf folder")
         return
 
     # Get list of .pdf files
     pdf_files = [os.path.join(pdf_folder, f) for f in os.listdir(pdf_folder) if f.endswith(".pdf")]
     if not pdf_files:
-        print(f"[SKIP] No PDF files found in {pdf_folder}")
+        logger.info(f"Skipping {folder}: no PDF files in {pdf_folder}")
         return
 
     merge_pdfs(pdf_files, merged_output_path)
-    print(f"[SUCCESS] Merged PDF saved in {merged_output_path}")
+    logger.info(f"Merged PDF saved in {merged_output_path}")
 
 if __name__ == "__main__":
-    print("[START] Starting PDF Merge Processor...")
-
-    while True:
-        print("[PROCESSING] Scanning folders for PDF merge...")
-        if not os.path.exists(MERGE_DONE_FILE):
-            open(MERGE_DONE_FILE, 'w').close()
-
-        with open(MERGE_DONE_FILE, "r") as f:
-            done_folders = [line.strip() for line in f.readlines()]
-
-        folders = os.listdir(UPLOAD_ROOT)
-
-        for folder in folders:
-            if folder not in done_folders:
-                process_folder(folder)
-                with open(MERGE_DONE_FILE, "a") as f:
-                    f.write(folder + "\n")
-
-        time.sleep(4)
+    # New folders are picked up by the watcher daemon instead of a polling loop
+    from watcher import FolderWatcher, merge_watch
+    from logs import configure_logging
+    configure_logging()
+    logger.info("Starting PDF Merge Processor...")
+    FolderWatcher([merge_watch()]).run()
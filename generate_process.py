@@ -1,39 +1,78 @@
-# This file looks for new folders inside user uploads and converts them to reel if they are not already converted
+# This file converts folders inside user uploads to reels; watcher.py feeds it folders that are not already converted
+# Folders go through the shared work queue, so any number of render workers (processes or hosts) can run
 import os 
+import sys
+import logging
 from text_to_audio import text_to_speech_file
-import time
-import subprocess
+from ffmpeg_pool import ffmpeg_executor, save_output_tail, PRIORITY_BACKGROUND
+from logs import configure_logging, job_context
+from work_queue import LeaseWorker, reel_work
+import media_index
+import job_index
+from encoder_profiles import CONTAINER_ARGS, get_profile, video_args
+from slide_timing import fit_concat_list
+
+logger = logging.getLogger(__name__)
 
 
 def text_to_audio(folder):
-    print("TTA - ", folder)
     with open(f"user_uploads/{folder}/desc.txt") as f:
         text = f.read()
-    print(text, folder)
+    logger.info(f"Generating audio for {folder} ({len(text)} characters)")
     text_to_speech_file(text, folder)
+    job_index.update(folder, stage="audio_ready", audio=True)
 
 
 def create_reel(folder):
-    command = f'''ffmpeg -f concat -safe 0 -i user_uploads/{folder}/input.txt -i user_uploads/{folder}/audio.mp3 -vf "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black" -c:v libx264 -c:a aac -shortest -r 30 -pix_fmt yuv420p static/reels/{folder}.mp4'''
+    _, profile = get_profile()  # server default encoder profile
+    output = f'static/reels/{folder}.mp4'
+    partial = f'static/reels/{folder}.part.mp4'  # A crash mid-render never leaves a truncated reel behind
+    # Slides fill the narration exactly instead of relying on -shortest to cut them
+    fit_concat_list(f'user_uploads/{folder}/input.txt', f'user_uploads/{folder}/audio.mp3', profile["fps"])
+    command = [
+        'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', f'user_uploads/{folder}/input.txt',
+        '-i', f'user_uploads/{folder}/audio.mp3',
+        '-vf', 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black',
+        *video_args(profile), '-c:a', 'aac', '-shortest', *CONTAINER_ARGS, partial
+    ]
+    job_index.update(folder, stage="encode_started")
+    result = ffmpeg_executor.run(command, PRIORITY_BACKGROUND, job_id=folder, stage="reel_encode")
+    if result.returncode != 0:
+        log_file = save_output_tail(f'user_uploads/{folder}/ffmpeg.log', result)
+        logger.error(f"Error creating reel for {folder}: exit code {result.returncode}, output tail in {log_file}")
+        result.check_returncode()
+    os.replace(partial, output)
+    media_index.register(output)
+    job_index.update(folder, stage="encoded", reel=True)
+    logger.info(f"Created reel {output}")
+
+
+def process_folder(folder):
+    """Render one folder; raises on failure so the work queue can retry it"""
+    job_index.record(folder, kind="watch", state="running")
+    job_index.update(folder, stage="uploaded", desc=True, input=True)
     try:
-        subprocess.run(command, shell=True, check=True)
-        print("CR - ", folder)
-    except subprocess.CalledProcessError as e:
-        print(f"Error creating reel for {folder}: {e}")
+        with job_context(folder):
+            text_to_audio(folder) # Generate the audio.mp3 from desc.txt
+            create_reel(folder) # Convert the images and audio.mp3 inside the folder to a reel
+    except Exception as e:
+        job_index.update(folder, state="failed", error=str(e))
+        raise
+    job_index.update(folder, state="done")
+
+
+def render_worker():
+    # A worker whose lease ran out stops its encode; the folder is already back in the queue
+    return LeaseWorker(reel_work, process_folder, on_lease_lost=ffmpeg_executor.cancel)
 
 
 if __name__ == "__main__":
-    while True:
-        print("Processing queue...")
-        with open("done.txt", "r") as f:
-            done_folders = f.readlines()
-
-        done_folders = [f.strip() for f in done_folders]
-        folders = os.listdir("user_uploads") 
-        for folder in folders:
-            if(folder not in done_folders): 
-                text_to_audio(folder) # Generate the audio.mp3 from desc.txt
-                create_reel(folder) # Convert the images and audio.mp3 inside the folder to a reel
-                with open("done.txt", "a") as f:
-                    f.write(folder + "\n")
-        time.sleep(4)
\ No newline at end of file
+    # python generate_process.py           -> watch user_uploads, queue new folders and render them
+    # python generate_process.py --worker  -> only render queued folders (run as many as needed)
+    configure_logging()
+    if "--worker" not in sys.argv:
+        # New folders are picked up by the watcher daemon instead of a polling loop
+        import threading
+        from watcher import FolderWatcher, reel_feed_watch
+        threading.Thread(target=FolderWatcher([reel_feed_watch()]).run, name="watcher", daemon=True).start()
+    render_worker().run()
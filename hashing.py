@@ -0,0 +1,48 @@
+# hashing.py
+# Content hashes of files on disk, memoised so a file is only read once per change
+
+import os
+import hashlib
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+MAX_REMEMBERED = 10000
+
+_known = {}  # abspath -> (size, mtime_ns, digest)
+_lock = threading.Lock()
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _store(abspath, size, mtime_ns, digest):
+    with _lock:
+        if len(_known) >= MAX_REMEMBERED:
+            _known.clear()
+        _known[abspath] = (size, mtime_ns, digest)
+
+
+def remember(path, digest):
+    """Record a digest computed elsewhere (e.g. while the file was being written)"""
+    size, mtime_ns = _signature(path)
+    _store(os.path.abspath(path), size, mtime_ns, digest)
+
+
+def file_sha256(path):
+    """sha256 hex digest of the file at path"""
+    abspath = os.path.abspath(path)
+    size, mtime_ns = _signature(abspath)
+    with _lock:
+        known = _known.get(abspath)
+    if known and known[0] == size and known[1] == mtime_ns:
+        return known[2]
+
+    digest = hashlib.sha256()
+    with open(abspath, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    _store(abspath, size, mtime_ns, digest)
+    return digest
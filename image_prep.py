@@ -0,0 +1,122 @@
+# image_prep.py
+# Decode each uploaded image once, fix its EXIF orientation and letterbox it onto
+# the 1080x1920 reel canvas, so ffmpeg no longer has to scale every output frame
+
+import os
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from blob_cache import BlobCache, cache_key, link_or_copy
+from hashing import file_sha256
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Without Pillow create_reel keeps scaling inside ffmpeg
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+CANVAS_WIDTH = 1080
+CANVAS_HEIGHT = 1920
+JPEG_QUALITY = 90
+# Bump when the normalisation output changes so stale cache entries are not reused
+CANVAS_VERSION = 1
+# Canvases linked into a reel folder; uploads cannot get this name (secure_filename strips leading dots)
+CANVAS_PREFIX = ".canvas-"
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join("cache", "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+image_cache = BlobCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, suffix=".jpg")
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def normalize_image(src, dest):
+    """Write src letterboxed onto a black 1080x1920 canvas to dest (runs in a worker process)"""
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGB")
+        # Same geometry as scale=...:force_original_aspect_ratio=decrease,pad=... in ffmpeg
+        img = ImageOps.contain(img, (CANVAS_WIDTH, CANVAS_HEIGHT), Image.LANCZOS)
+        canvas = Image.new("RGB", (CANVAS_WIDTH, CANVAS_HEIGHT), "black")
+        canvas.paste(img, ((CANVAS_WIDTH - img.width) // 2, (CANVAS_HEIGHT - img.height) // 2))
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.tmp"
+    canvas.save(tmp, "JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp, dest)
+    return dest
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def submit_normalize(paths):
+    """Start normalising paths; returns {path: Future resolving to the canvas path or None}
+
+    Images already normalised (by content hash) resolve immediately without
+    touching the pool.
+    """
+    futures = {}
+    if Image is None:
+        return {path: _done(None) for path in paths}
+
+    for path in paths:
+        try:
+            key = cache_key("canvas", CANVAS_VERSION, CANVAS_WIDTH, CANVAS_HEIGHT, file_sha256(path))
+        except OSError as e:
+            logger.error(f"Could not hash {path}: {e}")
+            futures[path] = _done(None)
+            continue
+
+        cached = image_cache.get(key)
+        if cached:
+            futures[path] = _done(cached)
+            continue
+
+        future = _get_pool().submit(normalize_image, path, image_cache.path_for(key))
+        future.add_done_callback(lambda f, key=key: f.exception() is None and image_cache.adopt(key))
+        futures[path] = future
+    return futures
+
+
+def collect_normalized(futures):
+    """Wait for submit_normalize() results; returns {path: canvas path} for the ones that succeeded"""
+    normalized = {}
+    for path, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Could not normalise {path}, ffmpeg will scale it instead: {e}")
+            continue
+        if result:
+            normalized[path] = os.path.abspath(result)
+    return normalized
+
+
+def link_canvas(canvas, folder):
+    """Hard-link a cached canvas into a reel folder and return the link
+
+    The link keeps the canvas for as long as the reel folder holds it, even
+    after image_cache evicts its own entry. Raises OSError if the canvas is gone.
+    """
+    dest = os.path.join(folder, CANVAS_PREFIX + os.path.basename(canvas))
+    link_or_copy(canvas, dest)
+    return os.path.abspath(dest)
+
+
+def is_normalized(path):
+    """True for files produced by normalize_image(), in the cache or linked into a reel folder"""
+    path = os.path.abspath(path)
+    return (path.startswith(os.path.abspath(IMAGE_CACHE_DIR) + os.sep)
+            or os.path.basename(path).startswith(CANVAS_PREFIX))
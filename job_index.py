@@ -0,0 +1,160 @@
+# job_index.py
+# Persistent index of reel jobs: state, stage timestamps and which artifacts exist.
+# The pipeline updates it as it writes files, so /status never walks user_uploads.
+
+import time
+import base64
+from db import get_connection
+
+STATES = ("queued", "running", "done", "failed")
+# Pipeline stages, each stored as the time it was reached
+STAGES = ("uploaded", "audio_ready", "encode_started", "encoded")
+# Files in the job folder, each stored as a presence flag
+ARTIFACTS = ("desc", "input", "audio", "reel")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    error TEXT,
+    {", ".join(f"{stage} REAL" for stage in STAGES)},
+    {", ".join(f"has_{name} INTEGER NOT NULL DEFAULT 0" for name in ARTIFACTS)}
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created DESC, id DESC);
+CREATE INDEX IF NOT EXISTS jobs_state_created ON jobs (state, created DESC, id DESC);
+"""
+
+_initialized = False
+
+
+def _connection():
+    global _initialized
+    conn = get_connection()
+    if not _initialized:
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+def record(job_id, kind="reel", state="queued"):
+    """Create the index entry for job_id, or reset its state if it already exists"""
+    now = time.time()
+    _connection().execute(
+        "INSERT INTO jobs (id, kind, state, created, updated) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET state = excluded.state, updated = excluded.updated, error = NULL",
+        (job_id, kind, state, now, now),
+    )
+
+
+def update(job_id, state=None, error=None, stage=None, **artifacts):
+    """Update one job's entry; ignored for ids that were never recorded
+
+    stage is one of STAGES and is stamped with the current time; artifacts are
+    keyword flags such as audio=True.
+    """
+    now = time.time()
+    columns = {"updated": now}
+    if state is not None:
+        if state not in STATES:
+            raise ValueError(f"Unknown job state '{state}'")
+        columns["state"] = state
+    if error is not None:
+        columns["error"] = error
+    if stage is not None:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown job stage '{stage}'")
+        columns[stage] = now
+    for name, present in artifacts.items():
+        if name not in ARTIFACTS:
+            raise ValueError(f"Unknown job artifact '{name}'")
+        columns[f"has_{name}"] = int(bool(present))
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    _connection().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id))
+
+
+def _view(row):
+    entry = {key: row[key] for key in ("id", "kind", "state", "created", "updated", "error")}
+    entry["stages"] = {stage: row[stage] for stage in STAGES}
+    entry["artifacts"] = {name: bool(row[f"has_{name}"]) for name in ARTIFACTS}
+    return entry
+
+
+def get(job_id):
+    row = _connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _view(row) if row else None
+
+
+def get_many(job_ids):
+    """{id: entry} for the ids that are in the index"""
+    entries = {}
+    ids = list(job_ids)
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = _connection().execute(
+            f"SELECT * FROM jobs WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        entries.update((row["id"], _view(row)) for row in rows)
+    return entries
+
+
+def active_ids(updated_after=None):
+    """Ids of jobs that are queued or running, only those updated since updated_after when given"""
+    rows = _connection().execute(
+        "SELECT id FROM jobs WHERE state IN ('queued', 'running') AND updated >= ?", (updated_after or 0,)
+    ).fetchall()
+    return [row["id"] for row in rows]
+
+
+def fail_stale(updated_before, error):
+    """Mark queued or running jobs not updated since updated_before as failed; returns how many
+
+    Such rows were left by a process that crashed or restarted mid-job.
+    """
+    return _connection().execute(
+        "UPDATE jobs SET state = 'failed', error = ?, updated = ? "
+        "WHERE state IN ('queued', 'running') AND updated < ?",
+        (error, time.time(), updated_before),
+    ).rowcount
+
+
+def delete(job_id):
+    _connection().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+def _encode_cursor(entry):
+    return base64.urlsafe_b64encode(f"{entry['created']!r}:{entry['id']}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    created, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+    return float(created), job_id
+
+
+def page(state=None, cursor=None, limit=50):
+    """Return (jobs, next_cursor), newest first, optionally only jobs in state
+
+    Keyset pagination on (created, id) like media_index.page(); raises
+    ValueError for a bad cursor or unknown state.
+    """
+    clauses, params = [], []
+    if state is not None:
+        if state not in STATES:
+            raise ValueError(f"Unknown job state '{state}'")
+        clauses.append("state = ?")
+        params.append(state)
+    if cursor:
+        created, job_id = _decode_cursor(cursor)
+        clauses.append("(created < ? OR (created = ? AND id < ?))")
+        params += [created, created, job_id]
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    rows = _connection().execute(
+        f"SELECT * FROM jobs {where}ORDER BY created DESC, id DESC LIMIT ?", (*params, limit + 1)
+    ).fetchall()
+    jobs = [_view(row) for row in rows[:limit]]
+    next_cursor = _encode_cursor(jobs[-1]) if len(rows) > limit else None
+    return jobs, next_cursor
+
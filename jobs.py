@@ -0,0 +1,175 @@
+# jobs.py
+# In-process job queue so long running work (TTS + ffmpeg) never runs inside a request
+
+import os
+import threading
+import itertools
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import job_index
+from metrics import register_gauge
+from logs import job_context
+
+logger = logging.getLogger(__name__)
+
+REEL_WORKERS = int(os.environ.get("REEL_WORKERS", 2))
+REEL_MAX_PENDING = int(os.environ.get("REEL_MAX_PENDING", 50))
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", 4))
+# Events kept per job for late or reconnecting /jobs/<id>/events subscribers
+MAX_JOB_EVENTS = 200
+# Finished jobs (and their events) stay in memory this long, and at most this
+# many of them; job_index keeps the history after that
+FINISHED_JOB_TTL = float(os.environ.get("FINISHED_JOB_TTL", 3600))
+MAX_FINISHED_JOBS = int(os.environ.get("MAX_FINISHED_JOBS", 500))
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds the maximum number of pending jobs"""
+
+
+class JobQueue:
+    """Bounded worker pool plus a registry of job records keyed by job id
+
+    index is an optional persistent job index (the job_index module) that is
+    told about every state change, so job history survives restarts.
+    """
+
+    def __init__(self, name, max_workers, max_pending, index=None, finished_ttl=FINISHED_JOB_TTL,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.name = name
+        self.max_pending = max_pending
+        self.index = index
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-job")
+        self._jobs = {}
+        self._events = {}  # job id -> deque of {"id", "event", "data"}
+        self._event_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def submit(self, job_id, func, *args, meta=None, stage=None, **kwargs):
+        """Queue func(*args, **kwargs) under job_id and return the job record
+
+        meta is a dict of descriptive fields kept on the record (e.g. the encoder
+        profile) so results can be compared across settings. stage is the data
+        of a "stage" event published before the job can start (e.g. the upload
+        that created it). Submitting an id that is already queued or running
+        returns the existing record instead of starting a second run (e.g. a
+        browser retrying the POST).
+        """
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if existing and existing["state"] in ("queued", "running"):
+                return dict(existing)
+            self._evict_finished()
+            if self._pending_count() >= self.max_pending:
+                raise QueueFullError(f"{self.name} queue is full ({self.max_pending} pending jobs)")
+            job = {
+                "id": job_id,
+                "state": "queued",
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "result": None,
+                "error": None,
+                "meta": dict(meta or {}),
+                "progress": None,
+            }
+            self._jobs[job_id] = job
+            self._events[job_id] = deque(maxlen=MAX_JOB_EVENTS)
+        if self.index:
+            self.index.record(job_id, kind=self.name)
+        self.publish(job_id, "state", state="queued")
+        if stage:
+            self.publish(job_id, "stage", **stage)
+        self._executor.submit(self._run, job, func, args, kwargs)
+        logger.info(f"Queued {self.name} job {job_id}")
+        return dict(job)
+
+    def _run(self, job, func, args, kwargs):
+        with job_context(job["id"]):
+            self._update(job["id"], state="running", started=time.time())
+            try:
+                result = func(*args, **kwargs)
+                self._update(job["id"], state="done", result=result, finished=time.time())
+                logger.info(f"{self.name} job {job['id']} finished")
+            except Exception as e:
+                logger.error(f"{self.name} job {job['id']} failed: {e}")
+                self._update(job["id"], state="failed", error=str(e), finished=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+            if fields.get("finished"):
+                self._evict_finished()
+        if self.index:
+            self.index.update(job_id, state=fields.get("state"), error=fields.get("error"))
+        if "state" in fields:
+            self.publish(job_id, "state", state=fields["state"], error=fields.get("error"))
+
+    def _evict_finished(self):
+        """Forget finished jobs past finished_ttl or beyond max_finished, oldest first (lock held)"""
+        finished = sorted(
+            (job["finished"], job_id) for job_id, job in self._jobs.items()
+            if job["state"] not in ("queued", "running") and job["finished"] is not None
+        )
+        cutoff = time.time() - self.finished_ttl
+        excess = len(finished) - self.max_finished
+        for position, (finished_at, job_id) in enumerate(finished):
+            if position >= excess and finished_at >= cutoff:
+                break
+            del self._jobs[job_id]
+            self._events.pop(job_id, None)
+
+    def update_meta(self, job_id, **fields):
+        """Add fields to a job's metadata (ignored for unknown ids)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["meta"] = {**job["meta"], **fields}
+
+    def publish(self, job_id, event, **data):
+        """Record an event for job_id and wake its subscribers (ignored for unknown ids)
+
+        "progress" events also become the job's current progress.
+        """
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if event == "progress":
+                job["progress"] = data
+            self._events[job_id].append({"id": next(self._event_ids), "event": event, "data": data})
+            self._changed.notify_all()
+
+    def wait_events(self, job_id, after=0, timeout=None):
+        """Return the events of job_id newer than event id after, waiting up to timeout for one"""
+        def newer():
+            return [event for event in self._events.get(job_id, ()) if event["id"] > after]
+
+        with self._changed:
+            return self._changed.wait_for(newer, timeout) or []
+
+    def get(self, job_id):
+        """Return a copy of the job record, or None for unknown ids"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending_count()
+
+    def _pending_count(self):
+        return sum(1 for job in self._jobs.values() if job["state"] in ("queued", "running"))
+
+
+reel_jobs = JobQueue("reel", REEL_WORKERS, REEL_MAX_PENDING, index=job_index)
+register_gauge("mediameld_reel_jobs_pending", "Reel jobs queued or running", reel_jobs.pending_count)
+
+# TTS requests are network bound, so they get their own pool and can start
+# before a reel worker frees up
+tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
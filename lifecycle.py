@@ -0,0 +1,327 @@
+# lifecycle.py
+# Deletes old uploads, audio, intermediates, reels and merged PDFs: each artifact class
+# has its own TTL, and a global disk quota evicts least-recently-used files on top,
+# counting the regenerable cache entries (TTS, renders, canvases, segments, thumbnails) too.
+# Folders with an in-flight job are never touched. Run `python lifecycle.py --dry-run`
+# for a report of what would be removed.
+
+import os
+import sys
+import json
+import shutil
+import threading
+import time
+import logging
+import blob_cache
+import job_index
+import media_index
+from work_queue import reel_work
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+
+
+def _seconds(name, default):
+    """Env seconds setting; 0 means keep forever (None)"""
+    value = int(os.environ.get(name, default))
+    return value or None
+
+
+ARTIFACT_TTLS = {
+    "sources": _seconds("LIFECYCLE_SOURCES_TTL", 7 * DAY),  # Uploaded images and PDFs
+    "audio": _seconds("LIFECYCLE_AUDIO_TTL", 7 * DAY),
+    "intermediates": _seconds("LIFECYCLE_INTERMEDIATES_TTL", DAY),  # Partial files, staging, diagnostic folders
+    "reels": _seconds("LIFECYCLE_REELS_TTL", 30 * DAY),
+    "merged_pdfs": _seconds("LIFECYCLE_MERGED_PDFS_TTL", 7 * DAY),
+    "cache": None,  # BlobCache entries expire by their cache's own budget and max age, and by the quota
+}
+# Total bytes allowed under the managed roots and the caches; 0 disables quota eviction
+LIFECYCLE_QUOTA_BYTES = int(os.environ.get("LIFECYCLE_QUOTA_BYTES", 0))
+# Files younger than this are never removed, which covers uploads that have no job yet
+LIFECYCLE_MIN_AGE = int(os.environ.get("LIFECYCLE_MIN_AGE", 60 * 60))
+LIFECYCLE_INTERVAL = int(os.environ.get("LIFECYCLE_INTERVAL", 60 * 60))
+LIFECYCLE_DRY_RUN = os.environ.get("LIFECYCLE_DRY_RUN", "").lower() in ("1", "true", "yes")
+# A queued or running job with no update for this long belongs to a process that is gone
+LIFECYCLE_JOB_TIMEOUT = int(os.environ.get("LIFECYCLE_JOB_TIMEOUT", 6 * 60 * 60))
+
+UPLOADS_ROOT = "user_uploads"
+PDF_ROOT = "pdf_data"
+REELS_ROOT = os.path.join("static", "reels")
+STAGING_ROOT = "upload_staging"
+
+# Folders the /test-* and /debug-* routes create
+DIAGNOSTIC_PREFIXES = ("test_", "input_test_", "debug_")
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".pdf")
+# Small files that describe a folder; they go when nothing else is left in it
+METADATA_FILES = ("desc.txt", "input.txt")
+
+
+class Artifact:
+    def __init__(self, path, kind, size, last_used, job_id=None, folder=None, inode=None, cache=None):
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.last_used = last_used
+        self.job_id = job_id
+        self.folder = folder  # Job folder the file lives in, removed once it holds only metadata
+        self.inode = inode  # (st_dev, st_ino): hard links to one file share it and its bytes
+        self.cache = cache  # (BlobCache, key) for cache entries, removed through the cache
+
+
+def classify(root, folder, name):
+    """Artifact class of a file (None for folder metadata)"""
+    if root == STAGING_ROOT:
+        return "intermediates"
+    if root == REELS_ROOT:
+        return "reels" if name.endswith(".mp4") else "intermediates"
+    if name in METADATA_FILES:
+        return None
+    if name.endswith((".part", ".part.mp4", ".tmp")) or folder.startswith(DIAGNOSTIC_PREFIXES):
+        return "intermediates"
+    if root == PDF_ROOT:
+        return "merged_pdfs" if name == "merged.pdf" else "sources" if name.endswith(".pdf") else "intermediates"
+    if name == f"{folder}.mp4":
+        return "reels"
+    if name == "audio.mp3":
+        return "audio"
+    if name.lower().endswith(SOURCE_EXTENSIONS):
+        return "sources"
+    return "intermediates"
+
+
+def _artifact(path, kind, job_id=None, folder=None):
+    stat = os.stat(path)
+    # mtime for files nobody reads, atime where the filesystem records reads
+    return Artifact(path, kind, stat.st_size, max(stat.st_mtime, stat.st_atime), job_id, folder,
+                    (stat.st_dev, stat.st_ino))
+
+
+def scan():
+    """Return (artifacts, folders): an Artifact for every managed file and cache
+    entry, and {folder path: (job id, mtime)} for every job folder under the upload roots
+    """
+    artifacts = []
+    folders = {}
+    for root in (UPLOADS_ROOT, PDF_ROOT):
+        if not os.path.isdir(root):
+            continue
+        for folder in os.scandir(root):
+            if not folder.is_dir():
+                continue
+            folders[folder.path] = (folder.name, folder.stat().st_mtime)
+            for entry in os.scandir(folder.path):
+                if entry.is_file():
+                    kind = classify(root, folder.name, entry.name)
+                    artifacts.append(_artifact(entry.path, kind, folder.name, folder.path))
+    for root in (REELS_ROOT, STAGING_ROOT):
+        if not os.path.isdir(root):
+            continue
+        for entry in os.scandir(root):
+            if entry.is_file():
+                job_id = entry.name[:-4] if entry.name.endswith(".mp4") else None
+                artifacts.append(_artifact(entry.path, classify(root, None, entry.name), job_id))
+    for cache in blob_cache.caches:
+        for key, path, size, last_used in cache.entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            artifacts.append(Artifact(path, "cache", size, last_used, inode=(stat.st_dev, stat.st_ino),
+                                      cache=(cache, key)))
+    return artifacts, folders
+
+
+def in_flight_jobs(now=None):
+    """Ids of jobs that are queued or running in any process, or waiting for a render worker
+
+    Job index rows not updated for LIFECYCLE_JOB_TIMEOUT seconds do not count.
+    """
+    updated_after = (now or time.time()) - LIFECYCLE_JOB_TIMEOUT
+    return set(job_index.active_ids(updated_after)) | set(reel_work.active_ids())
+
+
+def plan(now=None):
+    """Decide what a sweep removes without touching any file
+
+    Returns (removals, folders, report): removals is a list of (Artifact,
+    reason) with reason "ttl" or "quota", folders the job folders left with
+    nothing but metadata afterwards.
+    """
+    now = now or time.time()
+    active = in_flight_jobs(now)
+    artifacts, all_folders = scan()
+    total = 0
+    counted = set()
+    candidates = []
+    skipped = set()
+    for artifact in artifacts:
+        if artifact.inode not in counted:
+            counted.add(artifact.inode)
+            total += artifact.size
+        if artifact.job_id in active:
+            skipped.add(artifact.job_id)
+        elif artifact.kind is not None and now - artifact.last_used >= LIFECYCLE_MIN_AGE:
+            candidates.append(artifact)
+
+    removals = []
+    kept = []
+    for artifact in candidates:
+        ttl = ARTIFACT_TTLS[artifact.kind]
+        if ttl is not None and now - artifact.last_used > ttl:
+            removals.append((artifact, "ttl"))
+        else:
+            kept.append(artifact)
+
+    # Bytes of a hard-linked file are only subtracted once, however many of its links go
+    freed = set()
+    remaining = total
+    for artifact, _ in removals:
+        if artifact.inode not in freed:
+            freed.add(artifact.inode)
+            remaining -= artifact.size
+    if LIFECYCLE_QUOTA_BYTES and remaining > LIFECYCLE_QUOTA_BYTES:
+        for artifact in sorted(kept, key=lambda a: a.last_used):
+            if remaining <= LIFECYCLE_QUOTA_BYTES:
+                break
+            removals.append((artifact, "quota"))
+            if artifact.inode not in freed:
+                freed.add(artifact.inode)
+                remaining -= artifact.size
+
+    # Job folders where every file that is not metadata goes (or that were empty to begin with)
+    removed_paths = {artifact.path for artifact, _ in removals}
+    contents = {}
+    for artifact in artifacts:
+        if artifact.folder:
+            contents.setdefault(artifact.folder, []).append(artifact)
+    folders = []
+    for folder, (job_id, mtime) in all_folders.items():
+        if job_id in active or now - mtime < LIFECYCLE_MIN_AGE:
+            continue
+        if all(
+            a.path in removed_paths if a.kind else now - a.last_used >= LIFECYCLE_MIN_AGE
+            for a in contents.get(folder, [])
+        ):
+            folders.append((folder, job_id))
+
+    report = {
+        "total_bytes": total,
+        "quota_bytes": LIFECYCLE_QUOTA_BYTES or None,
+        "freed_bytes": total - remaining,
+        "skipped_in_flight": sorted(skipped),
+        "removed": [
+            {"path": a.path, "class": a.kind, "bytes": a.size, "age_seconds": int(now - a.last_used), "reason": reason}
+            for a, reason in removals
+        ],
+        "removed_folders": [folder for folder, _ in folders],
+    }
+    return removals, folders, report
+
+
+def _forget(artifact):
+    """Keep the gallery and job indexes in step with a removed file"""
+    if artifact.kind == "reels":
+        media_index.remove(media_index.reel_id(artifact.path))
+        if artifact.job_id:
+            if artifact.folder is None and not os.path.isdir(os.path.join(UPLOADS_ROOT, artifact.job_id)):
+                # The job's folder went earlier, so this was the last of it
+                job_index.delete(artifact.job_id)
+            else:
+                job_index.update(artifact.job_id, reel=False)
+    elif artifact.kind == "audio":
+        job_index.update(artifact.job_id, audio=False)
+
+
+def _prune_folder(folder, job_id, active):
+    """Remove a job folder that holds nothing but metadata; returns True if it was removed"""
+    if job_id in active or not os.path.isdir(folder):
+        return False
+    if any(name not in METADATA_FILES for name in os.listdir(folder)):
+        return False
+    shutil.rmtree(folder, ignore_errors=True)
+    if os.path.exists(os.path.join(REELS_ROOT, f"{job_id}.mp4")):
+        job_index.update(job_id, desc=False, input=False)
+    else:
+        # Nothing of the job is left; batches report it as expired from here on
+        job_index.delete(job_id)
+    return True
+
+
+def sweep(dry_run=LIFECYCLE_DRY_RUN):
+    """Apply the TTLs and the quota once and return the report (nothing is deleted when dry_run)"""
+    removals, folders, report = plan()
+    report["dry_run"] = dry_run
+    if dry_run:
+        return report
+
+    abandoned = job_index.fail_stale(
+        time.time() - LIFECYCLE_JOB_TIMEOUT, f"Abandoned: no progress for {LIFECYCLE_JOB_TIMEOUT}s"
+    )
+    if abandoned:
+        logger.warning(f"Marked {abandoned} abandoned jobs as failed")
+
+    active = in_flight_jobs()
+    for artifact, _ in removals:
+        # A job may have started on this folder since plan() ran
+        if artifact.job_id in active:
+            continue
+        try:
+            if artifact.cache:
+                cache, key = artifact.cache
+                cache.discard(key)
+            else:
+                os.remove(artifact.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not remove {artifact.path}: {e}")
+            continue
+        _forget(artifact)
+    report["removed_folders"] = [folder for folder, job_id in folders if _prune_folder(folder, job_id, active)]
+    logger.info(
+        f"Lifecycle sweep removed {len(removals)} files and {len(report['removed_folders'])} folders, "
+        f"freeing {report['freed_bytes']} bytes"
+    )
+    return report
+
+
+class LifecycleManager:
+    """Background thread that sweeps every LIFECYCLE_INTERVAL seconds"""
+
+    def __init__(self, interval=LIFECYCLE_INTERVAL, dry_run=LIFECYCLE_DRY_RUN):
+        self.interval = interval
+        self.dry_run = dry_run
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the sweeper thread; safe to call more than once"""
+        with self._lock:
+            if self.interval <= 0 or self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="lifecycle", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_report = sweep(self.dry_run)
+                if self.dry_run:
+                    logger.info(f"Lifecycle dry run would remove {len(self.last_report['removed'])} files")
+            except Exception as e:
+                logger.error(f"Lifecycle sweep failed: {e}")
+
+
+lifecycle_manager = LifecycleManager()
+
+
+if __name__ == "__main__":
+    # Imported for their caches, so the report covers the same bytes as the app's sweeps
+    import image_prep, merge_cache, render_cache, segments, text_to_audio, thumbnails  # noqa: F401
+    print(json.dumps(sweep(dry_run="--dry-run" in sys.argv), indent=2))
@@ -0,0 +1,89 @@
+# logs.py
+# Logging setup: records are handed through a bounded queue to one writer thread and
+# come out as JSON lines tagged with the job they belong to, so logging never blocks a request
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+from metrics import registry, Counter
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# "json" (one object per line) or "text" (human readable, for local runs)
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+# Records waiting for the writer thread; beyond this they are dropped rather than making callers wait
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(job_id)s] %(message)s"
+
+dropped_records = registry.register(Counter(
+    "mediameld_log_records_dropped_total", "Log records dropped because the log queue was full"))
+
+_job_id = contextvars.ContextVar("job_id", default=None)
+_listener = None
+
+
+@contextmanager
+def job_context(job_id):
+    """Tag every record logged inside the block (in this thread) with job_id"""
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+def current_job():
+    return _job_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "job_id": getattr(record, "job_id", None),
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        return json.dumps(entry, default=str)
+
+
+class JobQueueHandler(logging.handlers.QueueHandler):
+    """Stamps records with the current job id and drops them when the writer falls behind"""
+
+    def prepare(self, record):
+        # logger.info(..., extra={"job_id": ...}) wins over the context
+        if getattr(record, "job_id", None) is None:
+            record.job_id = _job_id.get()
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    """Route the root logger through the queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers[:] = [JobQueueHandler(records)]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, writer)
+    _listener.start()
+    # Flush what is still queued on a clean exit
+    atexit.register(_listener.stop)
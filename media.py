@@ -0,0 +1,64 @@
+# media.py
+# Delivery of reels: strong content-hash ETags, byte ranges and conditional
+# requests, with optional hand-off of the file transfer to the front-end server
+
+import os
+import time
+from flask import current_app, request, send_file, make_response
+from hashing import file_sha256
+from metrics import stage_bytes, stage_seconds
+
+# "" (serve from Flask), "x-sendfile" (Apache/lighttpd, via USE_X_SENDFILE) or "x-accel" (nginx)
+MEDIA_OFFLOAD = os.environ.get("MEDIA_OFFLOAD", "")
+# nginx internal location that maps onto the project root, used with x-accel
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected/")
+MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", 3600))
+
+
+def send_media(path, mimetype="video/mp4", as_attachment=False, download_name=None):
+    """Send a media file with range and conditional request support
+
+    The ETag is the file's sha256, so it stays valid across restarts and
+    identical reels share it. Range, If-Range and If-None-Match are handled
+    by Werkzeug's conditional send_file (or by nginx with x-accel).
+    """
+    start = time.perf_counter()
+    etag = file_sha256(path)
+
+    if MEDIA_OFFLOAD != "x-accel":
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            max_age=MEDIA_MAX_AGE,
+        )
+        # Advertise ranges on full responses too so players know they can seek
+        response.accept_ranges = "bytes"
+        return _measured(response, start)
+
+    relative = os.path.relpath(os.path.abspath(path), current_app.root_path).replace(os.sep, "/")
+    response = make_response("")
+    response.headers["X-Accel-Redirect"] = MEDIA_ACCEL_PREFIX + relative
+    response.headers["Content-Type"] = mimetype
+    if as_attachment:
+        response.headers["Content-Disposition"] = f"attachment; filename={download_name or os.path.basename(path)}"
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = MEDIA_MAX_AGE
+    return _measured(response.make_conditional(request), start)
+
+
+def _measured(response, start):
+    """Record the send once the body has gone out (or been handed to the front-end server)"""
+    # With an offload header the front-end server sends the bytes, not us
+    sent = 0 if MEDIA_OFFLOAD else response.content_length or 0
+
+    def done():
+        stage_seconds.observe(time.perf_counter() - start, stage="file_send")
+        stage_bytes.inc(sent, stage="file_send")
+
+    response.call_on_close(done)
+    return response
@@ -0,0 +1,167 @@
+# media_index.py
+# Metadata index of finished reels (static/reels and user_uploads/*/*.mp4) for the gallery.
+# The pipeline registers each reel as it is written; the directories are only walked
+# once, to backfill an empty index.
+
+import os
+import glob
+import struct
+import base64
+import hashlib
+import logging
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+REEL_GLOBS = [os.path.join("static", "reels", "*.mp4"), os.path.join("user_uploads", "*", "*.mp4")]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reels (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reels_created ON reels (created DESC, id DESC);
+"""
+
+_initialized = False
+
+
+def _connection():
+    global _initialized
+    conn = get_connection()
+    if not _initialized:
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+def reel_id(path):
+    return hashlib.sha1(os.path.normpath(path).encode("utf-8")).hexdigest()[:16]
+
+
+def _boxes(f, start, end):
+    """Yield (type, content start, box end) for the ISO-BMFF boxes between start and end"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def mp4_info(path):
+    """Read duration (seconds) and video width/height from the moov box without ffprobe
+
+    Only box headers and the mvhd/tkhd boxes are read, wherever moov sits in the file.
+    """
+    info = {"duration": None, "width": None, "height": None}
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        for kind, start, end in _boxes(f, 0, file_size):
+            if kind != b"moov":
+                continue
+            for child, child_start, child_end in _boxes(f, start, end):
+                if child == b"mvhd":
+                    f.seek(child_start)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        f.seek(16, 1)
+                        timescale, duration = struct.unpack(">IQ", f.read(12))
+                    else:
+                        f.seek(8, 1)
+                        timescale, duration = struct.unpack(">II", f.read(8))
+                    if timescale:
+                        info["duration"] = round(duration / timescale, 3)
+                elif child == b"trak" and info["width"] is None:
+                    for grandchild, gc_start, _ in _boxes(f, child_start, child_end):
+                        if grandchild != b"tkhd":
+                            continue
+                        f.seek(gc_start)
+                        version = f.read(4)[0]
+                        f.seek(gc_start + (88 if version == 1 else 76))
+                        width, height = struct.unpack(">II", f.read(8))
+                        if width and height:  # Audio tracks have 0x0
+                            info["width"], info["height"] = width >> 16, height >> 16
+            break
+    return info
+
+
+def register(path):
+    """Add or refresh the index entry for the reel at path"""
+    path = os.path.normpath(path)
+    try:
+        stat = os.stat(path)
+        info = mp4_info(path)
+    except (OSError, struct.error, IndexError) as e:
+        logger.warning(f"Could not index {path}: {e}")
+        return None
+    rid = reel_id(path)
+    _connection().execute(
+        "INSERT OR REPLACE INTO reels (id, path, size, duration, width, height, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (rid, path, stat.st_size, info["duration"], info["width"], info["height"], stat.st_mtime),
+    )
+    return rid
+
+
+def remove(rid):
+    _connection().execute("DELETE FROM reels WHERE id = ?", (rid,))
+
+
+def backfill_if_empty():
+    """Populate an empty index from the reel directories (one-off directory walk)"""
+    conn = _connection()
+    if conn.execute("SELECT 1 FROM reels LIMIT 1").fetchone():
+        return 0
+    count = 0
+    for pattern in REEL_GLOBS:
+        for path in glob.glob(pattern):
+            if not path.endswith(".part.mp4") and register(path):
+                count += 1
+    return count
+
+
+def get(rid):
+    row = _connection().execute("SELECT * FROM reels WHERE id = ?", (rid,)).fetchone()
+    return dict(row) if row else None
+
+
+def _encode_cursor(row):
+    return base64.urlsafe_b64encode(f"{row['created']!r}:{row['id']}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    created, rid = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+    return float(created), rid
+
+
+def page(cursor=None, limit=12):
+    """Return (reels, next_cursor), newest first; next_cursor is None on the last page
+
+    Keyset pagination on (created, id), so every page costs the same.
+    """
+    conn = _connection()
+    if cursor:
+        created, rid = _decode_cursor(cursor)
+        rows = conn.execute(
+            "SELECT * FROM reels WHERE created < ? OR (created = ? AND id < ?) "
+            "ORDER BY created DESC, id DESC LIMIT ?",
+            (created, created, rid, limit + 1),
+        ).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM reels ORDER BY created DESC, id DESC LIMIT ?", (limit + 1,)).fetchall()
+    reels = [dict(row) for row in rows[:limit]]
+    next_cursor = _encode_cursor(reels[-1]) if len(rows) > limit else None
+    return reels, next_cursor
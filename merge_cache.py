@@ -0,0 +1,20 @@
+# merge_cache.py
+# Merged PDFs keyed by the ordered content hashes of their inputs
+
+import os
+from blob_cache import BlobCache, SingleFlight, cache_key
+from hashing import file_sha256
+
+MERGE_CACHE_DIR = os.environ.get("MERGE_CACHE_DIR", os.path.join("cache", "merged"))
+MERGE_CACHE_MAX_BYTES = int(os.environ.get("MERGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+MERGE_CACHE_MAX_AGE = float(os.environ.get("MERGE_CACHE_MAX_AGE", 7 * 24 * 3600))
+# Bump when pdf_merge output changes so old merges are not served
+MERGE_FORMAT_VERSION = 1
+
+merge_cache = BlobCache(MERGE_CACHE_DIR, MERGE_CACHE_MAX_BYTES, max_age=MERGE_CACHE_MAX_AGE, suffix=".pdf")
+merge_flights = SingleFlight()
+
+
+def merged_pdf_key(pdf_paths):
+    """Cache key for merging pdf_paths in this order (no PDF parsing involved)"""
+    return cache_key("merged-pdf", MERGE_FORMAT_VERSION, [file_sha256(path) for path in pdf_paths])
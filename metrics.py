@@ -0,0 +1,177 @@
+# metrics.py
+# In-process counters, gauges and histograms rendered in the Prometheus text format on /metrics
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers everything from a cached TTS hit to a long archive-profile encode
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in values]
+
+
+class Gauge(_Metric):
+    """A settable gauge, or one read from func() at scrape time (no labels then)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), func=None):
+        super().__init__(name, help, labelnames)
+        self.func = func
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count a block as in flight while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self):
+        if self.func is not None:
+            return self.header() + [f"{self.name} {_number(self.func())}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "mediameld_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"]))
+stage_bytes = registry.register(Counter(
+    "mediameld_stage_bytes_total", "Bytes produced or transferred by each pipeline stage", ["stage"]))
+stage_errors = registry.register(Counter(
+    "mediameld_stage_errors_total", "Pipeline stage failures by cause", ["stage", "cause"]))
+in_flight = registry.register(Gauge(
+    "mediameld_stage_in_flight", "Pipeline stage calls currently running", ["stage"]))
+
+
+@contextmanager
+def time_stage(stage, error_cause=None):
+    """Time a block as one call of stage; an exception counts as an error
+
+    error_cause(exc) names the cause for stage_errors (the exception class
+    name by default).
+    """
+    start = time.perf_counter()
+    try:
+        with in_flight.track(stage=stage):
+            yield
+    except BaseException as e:
+        cause = error_cause(e) if error_cause else type(e).__name__
+        if cause:
+            stage_errors.inc(stage=stage, cause=cause)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def register_gauge(name, help, func):
+    """Gauge read from func() on every scrape (queue depths, pool usage)"""
+    return registry.register(Gauge(name, help, func=func))
@@ -0,0 +1,218 @@
+# pdf_merge.py
+# Streaming PDF merge: sources are read one at a time and every object is written
+# out as soon as it is copied, so memory stays flat no matter how many PDFs are merged
+
+import io
+import os
+from PyPDF2 import PdfReader
+from metrics import stage_bytes, time_stage
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+
+CHUNK_SIZE = 64 * 1024
+
+# Page attributes that may live on an ancestor /Pages node instead of the page
+INHERITABLE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+CATALOG_NUM = 1
+PAGES_NUM = 2
+
+
+class StreamingPdfWriter:
+    """Writes a PDF object by object into an in-memory buffer that the caller drains
+
+    Only the xref offsets and the list of page object numbers are kept for the
+    whole document; everything else leaves memory when take() is called.
+    """
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._flushed = 0
+        self._offsets = {}
+        self._next_num = PAGES_NUM + 1
+        self.page_nums = []
+        self._buffer.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def reserve(self):
+        num = self._next_num
+        self._next_num += 1
+        return num
+
+    def position(self):
+        return self._flushed + self._buffer.tell()
+
+    def begin_object(self, num):
+        self._offsets[num] = self.position()
+        self.write(f"{num} 0 obj\n".encode())
+
+    def end_object(self):
+        self.write(b"\nendobj\n")
+
+    def write(self, data):
+        self._buffer.write(data)
+
+    def take(self, force=False):
+        """Return the bytes written since the last call once CHUNK_SIZE has built up"""
+        if not force and self._buffer.tell() < CHUNK_SIZE:
+            return b""
+        data = self._buffer.getvalue()
+        self._flushed += len(data)
+        self._buffer = io.BytesIO()
+        return data
+
+    def finish(self):
+        """Write the page tree, catalog, xref table and trailer"""
+        kids = " ".join(f"{num} 0 R" for num in self.page_nums)
+        self.begin_object(PAGES_NUM)
+        self.write(f"<< /Type /Pages /Kids [ {kids} ] /Count {len(self.page_nums)} >>".encode())
+        self.end_object()
+        self.begin_object(CATALOG_NUM)
+        self.write(f"<< /Type /Catalog /Pages {PAGES_NUM} 0 R >>".encode())
+        self.end_object()
+
+        xref_offset = self.position()
+        size = self._next_num
+        self.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for num in range(1, size):
+            self.write(f"{self._offsets.get(num, 0):010d} 00000 n \n".encode())
+        self.write(f"trailer\n<< /Size {size} /Root {CATALOG_NUM} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+class _SourceCopier:
+    """Copies the pages of one source PDF into a StreamingPdfWriter, renumbering objects"""
+
+    def __init__(self, writer, reader):
+        self.writer = writer
+        self.reader = reader
+        self.numbers = {}  # (idnum, generation) in the source -> object number in the output
+        self.pending = []
+
+    def renumber(self, ref):
+        key = (ref.idnum, ref.generation)
+        if key not in self.numbers:
+            self.numbers[key] = self.writer.reserve()
+            self.pending.append(ref)
+        return self.numbers[key]
+
+    def copy_pages(self, take):
+        pages = list(self.reader.pages)
+        # Number every page up front so links between pages point at the copies
+        # instead of dragging the source's page tree along
+        page_nums = []
+        for page in pages:
+            num = self.writer.reserve()
+            if page.indirect_reference is not None:
+                ref = page.indirect_reference
+                self.numbers[(ref.idnum, ref.generation)] = num
+            page_nums.append(num)
+
+        for page, num in zip(pages, page_nums):
+            self.writer.begin_object(num)
+            self._write_page(page)
+            self.writer.end_object()
+            self.writer.page_nums.append(num)
+            # Pages that reference nothing (e.g. blank ones) must drain the buffer too
+            yield take()
+            while self.pending:
+                ref = self.pending.pop()
+                self.writer.begin_object(self.numbers[(ref.idnum, ref.generation)])
+                self._write_value(ref.get_object())
+                self.writer.end_object()
+                yield take()
+
+    def _write_page(self, page):
+        entries = {key: value for key, value in page.items() if key != "/Parent"}
+        node = page
+        while any(attr not in entries for attr in INHERITABLE_ATTRIBUTES):
+            parent = node.get("/Parent")
+            if parent is None:
+                break
+            node = parent.get_object()
+            for attr in INHERITABLE_ATTRIBUTES:
+                if attr not in entries and attr in node:
+                    entries[attr] = dict.__getitem__(node, attr)
+        entries[NameObject("/Parent")] = IndirectObject(PAGES_NUM, 0, None)
+        self._write_dict(entries)
+
+    def _write_dict(self, entries, stream_data=None):
+        write = self.writer.write
+        write(b"<<\n")
+        for key, value in entries.items():
+            if stream_data is not None and key == "/Length":
+                continue
+            NameObject(key).write_to_stream(self.writer, None)
+            write(b" ")
+            self._write_value(value)
+            write(b"\n")
+        if stream_data is not None:
+            write(f"/Length {len(stream_data)}\n".encode())
+        write(b">>")
+        if stream_data is not None:
+            write(b"\nstream\n")
+            write(stream_data)
+            write(b"\nendstream")
+
+    def _write_value(self, value):
+        if isinstance(value, IndirectObject):
+            if value.pdf is None:  # Already points into the output (e.g. the page tree)
+                self.writer.write(f"{value.idnum} 0 R".encode())
+            else:
+                self.writer.write(f"{self.renumber(value)} 0 R".encode())
+        elif isinstance(value, StreamObject):
+            self._write_dict(dict(value.items()), stream_data=value._data)
+        elif isinstance(value, DictionaryObject):
+            self._write_dict(dict(value.items()))
+        elif isinstance(value, ArrayObject):
+            self.writer.write(b"[")
+            for item in list.__iter__(value):
+                self.writer.write(b" ")
+                self._write_value(item)
+            self.writer.write(b" ]")
+        elif value is None:
+            self.writer.write(b"null")
+        else:
+            value.write_to_stream(self.writer, None)
+
+
+def iter_merged_pdf(pdf_paths):
+    """Yield the bytes of a PDF made of all pages of pdf_paths, in order
+
+    Each source is opened, copied and closed before the next one is touched,
+    and output is yielded in CHUNK_SIZE pieces as it is produced.
+    """
+    # A consumer that stops early (client gone) shows up as cause "aborted"
+    with time_stage("pdf_merge", error_cause=lambda e: "aborted" if isinstance(e, GeneratorExit) else type(e).__name__):
+        writer = StreamingPdfWriter()
+        for path in pdf_paths:
+            with open(path, "rb") as f:
+                reader = PdfReader(f)
+                if reader.is_encrypted:
+                    reader.decrypt("")
+                copier = _SourceCopier(writer, reader)
+                for chunk in copier.copy_pages(writer.take):
+                    if chunk:
+                        stage_bytes.inc(len(chunk), stage="pdf_merge")
+                        yield chunk
+                del copier, reader
+        writer.finish()
+        chunk = writer.take(force=True)
+        stage_bytes.inc(len(chunk), stage="pdf_merge")
+    yield chunk
+
+
+def write_merged_pdf(pdf_paths, output_path, chunks=None):
+    """Merge pdf_paths into output_path; chunks lets a caller pass an existing iter_merged_pdf()
+
+    On failure the partial file is removed and output_path is left untouched.
+    """
+    tmp = f"{output_path}.part"
+    try:
+        with open(tmp, "wb") as out:
+            for chunk in chunks if chunks is not None else iter_merged_pdf(pdf_paths):
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    os.replace(tmp, output_path)
@@ -0,0 +1,57 @@
+# processed_store.py
+# Indexed record of folders the background processors have already handled (replaces done.txt)
+
+import os
+import time
+import logging
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_folders (
+    kind TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (kind, folder)
+)
+"""
+
+
+class ProcessedStore:
+    """Set of processed folder names for one processor kind ("reel", "merge")"""
+
+    def __init__(self, kind, legacy_done_file=None):
+        self.kind = kind
+        get_connection().execute(SCHEMA)
+        if legacy_done_file:
+            self._import_done_file(legacy_done_file)
+
+    def _import_done_file(self, path):
+        """One-time import of an old append-only done file"""
+        if not os.path.exists(path):
+            return
+        conn = get_connection()
+        row = conn.execute("SELECT 1 FROM processed_folders WHERE kind = ? LIMIT 1", (self.kind,)).fetchone()
+        if row:
+            return
+        with open(path, "r") as f:
+            folders = [line.strip() for line in f if line.strip()]
+        now = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO processed_folders (kind, folder, processed_at) VALUES (?, ?, ?)",
+            [(self.kind, folder, now) for folder in folders],
+        )
+        logger.info(f"Imported {len(folders)} {self.kind} folders from {path}")
+
+    def is_done(self, folder):
+        row = get_connection().execute(
+            "SELECT 1 FROM processed_folders WHERE kind = ? AND folder = ?", (self.kind, folder)
+        ).fetchone()
+        return row is not None
+
+    def mark_done(self, folder):
+        get_connection().execute(
+            "INSERT OR REPLACE INTO processed_folders (kind, folder, processed_at) VALUES (?, ?, ?)",
+            (self.kind, folder, time.time()),
+        )
@@ -0,0 +1,28 @@
+# render_cache.py
+# Finished reels keyed by what went into them, so a resubmission never re-encodes
+
+import os
+from blob_cache import BlobCache, SingleFlight, cache_key
+from hashing import file_sha256
+
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", os.path.join("cache", "renders"))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+RENDER_CACHE_MAX_AGE = float(os.environ.get("RENDER_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+render_cache = BlobCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, max_age=RENDER_CACHE_MAX_AGE, suffix=".mp4")
+render_flights = SingleFlight()
+
+
+def reel_cache_key(input_file, audio_file, settings):
+    """Key for a reel: ordered image content hashes and durations from input.txt,
+    the audio content hash and the encoder settings (ffmpeg args without paths)"""
+    entries = []
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('file '):
+                entries.append(("file", file_sha256(line[5:].strip().strip("'\""))))
+            elif line:
+                entries.append(("directive", line))
+    audio_hash = file_sha256(audio_file) if os.path.exists(audio_file) else None
+    return cache_key("reel", entries, audio_hash, list(settings))
@@ -0,0 +1,183 @@
+# segments.py
+# Segmented reel rendering: every image/duration pair is encoded into its own short
+# closed-GOP segment, in parallel and cached, and the reel is then assembled by
+# stream-copying the segments, so long reels use every core and reused images are free
+
+import os
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from blob_cache import BlobCache, SingleFlight, cache_key, link_or_copy
+from hashing import file_sha256
+from encoder_profiles import video_args
+from ffmpeg_pool import ffmpeg_executor, save_output_tail, FFMPEG_THREAD_BUDGET, PRIORITY_INTERACTIVE
+from logs import job_context
+
+logger = logging.getLogger(__name__)
+
+# "single" (one encoder over the whole concat list), "segmented", or "auto":
+# segmented once a reel has at least SEGMENT_MIN_IMAGES images
+REEL_RENDER_MODE = os.environ.get("REEL_RENDER_MODE", "auto")
+SEGMENT_MIN_IMAGES = int(os.environ.get("SEGMENT_MIN_IMAGES", 4))
+# Segments submitted to the ffmpeg executor at once per reel; the executor's
+# thread budget decides how many really run
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS", FFMPEG_THREAD_BUDGET))
+SEGMENT_TIMEOUT = int(os.environ.get("SEGMENT_TIMEOUT", 120))
+SEGMENT_CACHE_DIR = os.environ.get("SEGMENT_CACHE_DIR", os.path.join("cache", "segments"))
+SEGMENT_CACHE_MAX_BYTES = int(os.environ.get("SEGMENT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+SEGMENT_CACHE_MAX_AGE = float(os.environ.get("SEGMENT_CACHE_MAX_AGE", 7 * 24 * 3600))
+# Bump when the segment command changes so old segments are not mixed with new ones
+SEGMENT_FORMAT_VERSION = 1
+
+# folder -> Event set to stop that reel's remaining segments (see cancel())
+_renders = {}
+_renders_lock = threading.Lock()
+
+segment_cache = BlobCache(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES, max_age=SEGMENT_CACHE_MAX_AGE, suffix=".mp4")
+segment_flights = SingleFlight()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SEGMENT_WORKERS, thread_name_prefix="segment")
+    return _pool
+
+
+class SegmentError(Exception):
+    """A segment could not be encoded; the output tail is in the reel folder's ffmpeg.log"""
+
+
+def use_segments(image_count):
+    if REEL_RENDER_MODE == "segmented":
+        return True
+    return REEL_RENDER_MODE == "auto" and image_count >= SEGMENT_MIN_IMAGES
+
+
+def segment_profile(profile):
+    """The profile a segment is encoded with: one thread, so many segments run side by side"""
+    return {**profile, "threads": 1}
+
+
+def segment_command(image, seconds, profile, scale_filter, output):
+    frames = max(1, round(seconds * profile["fps"]))
+    return [
+        'ffmpeg', '-y',
+        '-loop', '1', '-framerate', str(profile["fps"]), '-i', image.replace('\\', '/'),
+        *scale_filter,
+        *video_args(segment_profile(profile)),
+        # Every segment starts on a keyframe and no frame refers across segments
+        '-flags', '+cgop',
+        '-frames:v', str(frames),
+        '-an', '-f', 'mp4',
+        output.replace('\\', '/'),
+    ]
+
+
+def segment_key(image, seconds, profile, scale_filter):
+    return cache_key(
+        "segment", SEGMENT_FORMAT_VERSION, file_sha256(image), seconds, sorted(profile.items()), list(scale_filter)
+    )
+
+
+def cancel(folder):
+    """Stop the segment encodes of folder's render, queued or running; returns False if none is rendering"""
+    with _renders_lock:
+        stop = _renders.get(folder)
+    if stop is None:
+        return False
+    stop.set()
+    ffmpeg_executor.cancel(folder)
+    return True
+
+
+def encode_segment(folder, image, seconds, profile, scale_filter, priority=PRIORITY_INTERACTIVE, cancel_event=None):
+    """Return the cached segment for one image/duration pair, encoding it on a miss
+
+    Raises FFmpegCancelled instead of starting an encode once cancel_event is set.
+    """
+    key = segment_key(image, seconds, profile, scale_filter)
+    with segment_flights.acquire(key):
+        cached = segment_cache.get(key)
+        if cached:
+            return cached
+        path = segment_cache.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # .tmp so a crash mid-encode never looks like a cache entry
+        partial = f"{path}.{os.getpid()}.tmp"
+        command = segment_command(image, seconds, profile, scale_filter, partial)
+        try:
+            result = ffmpeg_executor.run(
+                command, priority, timeout=SEGMENT_TIMEOUT, job_id=folder, cancel_event=cancel_event,
+                stage="segment_encode"
+            )
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        if result.returncode != 0 or not os.path.exists(partial):
+            log_file = save_output_tail(os.path.join("user_uploads", folder, "ffmpeg.log"), result)
+            raise SegmentError(f"Segment for {os.path.basename(image)} failed with exit code {result.returncode}"
+                               f" (output tail in {log_file})")
+        os.replace(partial, path)
+        return segment_cache.adopt(key)
+
+
+def encode_segments(folder, entries, profile, scale_filter, list_file, priority=PRIORITY_INTERACTIVE, on_segment=None):
+    """Encode (or reuse) a segment per (image, seconds) entry in parallel and write the concat list
+
+    The segments are hard-linked into a segments/ directory next to list_file
+    so cache eviction cannot remove one mid-mux; remove_segments() cleans it
+    up. on_segment(done, total) is called as segments finish. Raises
+    SegmentError (or the ffmpeg executor's errors) when a segment fails, after
+    cancelling the rest of the reel's segments; FFmpegCancelled after cancel(folder).
+    """
+    stop = threading.Event()
+
+    def encode(image, seconds):
+        with job_context(folder):
+            return encode_segment(folder, image, seconds, profile, scale_filter(image), priority, stop)
+
+    with _renders_lock:
+        _renders[folder] = stop
+    try:
+        futures = [_get_pool().submit(encode, image, seconds) for image, seconds in entries]
+        done = 0
+        segments = []
+        try:
+            for future in futures:
+                segments.append(future.result())
+                done += 1
+                if on_segment:
+                    on_segment(done, len(futures))
+        except Exception:
+            # Segments a pool thread has not handed to the executor yet never start
+            stop.set()
+            for future in futures:
+                future.cancel()
+            ffmpeg_executor.cancel(folder)
+            raise
+    finally:
+        with _renders_lock:
+            _renders.pop(folder, None)
+
+    directory = os.path.join(os.path.dirname(list_file), "segments")
+    os.makedirs(directory, exist_ok=True)
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for i, segment in enumerate(segments):
+            local = os.path.join(directory, f"{i:04d}.mp4")
+            link_or_copy(segment, local)
+            f.write(f"file '{os.path.abspath(local).replace(os.sep, '/')}'\n")
+    logger.info(f"{len(segments)} segments ready for {folder}")
+    return list_file
+
+
+def remove_segments(list_file):
+    shutil.rmtree(os.path.join(os.path.dirname(list_file), "segments"), ignore_errors=True)
+    if os.path.exists(list_file):
+        os.remove(list_file)
@@ -0,0 +1,223 @@
+# slide_timing.py
+# Audio-driven slide timing: the narration length is read from the MP3 frame headers
+# (no ffprobe process) and the slide durations in input.txt are spread to fill it
+# exactly, so no frame is encoded past the narration and the last slide is never stretched
+
+import math
+import os
+
+# Bitrates in kbps by (MPEG-1?, layer), indexed by the header's 4-bit bitrate index
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# By the header's 2-bit version field: 0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1 (1 is reserved)
+_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+
+def _frame_header(data, offset):
+    """(frame bytes, samples, sample rate, MPEG-1?, mono?) for the header at offset, or None"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # reserved values, or free-format which needs a scan to size
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        size = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or mpeg1 else 576
+        size = samples // 8 * bitrate // sample_rate + padding
+    return size, samples, sample_rate, mpeg1, b3 >> 6 == 3
+
+
+def _xing_frames(data, offset, mpeg1, mono):
+    """Frame count from a Xing/Info header in the frame at offset (VBR and LAME files), or None"""
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    tag = offset + 4 + side_info
+    if data[tag:tag + 4] not in (b"Xing", b"Info") or not int.from_bytes(data[tag + 4:tag + 8], "big") & 1:
+        return None
+    return int.from_bytes(data[tag + 8:tag + 12], "big")
+
+
+def mp3_duration(path):
+    """Duration in seconds of an MP3 file from its frame headers, or None if none are found
+
+    Skips an ID3v2 tag, uses the Xing/Info frame count when present and
+    otherwise adds up the frames, resyncing over junk between them.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | data[9] & 0x7F
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    seconds = 0.0
+    first = True
+    while offset < len(data):
+        header = _frame_header(data, offset)
+        if header is None:
+            offset = data.find(b"\xff", offset + 1)
+            if offset < 0:
+                break
+            continue
+        size, samples, sample_rate, mpeg1, mono = header
+        if first:
+            first = False
+            frames = _xing_frames(data, offset, mpeg1, mono)
+            if frames:
+                return frames * samples / sample_rate
+        seconds += samples / sample_rate
+        offset += size
+    return seconds or None
+
+
+def timing_options(fit_audio=True, min_seconds=None, max_seconds=None):
+    """Validated slide timing settings (form strings are accepted); raises ValueError"""
+    def seconds(value, name):
+        if value in (None, ""):
+            return None
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number of seconds") from None
+        if not 0 < value < math.inf:
+            raise ValueError(f"{name} must be more than 0")
+        return value
+
+    options = {
+        "fit_audio": fit_audio not in (False, "0", "false", "off", "no"),
+        "min_seconds": seconds(min_seconds, "min_seconds"),
+        "max_seconds": seconds(max_seconds, "max_seconds"),
+    }
+    if options["min_seconds"] and options["max_seconds"] and options["min_seconds"] > options["max_seconds"]:
+        raise ValueError("min_seconds is larger than max_seconds")
+    return options
+
+
+def plan_durations(total, weights, min_seconds=None, max_seconds=None, fps=None):
+    """Slide durations adding up to total seconds, proportional to weights within [min, max]
+
+    When even min_seconds per slide does not fit, the trailing slides are
+    dropped (they would be cut off anyway), so the result can be shorter than
+    weights. When max_seconds per slide cannot cover total, the narration wins
+    and max_seconds is ignored. With fps, slide boundaries fall on frame
+    boundaries and every slide gets at least one frame (slides that cannot
+    are dropped from the end); the last slide ends on total, so the
+    durations never add up to more than total.
+    """
+    if total <= 0 or not weights:
+        return []
+    low = min_seconds or 0.0
+    high = max_seconds or math.inf
+    if low * len(weights) > total:
+        weights = weights[:max(1, int(total // low))]
+        low = min(low, total / len(weights))
+    if high * len(weights) < total:
+        high = math.inf
+
+    # Proportional split; slides pushed past a bound are pinned to it and the
+    # rest re-split, pinning whichever side overshoots more first
+    durations = [None] * len(weights)
+    free = list(range(len(weights)))
+    while free:
+        remaining = total - sum(d for d in durations if d is not None)
+        weight_sum = sum(weights[i] for i in free)
+        trial = {i: remaining * weights[i] / weight_sum for i in free}
+        under = [i for i in free if trial[i] < low]
+        over = [i for i in free if trial[i] > high]
+        if not under and not over:
+            for i in free:
+                durations[i] = trial[i]
+            break
+        if sum(low - trial[i] for i in under) >= sum(trial[i] - high for i in over):
+            pinned, value = under, low
+        else:
+            pinned, value = over, high
+        for i in pinned:
+            durations[i] = value
+        free = [i for i in free if i not in pinned]
+
+    if not fps:
+        return durations
+    # Boundaries on frames, each slide at least one frame; the last slide takes
+    # whatever is left up to the total, so rounding never runs past it
+    frames = math.floor(total * fps + 1e-9)
+    if frames < 1:
+        return [total]
+    durations = durations[:frames]
+    boundaries = []
+    elapsed = 0.0
+    for i, duration in enumerate(durations[:-1]):
+        elapsed += duration
+        previous = boundaries[-1] if boundaries else 0
+        latest = frames - (len(durations) - 1 - i)
+        boundaries.append(min(max(round(elapsed * fps), previous + 1), latest))
+    planned = [(end - start) / fps for start, end in zip([0, *boundaries], boundaries)]
+    return planned + [total - sum(planned)]
+
+
+def concat_entries(input_file):
+    """[(image path, seconds)] from an ffmpeg concat list
+
+    The trailing file line without a duration (the repeated last image) is skipped.
+    """
+    entries = []
+    path = None
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('file '):
+                path = line[5:].strip().strip("'\"")
+            elif line.startswith('duration ') and path is not None:
+                entries.append((path, float(line.split()[1])))
+                path = None
+    return entries
+
+
+def write_concat_entries(input_file, entries):
+    """Write [(image path, seconds)] as an ffmpeg concat list
+
+    The list is written next to input_file and renamed over it, so a reader in
+    another process (the watcher's render worker) never sees it half written.
+    """
+    partial = f"{input_file}.{os.getpid()}.tmp"
+    with open(partial, 'w', encoding='utf-8') as f:
+        for path, seconds in entries:
+            # Forward slashes work for FFmpeg on both Windows and Unix
+            f.write(f"file '{os.path.abspath(path).replace(os.sep, '/')}'\n")
+            f.write(f"duration {seconds:.6g}\n")
+        # The concat demuxer only honours the last duration when another entry follows
+        f.write(f"file '{os.path.abspath(entries[-1][0]).replace(os.sep, '/')}'\n")
+    os.replace(partial, input_file)
+
+
+def fit_concat_list(input_file, audio_file, fps=None, min_seconds=None, max_seconds=None):
+    """Rewrite input.txt so the slides exactly fill the narration in audio_file
+
+    The durations already in the list are the weights (equal for /create).
+    Returns (narration seconds, slides kept), or None when there is no readable
+    narration and the list was left alone.
+    """
+    if not os.path.exists(audio_file):
+        return None
+    seconds = mp3_duration(audio_file)
+    entries = concat_entries(input_file)
+    if not seconds or not entries:
+        return None
+    durations = plan_durations(seconds, [duration for _, duration in entries], min_seconds, max_seconds, fps)
+    write_concat_entries(input_file, [(path, duration) for (path, _), duration in zip(entries, durations)])
+    return seconds, len(durations)
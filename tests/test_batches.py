@@ -0,0 +1,86 @@
+# tests/test_batches.py
+# Validation and defaults of batch manifests
+
+import os
+import re
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from batches import BATCH_MAX_REELS, DEFAULT_IMAGE_SECONDS, MAX_DESCRIPTION_CHARS, parse_manifest  # noqa: E402
+from encoder_profiles import DEFAULT_ENCODER_PROFILE  # noqa: E402
+from uploads import IMAGE_KINDS, extensions_for  # noqa: E402
+
+EXTENSIONS = extensions_for(IMAGE_KINDS)
+
+
+def parse(manifest):
+    return parse_manifest(json.dumps(manifest), EXTENSIONS)
+
+
+def test_defaults_are_applied():
+    [reel] = parse({"reels": [{"images": ["a.jpg", {"file": "b.png", "duration": 1.5}]}]})
+    assert reel["id"] is None
+    assert reel["images"] == [("a.jpg", DEFAULT_IMAGE_SECONDS), ("b.png", 1.5)]
+    assert reel["description"] == ""
+    assert reel["voice"] is None
+    assert reel["tts_backend"] is None
+    assert reel["profile"] == DEFAULT_ENCODER_PROFILE
+
+
+def test_top_level_values_are_reel_defaults():
+    reels = parse({
+        "voice": "Amy",
+        "profile": "fast",
+        "reels": [
+            {"id": "one", "images": ["a.jpg"], "description": "  Hello  "},
+            {"id": "two", "images": ["a.jpg"], "voice": "John", "profile": "archive"},
+        ],
+    })
+    assert [(r["id"], r["voice"], r["profile"]) for r in reels] == [("one", "Amy", "fast"), ("two", "John", "archive")]
+    assert reels[0]["description"] == "Hello"
+
+
+def test_image_names_are_made_safe():
+    [reel] = parse({"reels": [{"images": ["../../etc/a.jpg"]}]})
+    assert reel["images"] == [("etc_a.jpg", DEFAULT_IMAGE_SECONDS)]
+
+
+@pytest.mark.parametrize("manifest, message", [
+    ({}, "non-empty 'reels'"),
+    ({"reels": []}, "non-empty 'reels'"),
+    ({"reels": ["a.jpg"]}, "must be an object"),
+    ({"reels": [{"images": []}]}, "non-empty 'images'"),
+    ({"reels": [{"images": [3]}]}, "file name"),
+    ({"reels": [{"images": [{"file": "a.jpg", "duration": 0}]}]}, "duration"),
+    ({"reels": [{"images": [{"file": "a.jpg", "duration": True}]}]}, "duration"),
+    ({"reels": [{"images": [{"file": "a.jpg", "duration": 61}]}]}, "duration"),
+    ({"reels": [{"images": ["a.gif"]}]}, "'a.gif' is not one of"),
+    ({"reels": [{"images": ["a.pdf"]}]}, "'a.pdf' is not one of"),
+    ({"reels": [{"id": "../x", "images": ["a.jpg"]}]}, "plain folder name"),
+    ({"reels": [{"id": "", "images": ["a.jpg"]}]}, "plain folder name"),
+    ({"reels": [{"id": "x", "images": ["a.jpg"]}, {"id": "x", "images": ["a.jpg"]}]}, "used twice"),
+    ({"reels": [{"images": ["a.jpg"], "description": "x" * (MAX_DESCRIPTION_CHARS + 1)}]}, "description"),
+    ({"reels": [{"images": ["a.jpg"], "voice": "Linda; rm"}]}, "voice"),
+    ({"reels": [{"images": ["a.jpg"], "tts_backend": "nope"}]}, "Unknown TTS backend"),
+    ({"reels": [{"images": ["a.jpg"], "tts_backend": 1}]}, "tts_backend"),
+    ({"reels": [{"images": ["a.jpg"], "profile": "nope"}]}, "Unknown encoder profile"),
+    ({"reels": [{"images": ["a.jpg"], "min_seconds": -1}]}, "min_seconds"),
+    ({"reels": [{"images": ["a.jpg"]}] * (BATCH_MAX_REELS + 1)}, f"at most {BATCH_MAX_REELS}"),
+])
+def test_invalid_manifests(manifest, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        parse(manifest)
+
+
+def test_errors_name_the_reel():
+    with pytest.raises(ValueError, match=r"reels\[1\]"):
+        parse({"reels": [{"images": ["a.jpg"]}, {"images": []}]})
+
+
+@pytest.mark.parametrize("text", [None, "", "{not json", "[]"])
+def test_not_a_manifest(text):
+    with pytest.raises(ValueError):
+        parse_manifest(text, EXTENSIONS)
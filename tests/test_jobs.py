@@ -0,0 +1,98 @@
+# tests/test_jobs.py
+# Job records of the in-process queue: dedupe, the pending limit and eviction of finished jobs
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from jobs import JobQueue, QueueFullError  # noqa: E402
+
+
+def wait_finished(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job and job["state"] in ("done", "failed"):
+            return job
+        time.sleep(0.005)
+    raise AssertionError(f"{job_id} did not finish")
+
+
+def run(queue, job_id, func=lambda: "ok"):
+    queue.submit(job_id, func)
+    return wait_finished(queue, job_id)
+
+
+def test_job_result_and_failure():
+    queue = JobQueue("test", 1, 10)
+    assert run(queue, "good")["result"] == "ok"
+
+    def fail():
+        raise RuntimeError("boom")
+
+    job = run(queue, "bad", fail)
+    assert job["state"] == "failed"
+    assert job["error"] == "boom"
+
+
+def test_resubmitting_a_running_job_returns_it():
+    queue = JobQueue("test", 1, 10)
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+
+    queue.submit("a", work)
+    assert queue.submit("a", work)["id"] == "a"
+    release.set()
+    wait_finished(queue, "a")
+    assert calls == [1]
+
+
+def test_pending_limit():
+    queue = JobQueue("test", 1, 2)
+    release = threading.Event()
+    queue.submit("a", release.wait, 5)
+    queue.submit("b", release.wait, 5)
+    with pytest.raises(QueueFullError):
+        queue.submit("c", release.wait, 5)
+    release.set()
+
+
+def test_finished_jobs_beyond_the_limit_are_evicted_oldest_first():
+    queue = JobQueue("test", 1, 10, max_finished=2)
+    for job_id in ("a", "b", "c"):
+        run(queue, job_id)
+    assert queue.get("a") is None
+    assert queue.get("b")["state"] == "done"
+    assert queue.get("c")["state"] == "done"
+    assert queue.wait_events("a", timeout=0) == []
+    assert queue.wait_events("c", timeout=0)
+
+
+def test_finished_jobs_past_the_ttl_are_evicted():
+    queue = JobQueue("test", 1, 10, finished_ttl=0.05)
+    run(queue, "old")
+    time.sleep(0.1)
+    run(queue, "new")
+    assert queue.get("old") is None
+    assert queue.get("new")["state"] == "done"
+
+
+def test_unfinished_jobs_are_never_evicted():
+    queue = JobQueue("test", 2, 10, finished_ttl=0, max_finished=0)
+    release = threading.Event()
+    queue.submit("slow", release.wait, 5)
+    queue.submit("quick", lambda: None)
+    deadline = time.time() + 5
+    while queue.get("quick") is not None and time.time() < deadline:
+        time.sleep(0.005)
+    assert queue.get("quick") is None
+    assert queue.get("slow")["state"] in ("queued", "running")
+    release.set()
@@ -0,0 +1,73 @@
+# tests/test_pdf_merge.py
+# Page count and order of the streaming PDF merge
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from PyPDF2 import PdfReader, PdfWriter  # noqa: E402
+from pdf_merge import iter_merged_pdf, write_merged_pdf  # noqa: E402
+
+
+def make_pdf(path, widths):
+    """A PDF of blank pages, one per width, so pages can be told apart after the merge"""
+    writer = PdfWriter()
+    for width in widths:
+        writer.add_blank_page(width=width, height=500)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def page_widths(path):
+    return [round(float(page.mediabox.width)) for page in PdfReader(str(path)).pages]
+
+
+@pytest.fixture
+def sources(tmp_path):
+    return [
+        make_pdf(tmp_path / "a.pdf", [100, 110]),
+        make_pdf(tmp_path / "b.pdf", [200]),
+        make_pdf(tmp_path / "c.pdf", [300, 310, 320]),
+    ]
+
+
+def test_merge_keeps_every_page_in_order(tmp_path, sources):
+    output = tmp_path / "merged.pdf"
+    write_merged_pdf(sources, str(output))
+    assert page_widths(output) == [100, 110, 200, 300, 310, 320]
+    assert not os.path.exists(f"{output}.part")
+
+
+def test_same_source_twice(tmp_path, sources):
+    output = tmp_path / "merged.pdf"
+    write_merged_pdf([sources[1], sources[0], sources[1]], str(output))
+    assert page_widths(output) == [200, 100, 110, 200]
+
+
+def test_streamed_bytes_match_the_written_file(tmp_path, sources):
+    output = tmp_path / "merged.pdf"
+    write_merged_pdf(sources, str(output))
+    assert b"".join(iter_merged_pdf(sources)) == output.read_bytes()
+
+
+def test_failed_merge_leaves_no_output(tmp_path, sources):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4 not really")
+    output = tmp_path / "merged.pdf"
+    with pytest.raises(Exception):
+        write_merged_pdf([sources[0], str(broken)], str(output))
+    assert not output.exists()
+    assert not os.path.exists(f"{output}.part")
+
+
+def test_many_pages_across_chunks(tmp_path, sources):
+    widths = [100 + i % 400 for i in range(1000)]
+    big = make_pdf(tmp_path / "big.pdf", widths)
+    chunks = list(iter_merged_pdf([big, sources[1]]))
+    assert len(chunks) > 1
+    output = tmp_path / "merged.pdf"
+    output.write_bytes(b"".join(chunks))
+    assert page_widths(output) == widths + [200]
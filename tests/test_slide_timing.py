@@ -0,0 +1,88 @@
+# tests/test_slide_timing.py
+# MP3 frame-header durations and the slide duration planner
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from slide_timing import mp3_duration, plan_durations  # noqa: E402
+
+# MPEG-1 layer III, 128 kbps, 44.1 kHz, stereo: 417-byte frames of 1152 samples
+MPEG1_HEADER = b"\xff\xfb\x90\x00"
+MPEG1_FRAME = 417
+# MPEG-2 layer III, 64 kbps, 22.05 kHz, mono (the VoiceRSS format): 208-byte frames of 576 samples
+MPEG2_HEADER = b"\xff\xf3\x80\xc0"
+MPEG2_FRAME = 208
+
+
+def frames(header, size, count):
+    return (header + b"\x00" * (size - 4)) * count
+
+
+def write(tmp_path, data):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_mp3_duration_adds_up_frames(tmp_path):
+    path = write(tmp_path, frames(MPEG1_HEADER, MPEG1_FRAME, 100))
+    assert mp3_duration(path) == pytest.approx(100 * 1152 / 44100)
+
+
+def test_mp3_duration_mpeg2_mono(tmp_path):
+    path = write(tmp_path, frames(MPEG2_HEADER, MPEG2_FRAME, 50))
+    assert mp3_duration(path) == pytest.approx(50 * 576 / 22050)
+
+
+def test_mp3_duration_skips_id3_tag_and_junk(tmp_path):
+    tag = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\xff" * 10
+    junk = b"\x00\x12\xff\x00"
+    path = write(tmp_path, tag + frames(MPEG1_HEADER, MPEG1_FRAME, 10) + junk + frames(MPEG1_HEADER, MPEG1_FRAME, 5))
+    assert mp3_duration(path) == pytest.approx(15 * 1152 / 44100)
+
+
+def test_mp3_duration_uses_xing_frame_count(tmp_path):
+    # Stereo MPEG-1: the Xing tag follows 32 bytes of side info
+    xing = MPEG1_HEADER + b"\x00" * 32 + b"Xing" + (1).to_bytes(4, "big") + (1000).to_bytes(4, "big")
+    data = xing + b"\x00" * (MPEG1_FRAME - len(xing)) + frames(MPEG1_HEADER, MPEG1_FRAME, 3)
+    assert mp3_duration(write(tmp_path, data)) == pytest.approx(1000 * 1152 / 44100)
+
+
+def test_mp3_duration_none_without_frames(tmp_path):
+    assert mp3_duration(write(tmp_path, b"not an mp3 at all")) is None
+
+
+def test_plan_durations_fills_total_by_weight():
+    durations = plan_durations(12, [1, 2, 3])
+    assert durations == pytest.approx([2, 4, 6])
+
+
+def test_plan_durations_pins_to_bounds():
+    durations = plan_durations(10, [1, 1, 8], min_seconds=2, max_seconds=5)
+    assert durations == pytest.approx([2.5, 2.5, 5])
+
+
+def test_plan_durations_drops_slides_that_do_not_fit_min():
+    assert plan_durations(5, [1, 1, 1, 1], min_seconds=2) == pytest.approx([2.5, 2.5])
+
+
+@pytest.mark.parametrize("total, weights", [
+    (0.01, [3, 3, 3]),
+    (0.05, [1, 1, 1]),
+    (1.02, [1, 2, 3]),
+    (7.3333, [1] * 7),
+    (59.99, [3, 1, 4, 1, 5, 9, 2, 6]),
+])
+def test_plan_durations_on_frames_never_exceed_total(total, weights):
+    fps = 30
+    durations = plan_durations(total, weights, fps=fps)
+    assert durations
+    assert sum(durations) <= total + 1e-9
+    assert sum(durations) == pytest.approx(total)
+    for duration in durations[:-1]:
+        assert duration * fps == pytest.approx(round(duration * fps))
+        assert duration >= 1 / fps - 1e-9
+    assert durations[-1] > 0
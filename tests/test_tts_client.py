@@ -0,0 +1,64 @@
+# tests/test_tts_client.py
+# Circuit breaker behaviour of the shared TTS client
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+import requests  # noqa: E402
+from tts_client import CircuitBreaker, CircuitOpenError, TTSClient  # noqa: E402
+
+COOLDOWN = 0.05
+
+
+class FakeResponse:
+    status_code = 200
+    content = b"audio"
+
+
+def make_client(*outcomes):
+    """A client whose session.get raises or returns each outcome in turn"""
+    client = TTSClient("http://tts.invalid/", pool_size=1, max_retries=0, breaker=CircuitBreaker(1, COOLDOWN))
+    outcomes = list(outcomes)
+
+    def get(url, params=None, timeout=None):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client.session.get = get
+    return client
+
+
+def test_non_retryable_error_during_trial_reopens_and_recovers():
+    client = make_client(
+        requests.exceptions.ConnectionError("down"),
+        requests.exceptions.ChunkedEncodingError("cut off"),
+        FakeResponse(),
+    )
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get({})
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get({})
+
+    time.sleep(COOLDOWN * 2)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get({})
+    assert client.breaker.state == "open"
+
+    # The failed trial is over, so the next one after the cooldown reaches the backend
+    time.sleep(COOLDOWN * 2)
+    assert client.get({}).content == b"audio"
+    assert client.breaker.state == "closed"
+
+
+def test_non_retryable_error_counts_as_failure():
+    client = make_client(requests.exceptions.InvalidURL("bad url"))
+    with pytest.raises(requests.exceptions.InvalidURL):
+        client.get({})
+    assert client.breaker.state == "open"
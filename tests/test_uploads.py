@@ -0,0 +1,113 @@
+# tests/test_uploads.py
+# Upload sniffing and the per-file / per-request size limits of streaming ingestion
+
+import io
+import os
+import sys
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from flask import Flask, jsonify, request  # noqa: E402
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType  # noqa: E402
+import uploads  # noqa: E402
+from uploads import IMAGE_KINDS, IngestRequest, IngestStream, save_upload, sniff  # noqa: E402
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 60
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 60
+WEBP = b"RIFF\x00\x00\x00\x00WEBPVP8 " + b"\x00" * 60
+PDF = b"%PDF-1.7\n" + b"\x00" * 60
+
+
+@pytest.fixture(autouse=True)
+def staging(tmp_path, monkeypatch):
+    path = tmp_path / "staging"
+    monkeypatch.setattr(uploads, "UPLOAD_STAGING_DIR", str(path))
+    return path
+
+
+@pytest.mark.parametrize("head, kind", [
+    (JPEG, "jpeg"),
+    (PNG, "png"),
+    (WEBP, "webp"),
+    (PDF, "pdf"),
+    (b"GIF89a" + b"\x00" * 10, None),
+    (b"RIFF\x00\x00\x00\x00WAVE", None),
+    (b"", None),
+])
+def test_sniff(head, kind):
+    assert sniff(head[:uploads.SNIFF_BYTES]) == kind
+
+
+def test_stream_saves_and_hashes(tmp_path, staging):
+    stream = IngestStream("a.png", IMAGE_KINDS)
+    for i in range(0, len(PNG), 5):  # Chunks shorter than the sniffed head
+        stream.write(PNG[i:i + 5])
+    dest = tmp_path / "a.png"
+    assert stream.save_to(str(dest)) == hashlib.sha256(PNG).hexdigest()
+    assert stream.kind == "png"
+    assert dest.read_bytes() == PNG
+    assert os.listdir(staging) == []
+
+
+def test_stream_rejects_wrong_type_mid_body(staging):
+    stream = IngestStream("a.pdf", IMAGE_KINDS)
+    with pytest.raises(UnsupportedMediaType):
+        stream.write(PDF)
+    assert os.listdir(staging) == []
+
+
+def test_short_file_is_checked_on_save(tmp_path, staging):
+    stream = IngestStream("a.jpg", IMAGE_KINDS)
+    stream.write(b"\xff\xd8")
+    with pytest.raises(UnsupportedMediaType):
+        stream.save_to(str(tmp_path / "a.jpg"))
+    assert not (tmp_path / "a.jpg").exists()
+
+
+def test_stream_enforces_the_file_limit(staging):
+    stream = IngestStream("a.jpg", IMAGE_KINDS, max_bytes=100)
+    stream.write(JPEG)
+    with pytest.raises(RequestEntityTooLarge):
+        stream.write(b"\x00" * 50)
+    assert os.listdir(staging) == []
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = Flask(__name__)
+    app.request_class = IngestRequest
+    app.config["MAX_CONTENT_LENGTH"] = 4096
+
+    @app.route("/create", methods=["POST"])
+    def create():
+        saved = {}
+        for key, file in request.files.items():
+            saved[key] = save_upload(file, str(tmp_path / key))
+        return jsonify(saved)
+
+    return app.test_client()
+
+
+def post(client, **files):
+    data = {name: (io.BytesIO(content), f"{name}.bin") for name, content in files.items()}
+    return client.post("/create", data=data, content_type="multipart/form-data")
+
+
+def test_request_accepts_images(client, tmp_path, staging):
+    response = post(client, a=JPEG, b=WEBP)
+    assert response.status_code == 200
+    assert response.get_json() == {"a": hashlib.sha256(JPEG).hexdigest(), "b": hashlib.sha256(WEBP).hexdigest()}
+    assert (tmp_path / "b").read_bytes() == WEBP
+    assert os.listdir(staging) == []
+
+
+def test_request_rejects_unsupported_type(client, staging):
+    assert post(client, a=JPEG, b=PDF).status_code == 415
+    assert os.listdir(staging) == []
+
+
+def test_request_enforces_the_request_limit(client, staging):
+    assert post(client, a=JPEG + b"\x00" * 5000).status_code == 413
+    assert not staging.exists() or os.listdir(staging) == []
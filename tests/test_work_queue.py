@@ -0,0 +1,121 @@
+# tests/test_work_queue.py
+# Lease expiry, retries and the dead-letter list of the shared work queue
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+import db  # noqa: E402
+import work_queue  # noqa: E402
+from work_queue import LeaseLost, LeaseWorker, WorkQueue  # noqa: E402
+
+LEASE = 0.05
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    """Each test gets its own database, with failed items retryable straight away"""
+    path = str(tmp_path / "queue.db")
+    monkeypatch.setattr(work_queue, "get_connection", lambda: db.get_connection(path))
+    monkeypatch.setattr(work_queue, "_initialized", False)
+    monkeypatch.setattr(work_queue, "RETRY_DELAY", 0)
+
+
+def test_enqueue_is_idempotent():
+    queue = WorkQueue("reel")
+    assert queue.enqueue("a")
+    assert not queue.enqueue("a")
+    assert queue.active_ids() == ["a"]
+
+
+def test_claim_leases_each_item_once():
+    queue = WorkQueue("reel", lease_seconds=60)
+    queue.enqueue("a")
+    assert queue.claim("w1") == "a"
+    assert queue.claim("w2") is None
+    queue.complete("a", "w1")
+    assert queue.active_ids() == []
+
+
+def test_expired_lease_goes_back_to_the_queue():
+    queue = WorkQueue("reel", lease_seconds=LEASE)
+    queue.enqueue("a")
+    assert queue.claim("w1") == "a"
+    time.sleep(LEASE * 2)
+    assert queue.claim("w2") == "a"
+    with pytest.raises(LeaseLost):
+        queue.heartbeat("a", "w1")
+    # The stale owner cannot complete an item it lost
+    queue.complete("a", "w1")
+    assert queue.active_ids() == ["a"]
+    queue.heartbeat("a", "w2")
+
+
+def test_heartbeat_keeps_the_lease():
+    queue = WorkQueue("reel", lease_seconds=LEASE * 4)
+    queue.enqueue("a")
+    queue.claim("w1")
+    for _ in range(4):
+        time.sleep(LEASE)
+        queue.heartbeat("a", "w1")
+    assert queue.claim("w2") is None
+
+
+def test_failures_end_in_the_dead_letter_list():
+    queue = WorkQueue("reel", max_attempts=2)
+    queue.enqueue("a")
+    for attempt in range(2):
+        assert queue.claim("w1") == "a"
+        queue.fail("a", "w1", f"boom {attempt}")
+    assert queue.claim("w1") is None
+    [dead] = queue.dead_letters()
+    assert dead["id"] == "a"
+    assert dead["attempts"] == 2
+    assert dead["last_error"] == "boom 1"
+    assert queue.active_ids() == []
+
+
+def test_lease_expiring_on_the_last_attempt_is_dead_lettered():
+    queue = WorkQueue("reel", lease_seconds=LEASE, max_attempts=1)
+    queue.enqueue("a")
+    queue.claim("w1")
+    time.sleep(LEASE * 2)
+    assert queue.claim("w2") is None
+    assert [item["id"] for item in queue.dead_letters()] == ["a"]
+
+
+def test_retry_requeues_a_dead_item():
+    queue = WorkQueue("reel", max_attempts=1)
+    queue.enqueue("a")
+    queue.claim("w1")
+    queue.fail("a", "w1", "boom")
+    assert queue.retry("a")
+    assert not queue.retry("a")
+    assert queue.claim("w1") == "a"
+
+
+def test_kinds_do_not_share_items():
+    queue = WorkQueue("reel")
+    queue.enqueue("a")
+    assert WorkQueue("pdf").claim("w1") is None
+
+
+def test_lease_worker_records_the_outcome():
+    queue = WorkQueue("reel", max_attempts=1)
+    queue.enqueue("good")
+    queue.enqueue("bad")
+    done = []
+
+    def process(item_id):
+        if item_id == "bad":
+            raise RuntimeError("render failed")
+        done.append(item_id)
+
+    worker = LeaseWorker(queue, process, owner="w1")
+    while worker.run_once():
+        pass
+    assert done == ["good"]
+    assert [item["id"] for item in queue.dead_letters()] == ["bad"]
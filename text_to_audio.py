@@ -1,75 +1,75 @@
 import os
-import requests
-import urllib.parse
-from config import VOICERSS_API_KEY  # Update your config.py to include this
+import logging
+from blob_cache import BlobCache, link_or_copy
+from tts_backends import backend_chain, tts_fallbacks, TTSError
 
-# VoiceRSS API endpoint
-VOICERSS_URL = "http://api.voicerss.org/"
+logger = logging.getLogger(__name__)
 
-def text_to_speech_file(text: str, folder: str) -> str:
+# Synthesised audio is shared across jobs: the same text/voice settings are never synthesised twice
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join("cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+tts_cache = BlobCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, suffix=".mp3")
+
+def _cached_audio(key, save_file_path):
+    """Link a cached synthesis result into save_file_path; returns the path or None on a miss"""
+    if tts_cache.link_to(key, save_file_path):
+        logger.info(f"{save_file_path}: Audio served from TTS cache")
+        return save_file_path
+    return None
+
+def _store_audio(key, audio, save_file_path):
+    """Put freshly synthesised audio in the cache and link it into save_file_path"""
+    cached_path = tts_cache.put_bytes(key, audio)
+    link_or_copy(cached_path, save_file_path)
+
+def text_to_speech_file(text: str, folder: str, voice: str = None, language: str = 'en-us', rate: int = 0,
+                        backend: str = None) -> str:
     """
-    Convert text to speech using VoiceRSS API and save as MP3 file
+    Convert text to speech and save as user_uploads/<folder>/audio.mp3
+
+    The backends in tts_backends.TTS_BACKENDS are tried in order (backend, when
+    given, goes first) until one succeeds; voice None is each backend's default.
+    Returns the path, or None when every backend failed.
     """
-    try:
-        # VoiceRSS API parameters
-        params = {
-            'key': VOICERSS_API_KEY,
-            'src': text,
-            'hl': 'en-us',  # Language (English US)
-            'v': 'Linda',   # Voice name (options: Linda, Amy, Mary, John, Mike, etc.)
-            'r': '0',       # Speech rate (-10 to 10, 0 is normal)
-            'c': 'mp3',     # Audio codec (mp3, wav, aac, ogg, caf)
-            'f': '22khz_16bit_mono',  # Audio format
-            'ssml': 'false',  # SSML support
-            'b64': 'false'    # Base64 encoding
-        }
-        
-        print(f"Generating audio for folder: {folder}")
-        print(f"Text length: {len(text)} characters")
-        
-        # Make request to VoiceRSS API
-        response = requests.get(VOICERSS_URL, params=params, timeout=30)
+    logger.info(f"Generating audio for folder: {folder} ({len(text)} characters)")
+    
+    save_file_path = os.path.join(f"user_uploads/{folder}", "audio.mp3")
+    os.makedirs(os.path.dirname(save_file_path), exist_ok=True)
+    errors = []
+    for engine in backend_chain(backend):
+        if not engine.available():
+            continue
+        key = engine.key(text, voice, language, rate)
+        if _cached_audio(key, save_file_path):
+            return save_file_path
+        try:
+            audio = engine.synthesize(text, voice, language, rate)
+        except TTSError as e:
+            tts_fallbacks.inc(backend=engine.name, cause=e.cause)
+            logger.warning(f"TTS backend {engine.name} failed, trying the next one: {e}")
+            errors.append(engine.name)
+            continue
+        except Exception as e:
+            tts_fallbacks.inc(backend=engine.name, cause=type(e).__name__)
+            logger.warning(f"Unexpected error in TTS backend {engine.name}, trying the next one: {e!r}")
+            errors.append(engine.name)
+            continue
         
-        # Check if request was successful
-        if response.status_code == 200:
-            # Check if response contains audio data (not error message)
-            content_type = response.headers.get('content-type', '')
-            if 'audio' in content_type or content_type == 'application/octet-stream':
-                # Save audio file
-                save_file_path = os.path.join(f"user_uploads/{folder}", "audio.mp3")
-                
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(save_file_path), exist_ok=True)
-                
-                with open(save_file_path, "wb") as f:
-                    f.write(response.content)
-                
-                # Verify file was created and has content
-                if os.path.exists(save_file_path) and os.path.getsize(save_file_path) > 0:
-                    file_size = os.path.getsize(save_file_path)
-                    print(f"{save_file_path}: Audio file saved successfully! ({file_size} bytes)")
-                    return save_file_path
-                else:
-                    print(f"Error: Audio file was not created or is empty")
-                    return None
-            else:
-                # Response contains error message
-                error_message = response.text
-                print(f"VoiceRSS API Error: {error_message}")
-                return None
-        else:
-            print(f"HTTP Error: {response.status_code} - {response.text}")
-            return None
-            
-    except requests.exceptions.RequestException as e:
-        print(f"Request Error: {e}")
-        return None
-    except Exception as e:
-        print(f"Unexpected error in text_to_speech_file: {e}")
+        # Save audio file (via the shared cache)
+        _store_audio(key, audio, save_file_path)
+        if os.path.exists(save_file_path) and os.path.getsize(save_file_path) > 0:
+            file_size = os.path.getsize(save_file_path)
+            logger.info(f"{save_file_path}: Audio file saved with {engine.name} ({file_size} bytes)")
+            return save_file_path
+        logger.error(f"Audio file was not created or is empty: {save_file_path}")
         return None
+    
+    logger.error(f"No TTS backend produced audio (tried: {', '.join(errors) or 'none available'})")
+    return None
 
 # Alternative function with more voice options
-def text_to_speech_file_advanced(text: str, folder: str, voice: str = 'Linda', language: str = 'en-us', rate: int = 0) -> str:
+def text_to_speech_file_advanced(text: str, folder: str, voice: str = 'Linda', language: str = 'en-us', rate: int = 0,
+                                 backend: str = None) -> str:
     """
     Advanced version with more customization options
     
@@ -87,50 +87,8 @@ def text_to_speech_file_advanced(text: str, folder: str, voice: str = 'Linda', l
     - en-ca (English Canada)
     - en-in (English India)
     """
-    try:
-        params = {
-            'key': VOICERSS_API_KEY,
-            'src': text,
-            'hl': language,
-            'v': voice,
-            'r': str(rate),  # Speech rate (-10 to 10)
-            'c': 'mp3',
-            'f': '22khz_16bit_mono',
-            'ssml': 'false',
-            'b64': 'false'
-        }
-        
-        print(f"Generating audio for folder: {folder} (Voice: {voice}, Language: {language}, Rate: {rate})")
-        
-        response = requests.get(VOICERSS_URL, params=params, timeout=30)
-        
-        if response.status_code == 200:
-            content_type = response.headers.get('content-type', '')
-            if 'audio' in content_type or content_type == 'application/octet-stream':
-                save_file_path = os.path.join(f"user_uploads/{folder}", "audio.mp3")
-                os.makedirs(os.path.dirname(save_file_path), exist_ok=True)
-                
-                with open(save_file_path, "wb") as f:
-                    f.write(response.content)
-                
-                if os.path.exists(save_file_path) and os.path.getsize(save_file_path) > 0:
-                    file_size = os.path.getsize(save_file_path)
-                    print(f"{save_file_path}: Audio file saved successfully! ({file_size} bytes)")
-                    return save_file_path
-                else:
-                    print(f"Error: Audio file was not created or is empty")
-                    return None
-            else:
-                error_message = response.text
-                print(f"VoiceRSS API Error: {error_message}")
-                return None
-        else:
-            print(f"HTTP Error: {response.status_code} - {response.text}")
-            return None
-            
-    except Exception as e:
-        print(f"Error in text_to_speech_file_advanced: {e}")
-        return None
+    logger.info(f"Voice: {voice}, Language: {language}, Rate: {rate}")
+    return text_to_speech_file(text, folder, voice, language, rate, backend)
 
 # Test function (uncomment to test)
 # if __name__ == "__main__":
@@ -0,0 +1,73 @@
+# thumbnails.py
+# Poster frames and short low-bitrate previews for the gallery, generated on first request
+
+import os
+import uuid
+import logging
+import subprocess
+from ffmpeg_pool import ffmpeg_executor, PRIORITY_INTERACTIVE
+from blob_cache import BlobCache, SingleFlight, cache_key
+
+logger = logging.getLogger(__name__)
+
+THUMB_CACHE_DIR = os.environ.get("THUMB_CACHE_DIR", os.path.join("cache", "thumbs"))
+THUMB_CACHE_MAX_BYTES = int(os.environ.get("THUMB_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+THUMB_WIDTH = 270
+PREVIEW_SECONDS = 3
+
+# Each cache evicts only what is in its own directory, so posters and previews get
+# their own subdirectory and share of the budget (previews are the larger files)
+poster_cache = BlobCache(os.path.join(THUMB_CACHE_DIR, "posters"), THUMB_CACHE_MAX_BYTES // 4, suffix=".jpg")
+preview_cache = BlobCache(os.path.join(THUMB_CACHE_DIR, "previews"), THUMB_CACHE_MAX_BYTES - THUMB_CACHE_MAX_BYTES // 4,
+                          suffix=".mp4")
+_flights = SingleFlight()
+
+
+def _generate(cache, key, args, fmt):
+    """Run ffmpeg with args writing to a temp file in the cache and adopt it under key"""
+    with _flights.acquire(key):
+        cached = cache.get(key)
+        if cached:
+            return cached
+        dest = cache.path_for(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            try:
+                result = ffmpeg_executor.run(
+                    ['ffmpeg', '-y', *args, '-f', fmt, tmp], PRIORITY_INTERACTIVE, timeout=60, stage="thumbnail"
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.warning(f"Thumbnail generation failed: {e}")
+                return None
+            if result.returncode != 0 or not os.path.exists(tmp):
+                logger.warning(f"Thumbnail generation failed: {result.stderr[-500:]}")
+                return None
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return cache.adopt(key)
+
+
+def _key(kind, reel):
+    # size + created change whenever the reel is re-rendered, which invalidates old thumbnails
+    return cache_key(kind, THUMB_WIDTH, reel["path"], reel["size"], reel["created"])
+
+
+def poster_for(reel):
+    """Path to a JPEG poster frame for an index entry, or None if ffmpeg failed"""
+    seek = min(1.0, (reel["duration"] or 0) / 2)
+    args = ['-ss', str(seek), '-i', reel["path"], '-frames:v', '1', '-vf', f'scale={THUMB_WIDTH}:-2', '-q:v', '4']
+    return _generate(poster_cache, _key("poster", reel), args, "mjpeg")
+
+
+def preview_for(reel):
+    """Path to a short, small, silent MP4 preview for an index entry, or None if ffmpeg failed"""
+    args = [
+        '-t', str(PREVIEW_SECONDS), '-i', reel["path"], '-an',
+        '-vf', f'scale={THUMB_WIDTH}:-2', '-c:v', 'libx264', '-preset', 'veryfast',
+        '-crf', '32', '-threads', '1', '-maxrate', '300k', '-bufsize', '600k', '-r', '15',
+        '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+    ]
+    return _generate(preview_cache, _key("preview", reel), args, "mp4")
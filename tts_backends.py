@@ -0,0 +1,282 @@
+# tts_backends.py
+# Text-to-speech backends behind text_to_speech_file(): the remote VoiceRSS API and a
+# local espeak-ng engine kept warm in worker processes, tried in order as a fallback chain
+
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import ctypes
+import ctypes.util
+import subprocess
+import wave
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+import requests
+from config import VOICERSS_API_KEY
+from blob_cache import cache_key
+from ffmpeg_pool import ffmpeg_executor, PRIORITY_INTERACTIVE
+from metrics import registry, Counter, stage_bytes, time_stage
+from tts_client import voicerss_client, failure_cause
+
+logger = logging.getLogger(__name__)
+
+# Backends tried in order for every narration; a request can put another one first
+TTS_BACKENDS = [name.strip() for name in os.environ.get("TTS_BACKENDS", "voicerss,espeak").split(",") if name.strip()]
+
+VOICERSS_DEFAULT_VOICE = "Linda"
+VOICERSS_FORMAT = "22khz_16bit_mono"
+
+# espeak-ng engines, one per worker process; each loads its voice data once and stays up
+LOCAL_TTS_WORKERS = int(os.environ.get("LOCAL_TTS_WORKERS", 2))
+LOCAL_TTS_TIMEOUT = int(os.environ.get("LOCAL_TTS_TIMEOUT", 60))
+LOCAL_TTS_BITRATE = os.environ.get("LOCAL_TTS_BITRATE", "64k")
+# Bump when the local synthesis output changes so stale cache entries are not reused
+LOCAL_TTS_VERSION = 1
+# espeak-ng voice variants standing in for the VoiceRSS voice names
+VOICE_VARIANTS = {"Linda": "f3", "Amy": "f2", "Mary": "f4", "John": "m3", "Mike": "m1"}
+
+tts_fallbacks = registry.register(Counter(
+    "mediameld_tts_fallbacks_total", "Narrations a TTS backend failed on, handed to the next backend",
+    ["backend", "cause"]))
+
+
+class TTSError(Exception):
+    """A backend could not synthesise the text; cause is a short label for metrics"""
+
+    def __init__(self, message, cause="error"):
+        super().__init__(message)
+        self.cause = cause
+
+
+class VoiceRSSBackend:
+    """The VoiceRSS HTTP API through the shared retrying client"""
+
+    name = "voicerss"
+
+    def available(self):
+        return bool(VOICERSS_API_KEY)
+
+    def status(self):
+        return {"available": self.available(), "circuit": voicerss_client.breaker.state}
+
+    def key(self, text, voice=None, language="en-us", rate=0):
+        return cache_key("voicerss", text, voice or VOICERSS_DEFAULT_VOICE, language, str(rate), "mp3", VOICERSS_FORMAT)
+
+    def synthesize(self, text, voice=None, language="en-us", rate=0):
+        """MP3 bytes for text; raises TTSError"""
+        params = {
+            'key': VOICERSS_API_KEY,
+            'src': text,
+            'hl': language,
+            'v': voice or VOICERSS_DEFAULT_VOICE,  # Linda, Amy, Mary, John, Mike, etc.
+            'r': str(rate),  # Speech rate (-10 to 10, 0 is normal)
+            'c': 'mp3',
+            'f': VOICERSS_FORMAT,
+            'ssml': 'false',
+            'b64': 'false'
+        }
+        try:
+            response = voicerss_client.get(params)
+        except requests.exceptions.RequestException as e:
+            # The exception text carries the request URL, i.e. the whole description and the API key
+            raise TTSError(f"Request Error: {failure_cause(e)}", failure_cause(e)) from None
+        if response.status_code != 200:
+            raise TTSError(f"HTTP Error: {response.status_code} - {response.text[:200]}", f"http_{response.status_code}")
+        content_type = response.headers.get('content-type', '')
+        if 'audio' not in content_type and content_type != 'application/octet-stream':
+            # VoiceRSS answers 200 with an error message in the body
+            raise TTSError(f"VoiceRSS API Error: {response.text[:200]}", "api_error")
+        return response.content
+
+
+# Per worker process: the loaded libespeak-ng and its sample rate, or None to run the espeak-ng CLI
+_engine = None
+
+_AUDIO_OUTPUT_SYNCHRONOUS = 2
+_POS_CHARACTER = 1
+_ESPEAK_RATE = 1
+_ESPEAK_CHARS_UTF8 = 1
+_SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+
+
+def _init_engine():
+    """Worker initializer: load libespeak-ng and its voice data once for the life of the process"""
+    global _engine
+    path = ctypes.util.find_library("espeak-ng")
+    if not path:
+        return
+    try:
+        lib = ctypes.CDLL(path)
+        lib.espeak_Synth.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int, ctypes.c_uint,
+                                     ctypes.c_uint, ctypes.c_void_p, ctypes.c_void_p]
+        lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        lib.espeak_SetSynthCallback.argtypes = [_SYNTH_CALLBACK]
+        sample_rate = lib.espeak_Initialize(_AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+    except (OSError, AttributeError):
+        return
+    if sample_rate > 0:
+        _engine = (lib, sample_rate)
+
+
+def _synthesize_wav(text, voice, wpm, path):
+    """Write text spoken by espeak-ng as a 16-bit mono WAV file (runs in an engine worker)"""
+    if _engine is None:
+        subprocess.run(
+            ["espeak-ng", "-v", voice, "-s", str(wpm), "-w", path],
+            input=text.encode("utf-8"), capture_output=True, timeout=LOCAL_TTS_TIMEOUT, check=True,
+        )
+        return path
+
+    lib, sample_rate = _engine
+    chunks = []
+
+    @_SYNTH_CALLBACK
+    def collect(samples, count, events):
+        if samples and count > 0:
+            chunks.append(ctypes.string_at(samples, count * 2))
+        return 0
+
+    if lib.espeak_SetVoiceByName(voice.encode()) != 0:
+        # Unknown variant: fall back to the plain language voice
+        lib.espeak_SetVoiceByName(voice.split("+")[0].encode())
+    lib.espeak_SetParameter(_ESPEAK_RATE, wpm, 0)
+    lib.espeak_SetSynthCallback(collect)
+    data = text.encode("utf-8")
+    status = lib.espeak_Synth(data, len(data) + 1, 0, _POS_CHARACTER, 0, _ESPEAK_CHARS_UTF8, None, None)
+    if status != 0:
+        raise RuntimeError(f"espeak_Synth failed with status {status}")
+    lib.espeak_Synchronize()
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"".join(chunks))
+    return path
+
+
+class EspeakBackend:
+    """espeak-ng on this machine: no network, no quota
+
+    Synthesis runs on a pool of LOCAL_TTS_WORKERS processes, each holding an
+    initialised libespeak-ng (falling back to the espeak-ng command when the
+    library cannot be loaded); the WAV it produces is encoded to MP3 on the
+    ffmpeg executor so the rest of the pipeline sees the same audio.mp3.
+    """
+
+    name = "espeak"
+
+    def __init__(self, workers=LOCAL_TTS_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._available = None
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_engine)
+            return self._pool
+
+    def _discard_pool(self, pool):
+        """Replace pool (timed out or broken) with a fresh one on the next call
+
+        Queued work is cancelled and the workers are stopped: a worker stuck
+        inside the engine would otherwise hold its slot for good.
+        """
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        if hasattr(pool, "terminate_workers"):  # Python 3.14+
+            pool.terminate_workers()
+        else:
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+
+    def available(self):
+        # find_library() runs ldconfig, so look once
+        if self._available is None:
+            self._available = bool(ctypes.util.find_library("espeak-ng") or shutil.which("espeak-ng"))
+        return self._available
+
+    def status(self):
+        return {"available": self.available(), "workers": self.workers}
+
+    def _voice(self, voice, language):
+        variant = VOICE_VARIANTS.get(voice)
+        return f"{language}+{variant}" if variant else language
+
+    def _wpm(self, rate):
+        # VoiceRSS rates run -10..10 around espeak-ng's default 175 words per minute
+        return max(80, min(450, 175 + 15 * int(rate)))
+
+    def key(self, text, voice=None, language="en-us", rate=0):
+        return cache_key("espeak", LOCAL_TTS_VERSION, text, self._voice(voice, language), self._wpm(rate),
+                         LOCAL_TTS_BITRATE)
+
+    def synthesize(self, text, voice=None, language="en-us", rate=0):
+        """MP3 bytes for text; raises TTSError"""
+        with tempfile.TemporaryDirectory(prefix="tts_") as tmp, time_stage("tts_local"):
+            wav_file = os.path.join(tmp, "speech.wav")
+            mp3_file = os.path.join(tmp, "speech.mp3")
+            pool = self._get_pool()
+            try:
+                future = pool.submit(_synthesize_wav, text, self._voice(voice, language), self._wpm(rate), wav_file)
+                future.result(timeout=LOCAL_TTS_TIMEOUT)
+            except FutureTimeout:
+                self._discard_pool(pool)
+                raise TTSError(f"espeak-ng took longer than {LOCAL_TTS_TIMEOUT}s", "timeout") from None
+            except BrokenProcessPool:
+                # A worker died (e.g. inside the engine)
+                self._discard_pool(pool)
+                raise TTSError("espeak-ng worker died", "engine") from None
+            except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+                raise TTSError(f"espeak-ng failed: {e}", "engine") from None
+
+            command = [
+                'ffmpeg', '-y', '-i', wav_file,
+                '-codec:a', 'libmp3lame', '-b:a', LOCAL_TTS_BITRATE, '-ar', '22050', '-ac', '1',
+                mp3_file,
+            ]
+            try:
+                result = ffmpeg_executor.run(
+                    command, PRIORITY_INTERACTIVE, timeout=LOCAL_TTS_TIMEOUT, threads=1, stage="tts_encode"
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                raise TTSError(f"MP3 encode failed: {e}", "encode") from None
+            if result.returncode != 0 or not os.path.exists(mp3_file):
+                raise TTSError(f"MP3 encode failed with exit code {result.returncode}", "encode")
+            with open(mp3_file, "rb") as f:
+                audio = f.read()
+        stage_bytes.inc(len(audio), stage="tts_local")
+        return audio
+
+
+BACKENDS = {backend.name: backend for backend in (VoiceRSSBackend(), EspeakBackend())}
+
+for _name in TTS_BACKENDS:
+    if _name not in BACKENDS:
+        logger.warning(f"Ignoring unknown TTS backend '{_name}' in TTS_BACKENDS")
+
+
+def backend_chain(preferred=None):
+    """Backends to try in order: preferred first (when given), then the rest of TTS_BACKENDS
+
+    Raises ValueError for an unknown preferred name, so requests can be
+    rejected up front.
+    """
+    names = [name for name in TTS_BACKENDS if name in BACKENDS]
+    if preferred:
+        if preferred not in BACKENDS:
+            raise ValueError(f"Unknown TTS backend '{preferred}' (one of {', '.join(sorted(BACKENDS))})")
+        names = [preferred] + [name for name in names if name != preferred]
+    return [BACKENDS[name] for name in names]
+
+
+def status():
+    return {
+        "chain": [backend.name for backend in backend_chain()],
+        "backends": {name: backend.status() for name, backend in BACKENDS.items()},
+    }
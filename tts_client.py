@@ -0,0 +1,161 @@
+# tts_client.py
+# Shared HTTP client for the VoiceRSS backend: pooled keep-alive connections,
+# retries with exponential backoff and jitter, and a circuit breaker
+
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from jobs import TTS_WORKERS
+from metrics import registry, Counter, stage_bytes, stage_errors, time_stage
+
+logger = logging.getLogger(__name__)
+
+VOICERSS_URL = os.environ.get("VOICERSS_URL", "http://api.voicerss.org/")
+
+TTS_CONNECT_TIMEOUT = float(os.environ.get("TTS_CONNECT_TIMEOUT", 5))
+TTS_READ_TIMEOUT = float(os.environ.get("TTS_READ_TIMEOUT", 30))
+TTS_MAX_RETRIES = int(os.environ.get("TTS_MAX_RETRIES", 3))
+TTS_BACKOFF_BASE = float(os.environ.get("TTS_BACKOFF_BASE", 0.5))
+TTS_BACKOFF_MAX = float(os.environ.get("TTS_BACKOFF_MAX", 8))
+TTS_BREAKER_THRESHOLD = int(os.environ.get("TTS_BREAKER_THRESHOLD", 5))
+TTS_BREAKER_COOLDOWN = float(os.environ.get("TTS_BREAKER_COOLDOWN", 30))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without touching the network while the backend is considered down"""
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and lets one trial call through after `cooldown` seconds"""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial_in_flight:
+                raise CircuitOpenError(f"TTS backend unavailable, circuit open after {self.failures} failures")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def end_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class RetryableHTTPError(requests.exceptions.HTTPError):
+    """A 5xx answer that is worth retrying"""
+
+
+tts_retries = registry.register(Counter(
+    "mediameld_tts_retries_total", "TTS attempts that failed and were retried", ["cause"]))
+
+
+def failure_cause(error):
+    """Short cause label for a failed TTS call"""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f"http_{error.response.status_code}"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "timeout"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "connection"
+    return type(error).__name__
+
+
+class TTSClient:
+    """Keep-alive session to one TTS endpoint, shared by all TTS worker threads"""
+
+    def __init__(self, url, pool_size, max_retries=TTS_MAX_RETRIES, backoff_base=TTS_BACKOFF_BASE,
+                 backoff_max=TTS_BACKOFF_MAX, timeout=(TTS_CONNECT_TIMEOUT, TTS_READ_TIMEOUT),
+                 breaker=None):
+        self.url = url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(TTS_BREAKER_THRESHOLD, TTS_BREAKER_COOLDOWN)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt):
+        # "Full jitter": sleep a random amount up to the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, params):
+        """GET the endpoint with params, retrying 5xx answers, timeouts and connection errors
+
+        4xx answers are returned as-is (they will not improve on retry). Raises
+        CircuitOpenError immediately while the breaker is open, otherwise the
+        last error once the retries are used up.
+        """
+        with time_stage("tts_request", error_cause=failure_cause):
+            response = self._get(params)
+        if response.status_code >= 400:
+            stage_errors.inc(stage="tts_request", cause=f"http_{response.status_code}")
+        else:
+            stage_bytes.inc(len(response.content), stage="tts_request")
+        return response
+
+    def _get(self, params):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                response = self.session.get(self.url, params=params, timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise RetryableHTTPError(f"HTTP Error: {response.status_code}", response=response)
+                self.breaker.record_success()
+                return response
+            except requests.exceptions.RequestException as e:
+                self.breaker.record_failure()
+                retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                           RetryableHTTPError))
+                if not retryable or attempt >= self.max_retries or self.breaker.state != "closed":
+                    raise
+                delay = self._backoff(attempt)
+                tts_retries.inc(cause=failure_cause(e))
+                logger.warning(f"TTS request failed ({failure_cause(e)}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+            finally:
+                # Whatever was raised, a half-open trial is over and must not block later calls
+                self.breaker.end_trial()
+
+
+voicerss_client = TTSClient(VOICERSS_URL, pool_size=TTS_WORKERS)
@@ -0,0 +1,158 @@
+# uploads.py
+# Streaming upload ingestion: each uploaded file is written to disk chunk by chunk
+# while it is hashed, sniffed and size-checked, so bad uploads are rejected mid-body
+
+import os
+import shutil
+import hashlib
+import tempfile
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+import hashing
+from metrics import stage_bytes, stage_errors, time_stage
+
+MAX_FILE_BYTES = int(os.environ.get("UPLOAD_MAX_FILE_BYTES", 25 * 1024 * 1024))
+MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", 200 * 1024 * 1024))
+UPLOAD_STAGING_DIR = os.environ.get("UPLOAD_STAGING_DIR", "upload_staging")
+
+SNIFF_BYTES = 12
+
+IMAGE_KINDS = {"jpeg", "png", "webp"}
+PDF_KINDS = {"pdf"}
+
+# Which file types each upload endpoint accepts
+UPLOAD_RULES = {
+    "create": IMAGE_KINDS,
+    "create_batch": IMAGE_KINDS,
+    "create_pdf": PDF_KINDS,
+}
+
+# File name extensions that go with each sniffed kind
+KIND_EXTENSIONS = {"jpeg": {"jpg", "jpeg"}, "png": {"png"}, "webp": {"webp"}, "pdf": {"pdf"}}
+
+
+def extensions_for(kinds):
+    return set().union(*(KIND_EXTENSIONS[kind] for kind in kinds))
+
+
+def sniff(head):
+    """Identify a file from its first bytes; returns a kind name or None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    return None
+
+
+class IngestStream:
+    """Write target for one uploaded file part
+
+    Werkzeug's multipart parser writes each chunk here as it arrives, so the
+    size limit and type check fire before the rest of the body is read.
+    """
+
+    def __init__(self, filename, allowed_kinds, max_bytes=MAX_FILE_BYTES):
+        os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+        self.filename = filename
+        self.allowed_kinds = allowed_kinds
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.kind = None
+        self.saved = False
+        self._head = b""
+        self._sha256 = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=UPLOAD_STAGING_DIR, prefix="upload_", delete=False)
+        self.path = self._file.name
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            stage_errors.inc(stage="upload_save", cause="too_large")
+            raise RequestEntityTooLarge(f"{self.filename} is larger than {self.max_bytes} bytes")
+        if self.kind is None and len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_kind()
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    def _check_kind(self):
+        self.kind = sniff(self._head)
+        if self.kind not in self.allowed_kinds:
+            self.discard()
+            stage_errors.inc(stage="upload_save", cause="unsupported_type")
+            raise UnsupportedMediaType(
+                f"{self.filename} is not an accepted file type ({', '.join(sorted(self.allowed_kinds))})"
+            )
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def save_to(self, dest):
+        """Move the staged upload to dest and return its sha256"""
+        if self.kind is None:
+            self._check_kind()  # Files shorter than SNIFF_BYTES
+        self._file.close()
+        try:
+            os.replace(self.path, dest)
+        except OSError:
+            shutil.move(self.path, dest)
+        self.saved = True
+        hashing.remember(dest, self.sha256)
+        return self.sha256
+
+    def discard(self):
+        self._file.close()
+        if not self.saved and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        self.discard()
+
+
+class IngestRequest(Request):
+    """Request class that streams uploads for the endpoints in UPLOAD_RULES through IngestStream
+
+    The per-request byte limit is MAX_CONTENT_LENGTH in the app config.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        allowed_kinds = UPLOAD_RULES.get(self.endpoint)
+        if allowed_kinds is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        stream = IngestStream(filename, allowed_kinds)
+        self.__dict__.setdefault("_ingest_streams", []).append(stream)
+        return stream
+
+    def close(self):
+        super().close()
+        # Parts from a rejected body never reach request.files, clean those up too
+        for stream in self.__dict__.get("_ingest_streams", []):
+            stream.discard()
+
+
+def save_upload(file, dest):
+    """Save an uploaded FileStorage to dest and return the content sha256"""
+    with time_stage("upload_save"):
+        if isinstance(file.stream, IngestStream):
+            digest = file.stream.save_to(dest)
+        else:
+            file.save(dest)
+            digest = hashing.file_sha256(dest)
+    stage_bytes.inc(os.path.getsize(dest), stage="upload_save")
+    return digest
@@ -0,0 +1,232 @@
+# watcher.py
+# Single daemon that watches user_uploads and pdf_data and hands ready folders to the processors.
+# Uses inotify on Linux and falls back to polling the top-level folders elsewhere.
+
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from processed_store import ProcessedStore
+from logs import configure_logging
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get("WATCH_POLL_INTERVAL", 2))
+# A folder is only dispatched once it has been quiet for this long, so half-written uploads are skipped
+SETTLE_SECONDS = float(os.environ.get("WATCH_SETTLE_SECONDS", 1))
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Watch:
+    """A root folder, how to tell that one of its subfolders is ready, and what to run on it"""
+
+    def __init__(self, root, kind, is_ready, process, legacy_done_file=None):
+        self.root = root
+        self.kind = kind
+        self.is_ready = is_ready
+        self.process = process
+        self.legacy_done_file = legacy_done_file
+        self.store = None
+
+
+class Inotify:
+    """Minimal ctypes binding for the Linux inotify API"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._paths = {}
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._paths[wd] = path
+        return wd
+
+    def read_events(self, timeout):
+        """Yield (directory, name, mask) tuples, waiting at most timeout seconds"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is not None:
+                yield directory, name, mask
+
+
+class FolderWatcher:
+    """Turns filesystem events into a queue of ready folders per processor"""
+
+    def __init__(self, watches):
+        self.watches = watches
+        self._pending = {}  # (watch index, folder) -> time of last event
+        self._known = {}  # watch index -> folder names seen by the polling fallback
+        self._ready = queue.Queue()
+        for watch in watches:
+            os.makedirs(watch.root, exist_ok=True)
+
+    def _touch(self, index, folder):
+        self._pending[(index, folder)] = time.monotonic()
+
+    def _flush_settled(self):
+        now = time.monotonic()
+        for key, last_event in list(self._pending.items()):
+            if now - last_event < SETTLE_SECONDS:
+                continue
+            index, folder = key
+            watch = self.watches[index]
+            folder_path = os.path.join(watch.root, folder)
+            if not os.path.isdir(folder_path) or watch.store.is_done(folder):
+                del self._pending[key]
+            elif watch.is_ready(folder_path):
+                del self._pending[key]
+                self._ready.put(key)
+            # Not ready yet: keep it pending until the next event or poll
+
+    def _dispatch_loop(self):
+        # Processors run one folder at a time on their own thread so slow renders never block event reading
+        while True:
+            index, folder = self._ready.get()
+            watch = self.watches[index]
+            if watch.store.is_done(folder):
+                continue
+            logger.info(f"Processing {watch.kind} folder {folder}")
+            try:
+                watch.process(folder)
+            except Exception as e:
+                logger.error(f"{watch.kind} processor failed for {folder}: {e}")
+            watch.store.mark_done(folder)
+
+    def _initial_backlog(self):
+        """Queue every existing folder once at startup; after that only events drive work"""
+        for index, watch in enumerate(self.watches):
+            names = {entry.name for entry in os.scandir(watch.root) if entry.is_dir()}
+            self._known[index] = names
+            for name in names:
+                self._pending[(index, name)] = 0
+
+    def run(self):
+        for watch in self.watches:
+            watch.store = ProcessedStore(watch.kind, watch.legacy_done_file)
+        self._initial_backlog()
+        threading.Thread(target=self._dispatch_loop, name="watch-dispatch", daemon=True).start()
+        try:
+            inotify = Inotify()
+        except OSError as e:
+            logger.warning(f"inotify unavailable ({e}), polling every {POLL_INTERVAL}s")
+            self._run_polling()
+        else:
+            self._run_inotify(inotify)
+
+    def _run_inotify(self, inotify):
+        roots = {}
+        for index, watch in enumerate(self.watches):
+            root = os.path.abspath(watch.root)
+            roots[root] = index
+            inotify.add_watch(root)
+            for name in self._known[index]:
+                if not watch.store.is_done(name):
+                    self._watch_folder(inotify, os.path.join(root, name))
+        logger.info("Watching " + ", ".join(roots) + " with inotify")
+
+        while True:
+            for directory, name, mask in inotify.read_events(SETTLE_SECONDS):
+                if directory in roots:
+                    index, folder = roots[directory], name
+                    if mask & IN_ISDIR:
+                        self._watch_folder(inotify, os.path.join(directory, name))
+                else:
+                    root = directory
+                    while os.path.dirname(root) not in roots:
+                        root = os.path.dirname(root)
+                    index, folder = roots[os.path.dirname(root)], os.path.basename(root)
+                    if mask & IN_ISDIR:
+                        # Nested folders (e.g. pdf_data/<id>/pdf) are watched too
+                        inotify.add_watch(os.path.join(directory, name))
+                self._touch(index, folder)
+            self._flush_settled()
+
+    def _watch_folder(self, inotify, path):
+        try:
+            inotify.add_watch(path)
+            for entry in os.scandir(path):
+                if entry.is_dir():
+                    inotify.add_watch(entry.path)
+        except OSError as e:
+            logger.warning(f"Could not watch {path}: {e}")
+
+    def _run_polling(self):
+        # Only the top level of each root is listed; finished folders are never opened again
+        while True:
+            for index, watch in enumerate(self.watches):
+                names = {entry.name for entry in os.scandir(watch.root) if entry.is_dir()}
+                for name in names - self._known[index]:
+                    self._touch(index, name)
+                self._known[index] = names
+            # Folders that exist but were not ready last time get re-checked on every tick
+            for key in self._pending:
+                self._pending[key] = 0
+            self._flush_settled()
+            time.sleep(POLL_INTERVAL)
+
+
+def reel_ready(folder_path):
+    return os.path.exists(os.path.join(folder_path, "desc.txt")) and os.path.exists(
+        os.path.join(folder_path, "input.txt")
+    )
+
+
+def merge_ready(folder_path):
+    pdf_folder = os.path.join(folder_path, "pdf")
+    return os.path.isdir(pdf_folder) and any(name.endswith(".pdf") for name in os.listdir(pdf_folder))
+
+
+def reel_watch():
+    from generate_process import process_folder
+    return Watch("user_uploads", "reel", reel_ready, process_folder, legacy_done_file="done.txt")
+
+
+def reel_feed_watch():
+    """Like reel_watch(), but ready folders only go into the shared work queue for render workers"""
+    from work_queue import reel_work
+    return Watch("user_uploads", "reel", reel_ready, reel_work.enqueue, legacy_done_file="done.txt")
+
+
+def merge_watch():
+    from generate_merge import UPLOAD_ROOT, MERGE_DONE_FILE, process_folder
+    return Watch(UPLOAD_ROOT, "merge", merge_ready, process_folder, legacy_done_file=MERGE_DONE_FILE)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    FolderWatcher([reel_watch(), merge_watch()]).run()
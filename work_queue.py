@@ -0,0 +1,235 @@
+# work_queue.py
+# Shared SQLite work queue for render workers: items are claimed under time-limited
+# leases kept alive by heartbeats, expired leases go back to the queue, and items that
+# keep failing end up in a dead-letter list. Any number of worker processes can share it.
+
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = float(os.environ.get("WORK_LEASE_SECONDS", 60))
+MAX_ATTEMPTS = int(os.environ.get("WORK_MAX_ATTEMPTS", 3))
+POLL_INTERVAL = float(os.environ.get("WORK_POLL_INTERVAL", 2))
+# A failed item waits RETRY_DELAY * attempts seconds before it can be claimed again
+RETRY_DELAY = float(os.environ.get("WORK_RETRY_DELAY", 30))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS work_items_claim ON work_items (kind, state, available_at);
+"""
+
+_initialized = False
+
+
+def _connection():
+    global _initialized
+    conn = get_connection()
+    if not _initialized:
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseLost(Exception):
+    """The worker no longer holds the lease on an item (it expired and was re-queued)"""
+
+
+class WorkQueue:
+    """Items of one kind ("reel") in the shared store
+
+    States: pending -> leased -> done, back to pending on failure or an expired
+    lease, and dead once max_attempts claims have failed.
+    """
+
+    def __init__(self, kind, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.kind = kind
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, item_id):
+        """Add item_id unless it is already queued, leased, done or dead; returns True if added"""
+        now = time.time()
+        cursor = _connection().execute(
+            "INSERT OR IGNORE INTO work_items (id, kind, state, available_at, created, updated) "
+            "VALUES (?, ?, 'pending', ?, ?, ?)",
+            (item_id, self.kind, now, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def _expire_leases(self, conn, now):
+        """Re-queue items whose worker stopped heartbeating; dead-letter them on the last attempt"""
+        conn.execute(
+            "UPDATE work_items SET state = 'dead', lease_owner = NULL, updated = ?, "
+            "last_error = 'Lease expired on the last attempt' "
+            "WHERE kind = ? AND state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, self.kind, now, self.max_attempts),
+        )
+        conn.execute(
+            "UPDATE work_items SET state = 'pending', lease_owner = NULL, updated = ?, available_at = ?, "
+            "last_error = 'Lease expired' "
+            "WHERE kind = ? AND state = 'leased' AND lease_expires < ?",
+            (now, now, self.kind, now),
+        )
+
+    def claim(self, owner):
+        """Lease the oldest available item to owner; returns its id or None"""
+        conn = _connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT id FROM work_items WHERE kind = ? AND state = 'pending' AND available_at <= ? "
+                "ORDER BY available_at LIMIT 1",
+                (self.kind, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE work_items SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE kind = ? AND id = ?",
+                    (owner, now + self.lease_seconds, now, self.kind, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row["id"] if row else None
+
+    def heartbeat(self, item_id, owner):
+        """Extend owner's lease on item_id; raises LeaseLost if owner no longer holds it"""
+        now = time.time()
+        cursor = _connection().execute(
+            "UPDATE work_items SET lease_expires = ?, updated = ? "
+            "WHERE kind = ? AND id = ? AND state = 'leased' AND lease_owner = ? AND lease_expires >= ?",
+            (now + self.lease_seconds, now, self.kind, item_id, owner, now),
+        )
+        if cursor.rowcount != 1:
+            raise LeaseLost(f"{owner} lost the lease on {self.kind} item {item_id}")
+
+    def complete(self, item_id, owner):
+        _connection().execute(
+            "UPDATE work_items SET state = 'done', lease_owner = NULL, last_error = NULL, updated = ? "
+            "WHERE kind = ? AND id = ? AND lease_owner = ?",
+            (time.time(), self.kind, item_id, owner),
+        )
+
+    def fail(self, item_id, owner, error):
+        """Release a failed item for a later retry, or dead-letter it after max_attempts"""
+        now = time.time()
+        _connection().execute(
+            "UPDATE work_items SET lease_owner = NULL, last_error = ?, updated = ?, "
+            "state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, "
+            "available_at = ? + ? * attempts "
+            "WHERE kind = ? AND id = ? AND lease_owner = ?",
+            (str(error), now, self.max_attempts, now, RETRY_DELAY, self.kind, item_id, owner),
+        )
+
+    def active_ids(self):
+        """Ids that are waiting for or held by a worker"""
+        rows = _connection().execute(
+            "SELECT id FROM work_items WHERE kind = ? AND state IN ('pending', 'leased')", (self.kind,)
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def dead_letters(self):
+        rows = _connection().execute(
+            "SELECT id, attempts, last_error, updated FROM work_items WHERE kind = ? AND state = 'dead' "
+            "ORDER BY updated DESC",
+            (self.kind,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def retry(self, item_id):
+        """Move a dead-lettered item back to the queue with a fresh attempt count"""
+        now = time.time()
+        cursor = _connection().execute(
+            "UPDATE work_items SET state = 'pending', attempts = 0, available_at = ?, updated = ? "
+            "WHERE kind = ? AND id = ? AND state = 'dead'",
+            (now, now, self.kind, item_id),
+        )
+        return cursor.rowcount == 1
+
+
+class LeaseWorker:
+    """Claims items from a WorkQueue and runs process(item_id) on them, one at a time
+
+    A heartbeat thread renews the lease every lease_seconds / 3. If the lease
+    is lost anyway (e.g. the host stalled), on_lease_lost(item_id) is called so
+    the work can be abandoned before another worker repeats it.
+    """
+
+    def __init__(self, work_queue, process, on_lease_lost=None, owner=None):
+        self.queue = work_queue
+        self.process = process
+        self.on_lease_lost = on_lease_lost
+        self.owner = owner or worker_name()
+
+    def _heartbeat(self, item_id, stop):
+        while not stop.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.heartbeat(item_id, self.owner)
+            except LeaseLost as e:
+                logger.warning(str(e))
+                if self.on_lease_lost:
+                    self.on_lease_lost(item_id)
+                return
+
+    def run_once(self):
+        """Claim and process one item; returns False when nothing was available"""
+        item_id = self.queue.claim(self.owner)
+        if item_id is None:
+            return False
+        logger.info(f"Claimed {self.queue.kind} item {item_id} as {self.owner}")
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(item_id, stop), name="lease-heartbeat", daemon=True).start()
+        try:
+            self.process(item_id)
+        except Exception as e:
+            logger.error(f"{self.queue.kind} item {item_id} failed: {e}")
+            self.queue.fail(item_id, self.owner, e)
+        else:
+            self.queue.complete(item_id, self.owner)
+        finally:
+            stop.set()
+        return True
+
+    def run(self):
+        logger.info(f"Started {self.queue.kind} worker {self.owner}")
+        while True:
+            if not self.run_once():
+                time.sleep(POLL_INTERVAL)
+
+
+reel_work = WorkQueue("reel")
+
+
+if __name__ == "__main__":
+    # python work_queue.py dead           -> list dead-lettered reels
+    # python work_queue.py retry <folder> -> re-queue a dead-lettered reel
+    if sys.argv[1:2] == ["retry"] and len(sys.argv) == 3:
+        print("[INFO] Re-queued" if reel_work.retry(sys.argv[2]) else "[WARN] Not in the dead-letter list")
+    else:
+        for item in reel_work.dead_letters():
+            print(f"{item['id']}\tattempts={item['attempts']}\t{item['last_error']}")